@@ -18,6 +18,7 @@ class Settings(BaseSettings):
     media_dir: Path = Path("D:/claude/TroutTV/data/media")
     logos_dir: Path = Path("D:/claude/TroutTV/data/logos")
     streams_dir: Path = Path("D:/claude/TroutTV/streams")
+    dvr_dir: Path = Path("D:/claude/TroutTV/dvr")  # Segments kept for timeshift and catch-up
 
     # Stream settings
     stream_timeout: int = 60  # Seconds of inactivity before stopping stream
@@ -26,27 +27,76 @@ class Settings(BaseSettings):
     # FFmpeg settings
     ffmpeg_path: str = "ffmpeg"
     ffprobe_path: str = "ffprobe"
+    probe_cache_path: Path = Path("D:/claude/TroutTV/data/probe_cache.sqlite")  # ffprobe results by path, size and mtime
+    probe_concurrency: int = 4  # Maximum ffprobe processes running at once
+    probe_timeout: int = 10  # Seconds before a single ffprobe is killed
+    ffmpeg_capabilities_path: Path = Path("D:/claude/TroutTV/data/ffmpeg_capabilities.json")  # Detected encoders, keyed by the ffmpeg binary
+
+    # Media library index
+    media_index_enabled: bool = True  # Crawl media_dir in the background for search
+    media_index_interval: int = 300  # Seconds between re-crawls that pick up changes; 0 crawls once
+
+    # Encoder governor
+    governor_enabled: bool = True  # Step channels down their quality ladder when encodes fall behind realtime
+    governor_window: int = 20  # Seconds over which encode speed is measured
+    governor_min_speed: float = 0.95  # Speed (x realtime) below which a channel steps down
+    governor_recover_after: int = 300  # Seconds at realtime before stepping back up; doubles when step-ups fail
+
+    # Continuous MPEG-TS output
+    ts_client_queue: int = 64  # Chunks (up to 64 KiB each) queued per client before it is dropped as too slow
+    ts_keyframe_interval: int = 2  # Seconds between keyframes, where new clients can join
+
+    # Timeshift and catch-up
+    dvr_quota_gb: float = 50  # Disk space of all DVR archives together; the oldest segments are evicted beyond it
+
+    # Encode scheduling
+    encode_reserved_cores: int = 1  # CPU cores kept free of encodes for the API server
+    encode_pinning: bool = True  # Pin each encode to its own CPU cores
+    encode_nice: int = 5  # Niceness of encodes, so the API stays responsive under load
+    encode_ionice: int = 4  # Best-effort I/O priority of encodes (0-7); -1 leaves it alone
+    encode_cgroup: str = ""  # Delegated cgroup v2 directory; each encode gets a child with a cpu.max quota
+    encode_cpu_max: float = 1.0  # cpu.max quota of an encode, as a share of its allocated cores
+
+    # Transcode workers
+    transcode_workers: str = ""  # Comma-separated host:port of worker daemons; empty runs FFmpeg in the server process
+    worker_host: str = "127.0.0.1"  # Address a worker daemon (worker.py) listens on
+    worker_port: int = 8100
+    worker_capacity: int = 0  # Jobs a worker runs at once; 0 = one per two CPU cores
+    worker_token: str = ""  # Shared secret servers must present to workers
+    worker_orphan_timeout: int = 120  # Seconds a worker keeps encoding with no server connected
+    worker_reconnect_interval: int = 5  # Seconds between attempts to reach an unreachable worker
+
+    # Thumbnails
+    thumbnails_dir: Path = Path("D:/claude/TroutTV/data/thumbnails")
+    thumbnails_enabled: bool = True  # Extract poster frames and sprite sheets in the background
+    thumbnail_concurrency: int = 1  # ffmpeg processes extracting thumbnails at once
 
     # EPG settings
     epg_days_ahead: int = 2
+    epg_window_step: int = 3600  # Seconds the guide window advances by; cached guide fragments are rebuilt when it rolls
+    epg_cache_fragments: bool = True  # Keep rendered guide fragments in memory between requests
+
+    # Schedule settings
+    schedule_timezone: str = "UTC"  # IANA timezone for scheduled playlist time slots
 
     # File upload settings
     allowed_logo_extensions: list[str] = ['.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp']
     max_logo_size_mb: int = 5
+    m3u_logo_size: int = 256  # Logo variant (px) linked from the M3U playlist and XMLTV guide
     allowed_media_extensions: list[str] = ['.mp4', '.mkv', '.avi', '.mov', '.ts', '.m4v']
 
     class Config:
         env_file = ".env"
         case_sensitive = False
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Ensure directories exist
+    def ensure_dirs(self):
+        """Create the data directories; called at startup rather than on import."""
         self.channels_dir.mkdir(parents=True, exist_ok=True)
         self.playlists_dir.mkdir(parents=True, exist_ok=True)
         self.media_dir.mkdir(parents=True, exist_ok=True)
         self.logos_dir.mkdir(parents=True, exist_ok=True)
         self.streams_dir.mkdir(parents=True, exist_ok=True)
+        self.dvr_dir.mkdir(parents=True, exist_ok=True)
 
 
 settings = Settings()
@@ -1,4 +1,5 @@
 import asyncio
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,13 +8,22 @@ from fastapi.responses import RedirectResponse
 from pathlib import Path
 
 from app.config import settings, VERSION
-from app.routers import channels, streaming, metadata, uploads, playlists
+from app.routers import channels, streaming, metadata, uploads, playlists, epg
+from app.services.dvr_recorder import dvr_recorder
+from app.services.media_indexer import media_indexer
 from app.services.stream_manager import stream_manager
+from app.services.thumbnail_service import thumbnail_service
+from app.services.transcode_pool import transcode_pool
+from app.services.ts_broadcaster import ts_broadcaster
 from app.utils.ffmpeg import ffmpeg_builder
 
 
 # Background task for cleanup
 cleanup_task = None
+# Background FFmpeg capability check
+ffmpeg_task = None
+# Startup of channels with a DVR window
+recordings_task = None
 
 
 async def cleanup_loop():
@@ -22,38 +32,72 @@ async def cleanup_loop():
         try:
             await asyncio.sleep(settings.cleanup_interval)
             await stream_manager.cleanup_idle_streams()
+            await ts_broadcaster.cleanup_idle()
+            # Restart recordings whose encode failed, and pick up channels that got a DVR window
+            await stream_manager.ensure_recordings()
         except asyncio.CancelledError:
             break
         except Exception as e:
             print(f"Error in cleanup loop: {e}")
 
 
+async def check_ffmpeg():
+    """Report whether FFmpeg works and which hardware acceleration it offers."""
+    try:
+        capabilities = await ffmpeg_builder.detect_capabilities()
+    except Exception as e:
+        print(f"Error checking FFmpeg: {e}")
+        return
+
+    if capabilities['available']:
+        print(f"FFmpeg found: {settings.ffmpeg_path}")
+        print(f"Hardware acceleration: {capabilities['hw_accel']}")
+    else:
+        print(f"WARNING: FFmpeg not found at {settings.ffmpeg_path}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
     # Startup
     print("Starting TroutTV IPTV Server...")
 
-    # Test FFmpeg
-    if ffmpeg_builder.test_ffmpeg():
-        print(f"FFmpeg found: {settings.ffmpeg_path}")
-        hw_accel = ffmpeg_builder.detect_hw_accel()
-        print(f"Hardware acceleration: {hw_accel}")
-    else:
-        print(f"WARNING: FFmpeg not found at {settings.ffmpeg_path}")
+    started = time.perf_counter()
+    settings.ensure_dirs()
+
+    # Detect FFmpeg in the background; the result is cached per binary
+    global ffmpeg_task
+    ffmpeg_task = asyncio.create_task(check_ffmpeg())
+
+    # Connect to transcode workers, if any; they report encodes to adopt
+    transcode_pool.start()
+
+    # Start indexing the media library and generating thumbnails
+    thumbnail_service.start()
+    media_indexer.start()
+
+    # Start recording channels with a DVR window; the cleanup loop keeps them going
+    dvr_recorder.start()
+    global recordings_task
+    recordings_task = asyncio.create_task(stream_manager.ensure_recordings())
 
     # Start cleanup task
     global cleanup_task
     cleanup_task = asyncio.create_task(cleanup_loop())
     print(f"Cleanup task started (interval: {settings.cleanup_interval}s)")
 
-    print(f"Server ready at {settings.base_url}")
+    print(f"Server ready at {settings.base_url} (startup took {(time.perf_counter() - started) * 1000:.0f}ms)")
 
     yield
 
     # Shutdown
     print("Shutting down TroutTV IPTV Server...")
 
+    if ffmpeg_task and not ffmpeg_task.done():
+        ffmpeg_task.cancel()
+    if recordings_task and not recordings_task.done():
+        recordings_task.cancel()
+
     # Cancel cleanup task
     if cleanup_task:
         cleanup_task.cancel()
@@ -62,8 +106,14 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             pass
 
-    # Stop all streams
+    await media_indexer.stop()
+    await thumbnail_service.stop()
+
+    # Stop local streams; encodes on transcode workers outlive the server
     await stream_manager.stop_all_streams()
+    await ts_broadcaster.stop_all()
+    await dvr_recorder.stop()
+    await transcode_pool.stop()
 
     print("Shutdown complete")
 
@@ -90,6 +140,7 @@ app.include_router(channels.router)
 app.include_router(playlists.router)
 app.include_router(streaming.router)
 app.include_router(metadata.router)
+app.include_router(epg.router)
 app.include_router(uploads.router)
 
 # Mount static files for web UI
@@ -97,10 +148,6 @@ web_dir = Path(__file__).parent.parent / "web"
 if web_dir.exists():
     app.mount("/web", StaticFiles(directory=str(web_dir)), name="web")
 
-# Mount static files for logos
-if settings.logos_dir.exists():
-    app.mount("/logos", StaticFiles(directory=str(settings.logos_dir)), name="logos")
-
 
 @app.get("/")
 async def root():
@@ -1,25 +1,45 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from datetime import datetime
+import re
 from app.models.playlist import PlaylistItem
 
+CLOCK_PATTERN = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+
 
 class ScheduledPlaylist(BaseModel):
-    """Future: Allow multiple playlists with scheduling rules."""
+    """A playlist that airs on a channel during a recurring weekly time slot."""
     playlist_id: str
     day_of_week: Optional[List[int]] = None  # 0-6 (Monday-Sunday), None = all days
-    start_time: Optional[str] = None  # HH:MM format
-    end_time: Optional[str] = None    # HH:MM format
+    start_time: Optional[str] = None  # HH:MM format, None = midnight
+    end_time: Optional[str] = None    # HH:MM format, None = midnight; before start_time wraps to next day
     priority: int = 0  # Higher priority wins if multiple match
 
+    @field_validator('day_of_week')
+    @classmethod
+    def validate_days(cls, value: Optional[List[int]]) -> Optional[List[int]]:
+        if value is not None and any(day < 0 or day > 6 for day in value):
+            raise ValueError("day_of_week values must be 0-6 (Monday-Sunday)")
+        return value
+
+    @field_validator('start_time', 'end_time')
+    @classmethod
+    def validate_clock(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and not CLOCK_PATTERN.match(value):
+            raise ValueError("time must be in HH:MM format")
+        return value
+
 
 class StreamSettings(BaseModel):
     video_bitrate: int = 3000  # kbps
     audio_bitrate: int = 128  # kbps
     segment_duration: int = 6  # seconds
     playlist_size: int = 10  # number of segments to keep
-    transcode_preset: str = "software_fast"  # software_fast, software_medium, qsv, nvenc
+    transcode_preset: str = "software_fast"  # software_fast, software_medium, software_faster, software_fastest, qsv, nvenc
     resolution: str = "1280x720"  # WxH
+    cpu_cores: Optional[int] = Field(default=None, ge=1)  # Cores for the encode; None = by transcode preset
+    nice: Optional[int] = Field(default=None, ge=-20, le=19)  # Niceness of the encode; None = ENCODE_NICE
+    dvr_window: int = Field(default=0, ge=0)  # Minutes of segments kept for rewind and catch-up; 0 = live only
 
 
 class Channel(BaseModel):
@@ -35,10 +55,27 @@ class Channel(BaseModel):
     # Keep for backward compatibility during migration
     playlist: List[PlaylistItem] = Field(default_factory=list)
 
-    # Phase 2: Multiple scheduled playlists (future)
+    # Phase 2: Dayparting - playlists that take over during weekly time slots;
+    # playlist_id plays whenever no slot applies
     scheduled_playlists: List[ScheduledPlaylist] = Field(default_factory=list)
 
     loop: bool = True
     start_time: Optional[datetime] = None  # ISO format, None means continuous from epoch
     stream_settings: StreamSettings = Field(default_factory=StreamSettings)
     enabled: bool = True
+
+
+class ChannelSummary(BaseModel):
+    """Channel without its legacy embedded playlist, for list views."""
+    id: str
+    name: str
+    number: int
+    category: str = "General"
+    logo_url: Optional[str] = None
+    playlist_id: Optional[str] = None
+    embedded_item_count: int = 0  # Items in the legacy embedded playlist
+    scheduled_playlists: List[ScheduledPlaylist] = Field(default_factory=list)
+    loop: bool = True
+    start_time: Optional[datetime] = None
+    stream_settings: StreamSettings = Field(default_factory=StreamSettings)
+    enabled: bool = True
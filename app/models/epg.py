@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class Programme(BaseModel):
+    """One guide entry; times are ISO 8601 UTC strings."""
+    start: str
+    end: str
+    title: str
+    description: Optional[str] = ""
+    file_path: str
+    catchup_url: Optional[str] = None  # Playlist of the programme from the DVR archive, once it has started
+
+
+class ChannelGuideEntry(BaseModel):
+    """A channel's programmes within the requested window."""
+    channel_id: str
+    name: str
+    number: int
+    programmes: List[Programme] = Field(default_factory=list)
+
+
+class NowNext(BaseModel):
+    """What a channel is airing now and what follows."""
+    channel_id: str
+    name: str
+    number: int
+    now: Optional[Programme] = None
+    next: Optional[Programme] = None
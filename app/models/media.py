@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+
+class ProbeStream(BaseModel):
+    """One stream of a media file as reported by ffprobe."""
+    index: int
+    codec_type: Optional[str] = None  # video, audio, subtitle, data
+    codec_name: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    channels: Optional[int] = None  # Audio channels
+    language: Optional[str] = None
+
+
+class MediaProbe(BaseModel):
+    """Technical metadata of a media file."""
+    duration: Optional[float] = None  # Seconds
+    format_name: Optional[str] = None
+    bit_rate: Optional[int] = None  # bits per second
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    streams: List[ProbeStream] = Field(default_factory=list)
+
+
+class MediaFile(BaseModel):
+    """A file in the media library index."""
+    path: str  # Relative to the media directory
+    name: str
+    size: int
+    modified: datetime
+    duration: Optional[int] = None  # Seconds; None until probed
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+class MediaIndexStatus(BaseModel):
+    """Progress of the background media indexer."""
+    enabled: bool
+    files: int = 0
+    probed: int = 0
+    last_scan: Optional[datetime] = None
+    scan_seconds: Optional[float] = None
+    scanning: bool = False
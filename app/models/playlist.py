@@ -18,3 +18,15 @@ class Playlist(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     tags: List[str] = Field(default_factory=list)
+
+
+class PlaylistSummary(BaseModel):
+    """Playlist without its items, for list views."""
+    id: str
+    name: str
+    description: Optional[str] = ""
+    tags: List[str] = Field(default_factory=list)
+    item_count: int = 0
+    total_duration: int = 0  # Sum of item durations in seconds
+    created_at: datetime
+    updated_at: datetime
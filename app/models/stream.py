@@ -1,8 +1,46 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
+class PhaseSpan(BaseModel):
+    """One timed phase of a stream start."""
+    name: str
+    offset_ms: float  # Start of the phase relative to the start of the request
+    duration_ms: float
+
+
+class StreamStartTrace(BaseModel):
+    """Phase timings of the most recent stream start request."""
+    started_at: datetime
+    outcome: Optional[str] = None  # e.g. "started", "running", "file_missing"
+    total_ms: float
+    phases: List[PhaseSpan] = []
+
+
+class PhaseHistogram(BaseModel):
+    """Distribution of a phase's duration over all stream starts."""
+    buckets_ms: List[float]  # Upper bounds; counts has one more, open-ended bucket
+    counts: List[int]
+    count: int
+    sum_ms: float
+
+
+class EncoderStatus(BaseModel):
+    """Live encode progress and the quality level the governor chose."""
+    level: int  # 0 = the channel's configured stream settings
+    max_level: int
+    transcode_preset: str
+    resolution: str
+    video_bitrate: int  # kbps
+    speed: Optional[float] = None  # Media seconds encoded per second over the governor window
+    reported_speed: Optional[float] = None  # ffmpeg's average speed since the encode started
+    fps: Optional[float] = None
+    frame: Optional[int] = None
+    drop_frames: int = 0
+    dup_frames: int = 0
+
+
 class StreamStatus(BaseModel):
     channel_id: str
     is_active: bool
@@ -11,3 +49,9 @@ class StreamStatus(BaseModel):
     seek_position: Optional[float] = None
     last_request: Optional[datetime] = None
     viewer_count: int = 0  # Future enhancement
+    last_start: Optional[StreamStartTrace] = None
+    start_phases: Dict[str, PhaseHistogram] = {}  # Histograms of this channel's stream starts by phase
+    encoder: Optional[EncoderStatus] = None
+    worker: Optional[str] = None  # Address of the transcode worker running the encode; None when local
+    cpu_cores: Optional[List[int]] = None  # Cores a local encode is pinned to
+    ts_clients: int = 0  # Clients of the continuous /stream/{channel_id}.ts output
@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from app.models.channel import StreamSettings
+
+
+class TranscodeJob(BaseModel):
+    """A live HLS encode for a transcode worker; the inputs of FFmpegBuilder.build_hls_command."""
+    job_id: str
+    channel_id: str  # Output goes to <STREAMS_DIR>/<channel_id> on the worker
+    input_file: str  # Absolute path, as seen by the worker
+    seek: float = 0
+    stream_settings: StreamSettings
+    title: Optional[str] = None
+    start_number: int = 0  # First segment number, from the channel's timeline
+
+
+class TranscodeJobStatus(BaseModel):
+    job: TranscodeJob
+    pid: Optional[int] = None
+    started_at: datetime
+    returncode: Optional[int] = None  # None while FFmpeg is running
+
+
+class WorkerStatus(BaseModel):
+    """What a transcode worker reports about itself; used to pick a worker for new jobs."""
+    worker_id: str
+    address: Optional[str] = None  # Set by the server; the worker doesn't know how it is reached
+    connected: bool = True
+    capacity: int  # Jobs the worker runs at once
+    cpu_count: int
+    load_average: Optional[float] = None  # 1-minute load average, where the OS reports one
+    encoders: List[str] = []  # Empty while FFmpeg detection is pending
+    jobs: List[TranscodeJobStatus] = []
@@ -1,21 +1,46 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
-from app.models.channel import Channel
+from fastapi import APIRouter, HTTPException, Query, status
+from typing import List, Literal, Optional
+from app.models.channel import Channel, ChannelSummary
 from app.services.channel_manager import channel_manager
+from app.utils.listing import paginate, parse_fields, json_list_response
 
 router = APIRouter(prefix="/api/channels", tags=["channels"])
 
 
-@router.get("", response_model=List[Channel])
-async def list_channels():
-    """List all channels."""
-    return channel_manager.list_channels()
+@router.get("", response_model=List[Channel] | List[ChannelSummary])
+async def list_channels(
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return"),
+    category: Optional[str] = None,
+    enabled: Optional[bool] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """
+    List channels ordered by channel number.
+
+    The summary view omits the legacy embedded playlist. When limit is set,
+    the cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    channels = await channel_manager.list_channels()
+
+    if category is not None:
+        channels = [ch for ch in channels if ch.category == category]
+    if enabled is not None:
+        channels = [ch for ch in channels if ch.enabled == enabled]
+
+    page, next_cursor = paginate(channels, lambda ch: (ch.number, ch.id), limit, cursor)
+
+    if view == "summary":
+        page = [channel_manager.summarize(ch) for ch in page]
+
+    return json_list_response(page, parse_fields(fields), next_cursor)
 
 
 @router.get("/{channel_id}", response_model=Channel)
 async def get_channel(channel_id: str):
     """Get a specific channel."""
-    channel = channel_manager.get_channel(channel_id)
+    channel = await channel_manager.get_channel(channel_id)
     if not channel:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -27,13 +52,25 @@ async def get_channel(channel_id: str):
 @router.post("", response_model=Channel, status_code=status.HTTP_201_CREATED)
 async def create_channel(channel: Channel):
     """Create a new channel."""
-    return channel_manager.create_channel(channel)
+    try:
+        return await channel_manager.create_channel(channel)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 
 @router.put("/{channel_id}", response_model=Channel)
 async def update_channel(channel_id: str, channel: Channel):
     """Update an existing channel."""
-    updated_channel = channel_manager.update_channel(channel_id, channel)
+    try:
+        updated_channel = await channel_manager.update_channel(channel_id, channel)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     if not updated_channel:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -45,7 +82,7 @@ async def update_channel(channel_id: str, channel: Channel):
 @router.delete("/{channel_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_channel(channel_id: str):
     """Delete a channel."""
-    if not channel_manager.delete_channel(channel_id):
+    if not await channel_manager.delete_channel(channel_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Channel {channel_id} not found"
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+from typing import List, Optional
+import numpy as np
+from pydantic_core import to_json
+from app.models.channel import Channel
+from app.models.epg import ChannelGuideEntry, NowNext
+from app.services.channel_manager import channel_manager
+from app.services.dvr_recorder import dvr_recorder
+from app.services.epg_engine import epg_engine, format_iso_times
+from app.config import settings
+
+router = APIRouter(prefix="/api/epg", tags=["epg"])
+
+DEFAULT_WINDOW = timedelta(hours=3)
+
+
+def _timestamp(value: datetime) -> float:
+    """Convert a query datetime to a UTC timestamp; naive values are UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+async def _select_channels(channel_ids: Optional[str]) -> List[Channel]:
+    """Enabled channels in number order, optionally limited to a comma-separated ID list."""
+    channels = [ch for ch in await channel_manager.list_channels() if ch.enabled]
+    if channel_ids:
+        wanted = {channel_id.strip() for channel_id in channel_ids.split(',')}
+        channels = [ch for ch in channels if ch.id in wanted]
+    channels.sort(key=lambda ch: (ch.number, ch.id))
+    return channels
+
+
+def _programme(start: str, end: str, item, catchup_url: Optional[str] = None) -> dict:
+    # Plain dicts: building tens of thousands of models would dominate the response time
+    return {
+        'start': start,
+        'end': end,
+        'title': item.title,
+        'description': item.description or "",
+        'file_path': item.file_path,
+        'catchup_url': catchup_url
+    }
+
+
+def _catchup_url(channel: Channel, start: float, end: float, now: float) -> Optional[str]:
+    """Catch-up playlist of a programme that has started and is still in the channel's DVR archive."""
+    if channel.stream_settings.dvr_window <= 0 or start >= now or not dvr_recorder.covers(channel.id, start, end):
+        return None
+    return f"{settings.base_url}/stream/{channel.id}/catchup.m3u8?start={int(start)}&end={int(end)}"
+
+
+def _json_response(entries: list) -> Response:
+    return Response(content=to_json(entries), media_type="application/json")
+
+
+@router.get("", response_model=List[ChannelGuideEntry])
+async def get_epg_grid(
+    start: Optional[datetime] = Query(default=None, description="Window start (default: now)"),
+    end: Optional[datetime] = Query(default=None, description="Window end (default: start + 3 hours)"),
+    channels: Optional[str] = Query(default=None, description="Comma-separated channel IDs")
+):
+    """
+    Get the programmes of enabled channels that overlap a time window.
+
+    Programmes keep their real start and end times, so the first and last of
+    each channel may extend past the window.
+    """
+    window_start = _timestamp(start) if start else datetime.now(timezone.utc).timestamp()
+    window_end = _timestamp(end) if end else window_start + DEFAULT_WINDOW.total_seconds()
+
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if window_end - window_start > settings.epg_days_ahead * 24 * 3600:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Window may not exceed {settings.epg_days_ahead} days"
+        )
+
+    guides = await epg_engine.build(await _select_channels(channels), window_start, window_end)
+
+    # Format every programme time in one pass
+    starts = format_iso_times(np.concatenate([guide.starts for guide in guides] or [np.empty(0)]))
+    ends = format_iso_times(np.concatenate([guide.ends for guide in guides] or [np.empty(0)]))
+
+    now = datetime.now(timezone.utc).timestamp()
+    entries = []
+    k = 0
+    for guide in guides:
+        programmes = []
+        for program_start, program_end, item in guide.programs():
+            catchup_url = _catchup_url(guide.channel, program_start, program_end, now)
+            programmes.append(_programme(starts[k], ends[k], item, catchup_url))
+            k += 1
+        entries.append({
+            'channel_id': guide.channel.id,
+            'name': guide.channel.name,
+            'number': guide.channel.number,
+            'programmes': programmes
+        })
+
+    return _json_response(entries)
+
+
+@router.get("/now", response_model=List[NowNext])
+async def get_now_next(
+    at: Optional[datetime] = Query(default=None, description="Time to look up (default: now)"),
+    channels: Optional[str] = Query(default=None, description="Comma-separated channel IDs")
+):
+    """Get the current and next programme of every enabled channel in one call."""
+    timestamp = _timestamp(at) if at else datetime.now(timezone.utc).timestamp()
+
+    results = await epg_engine.now_next(await _select_channels(channels), timestamp)
+
+    # Format every programme time in one pass
+    flat = [program for _, programs in results for program in programs]
+    starts = format_iso_times(np.array([program[0] for program in flat], dtype=np.float64))
+    ends = format_iso_times(np.array([program[1] for program in flat], dtype=np.float64))
+
+    now = datetime.now(timezone.utc).timestamp()
+    entries = []
+    k = 0
+    for channel, programs in results:
+        current = []
+        for program_start, program_end, item in programs:
+            catchup_url = _catchup_url(channel, program_start, program_end, now)
+            current.append(_programme(starts[k], ends[k], item, catchup_url))
+            k += 1
+        entries.append({
+            'channel_id': channel.id,
+            'name': channel.name,
+            'number': channel.number,
+            'now': current[0] if current else None,
+            'next': current[1] if len(current) > 1 else None
+        })
+
+    return _json_response(entries)
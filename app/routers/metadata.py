@@ -1,32 +1,58 @@
-from fastapi import APIRouter
-from fastapi.responses import PlainTextResponse, Response
+from typing import Literal
+from fastapi import APIRouter, Request
+from app.services.artifact_store import artifact_store
 from app.services.channel_manager import channel_manager
 from app.services.m3u_generator import m3u_generator
 from app.services.xmltv_generator import xmltv_generator
+from app.utils.http import artifact_response, compressed_file_response
 from app.config import settings
 
 router = APIRouter(tags=["metadata"])
 
 
-@router.get("/playlist.m3u")
-async def get_m3u_playlist():
-    """Generate M3U playlist for IPTV clients."""
-    channels = channel_manager.list_channels()
-    m3u_content = m3u_generator.generate_m3u(channels, settings.base_url)
-
-    return PlainTextResponse(
-        content=m3u_content,
-        media_type="audio/x-mpegurl"
+async def _m3u_artifact(stream_format: str = "hls"):
+    channels = await channel_manager.list_channels()
+
+    async def produce():
+        yield m3u_generator.generate_m3u(channels, settings.base_url, stream_format).encode('utf-8')
+
+    return await artifact_store.materialize(f"m3u-{stream_format}", produce, version=tuple(channels))
+
+
+async def _xmltv_artifact():
+    channels = await channel_manager.list_channels()
+
+    # Large document: only the compressed copies are kept in memory, and it
+    # is only generated again once its channels, playlists or window change
+    return await artifact_store.materialize(
+        "xmltv",
+        lambda: xmltv_generator.iter_xmltv(channels),
+        keep_identity=False,
+        version=await xmltv_generator.document_version(channels)
     )
 
 
+@router.get("/playlist.m3u")
+async def get_m3u_playlist(request: Request, format: Literal["hls", "ts"] = "hls"):
+    """Generate M3U playlist for IPTV clients; format=ts links the continuous MPEG-TS streams."""
+    artifact = await _m3u_artifact(format)
+    return artifact_response(request, artifact, "audio/x-mpegurl")
+
+
 @router.get("/xmltv.xml")
-async def get_xmltv_epg():
-    """Generate XMLTV EPG data."""
-    channels = channel_manager.list_channels()
-    xmltv_content = xmltv_generator.generate_xmltv(channels)
-
-    return Response(
-        content=xmltv_content,
-        media_type="application/xml"
-    )
+async def get_xmltv_epg(request: Request):
+    """
+    Serve XMLTV EPG data.
+
+    The document is kept precompressed and served with an ETag, so polling
+    clients usually get a 304 or a compressed body.
+    """
+    artifact = await _xmltv_artifact()
+    return artifact_response(request, artifact, "application/xml")
+
+
+@router.get("/xmltv.xml.gz")
+async def get_xmltv_epg_gz(request: Request):
+    """Serve the gzip-compressed XMLTV file, for clients that expect an .xml.gz URL."""
+    artifact = await _xmltv_artifact()
+    return compressed_file_response(request, artifact, "gzip", "application/gzip")
@@ -1,21 +1,44 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
-from app.models.playlist import Playlist
+from fastapi import APIRouter, HTTPException, Query, status
+from typing import List, Literal, Optional
+from app.models.playlist import Playlist, PlaylistSummary
 from app.services.playlist_manager import playlist_manager
+from app.utils.listing import paginate, parse_fields, json_list_response
 
 router = APIRouter(prefix="/api/playlists", tags=["playlists"])
 
 
-@router.get("", response_model=List[Playlist])
-async def list_playlists():
-    """List all playlists."""
-    return playlist_manager.list_playlists()
+@router.get("", response_model=List[Playlist] | List[PlaylistSummary])
+async def list_playlists(
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return"),
+    tag: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """
+    List playlists ordered by name.
+
+    The summary view replaces items with item_count and total_duration. When
+    limit is set, the cursor for the next page is returned in the
+    X-Next-Cursor header.
+    """
+    playlists = await playlist_manager.list_playlists()
+
+    if tag is not None:
+        playlists = [p for p in playlists if tag in p.tags]
+
+    page, next_cursor = paginate(playlists, lambda p: (p.name.lower(), p.id), limit, cursor)
+
+    if view == "summary":
+        page = [playlist_manager.summarize(p) for p in page]
+
+    return json_list_response(page, parse_fields(fields), next_cursor)
 
 
 @router.get("/{playlist_id}", response_model=Playlist)
 async def get_playlist(playlist_id: str):
     """Get a specific playlist."""
-    playlist = playlist_manager.get_playlist(playlist_id)
+    playlist = await playlist_manager.get_playlist(playlist_id)
     if not playlist:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -28,7 +51,7 @@ async def get_playlist(playlist_id: str):
 async def create_playlist(playlist: Playlist):
     """Create a new playlist."""
     try:
-        return playlist_manager.create_playlist(playlist)
+        return await playlist_manager.create_playlist(playlist)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -39,7 +62,7 @@ async def create_playlist(playlist: Playlist):
 @router.put("/{playlist_id}", response_model=Playlist)
 async def update_playlist(playlist_id: str, playlist: Playlist):
     """Update an existing playlist."""
-    updated_playlist = playlist_manager.update_playlist(playlist_id, playlist)
+    updated_playlist = await playlist_manager.update_playlist(playlist_id, playlist)
     if not updated_playlist:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -52,7 +75,7 @@ async def update_playlist(playlist_id: str, playlist: Playlist):
 async def delete_playlist(playlist_id: str):
     """Delete a playlist if not in use."""
     # Check if playlist exists
-    playlist = playlist_manager.get_playlist(playlist_id)
+    playlist = await playlist_manager.get_playlist(playlist_id)
     if not playlist:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -60,14 +83,14 @@ async def delete_playlist(playlist_id: str):
         )
 
     # Check if playlist is in use
-    if playlist_manager.is_playlist_in_use(playlist_id):
+    if await playlist_manager.is_playlist_in_use(playlist_id):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Playlist is in use by one or more channels"
         )
 
     # Delete playlist
-    if not playlist_manager.delete_playlist(playlist_id):
+    if not await playlist_manager.delete_playlist(playlist_id):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error deleting playlist"
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, HTTPException, status, Response
-from fastapi.responses import FileResponse, PlainTextResponse
+import re
+from fastapi import APIRouter, HTTPException, Query, status, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pathlib import Path
+from typing import List, Optional
 from app.models.stream import StreamStatus
+from app.models.transcode import WorkerStatus
+from app.services.dvr_recorder import dvr_recorder
 from app.services.stream_manager import stream_manager
+from app.services.transcode_pool import transcode_pool
+from app.services.ts_broadcaster import ts_broadcaster
+from app.utils.tracing import PhaseTrace
 from app.config import settings
 
 router = APIRouter(prefix="/stream", tags=["streaming"])
 
+DVR_SEGMENT_PATTERN = re.compile(r'^\d+\.ts$')
+
 
 @router.get("/{channel_id}/master.m3u8")
 async def get_master_playlist(channel_id: str):
@@ -15,12 +24,14 @@ async def get_master_playlist(channel_id: str):
     This will start the stream if not already running.
     """
     # Start stream if not active
-    success = await stream_manager.start_stream(channel_id)
+    trace = PhaseTrace()
+    success = await stream_manager.start_stream(channel_id, trace)
 
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Channel {channel_id} not found or cannot start stream"
+            detail=f"Channel {channel_id} not found or cannot start stream",
+            headers={"Server-Timing": trace.server_timing()}
         )
 
     # For single-bitrate streams, we just redirect to the stream playlist
@@ -37,6 +48,45 @@ async def get_master_playlist(channel_id: str):
             "Cache-Control": "no-cache, no-store, must-revalidate",
             "Pragma": "no-cache",
             "Expires": "0",
+            "Access-Control-Allow-Origin": "*",
+            "Server-Timing": trace.server_timing(),
+            # Let browser players read the timings cross-origin
+            "Timing-Allow-Origin": "*"
+        }
+    )
+
+
+@router.get("/{channel_id}.ts")
+async def get_ts_stream(channel_id: str):
+    """
+    Get the channel as one continuous MPEG-TS stream, for tuner-style clients.
+
+    All clients of a channel share one encode. A new client starts at the
+    next keyframe, preceded by the stream's PAT and PMT; clients that fall
+    too far behind are disconnected.
+    """
+    client = await ts_broadcaster.subscribe(channel_id)
+    if client is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Channel {channel_id} not found or cannot start stream"
+        )
+
+    async def body():
+        try:
+            while True:
+                chunk = await client.queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            ts_broadcaster.unsubscribe(channel_id, client)
+
+    return StreamingResponse(
+        body(),
+        media_type="video/MP2T",
+        headers={
+            "Cache-Control": "no-cache, no-store",
             "Access-Control-Allow-Origin": "*"
         }
     )
@@ -69,6 +119,90 @@ async def get_stream_playlist(channel_id: str):
     )
 
 
+@router.get("/workers", response_model=List[WorkerStatus])
+async def get_workers():
+    """Get the configured transcode workers with their capacity and jobs."""
+    return transcode_pool.status()
+
+
+@router.get("/{channel_id}/status", response_model=StreamStatus)
+async def get_stream_status(channel_id: str):
+    """Get stream status, including the phase timings of its starts."""
+    return stream_manager.get_stream_status(channel_id)
+
+
+def _dvr_playlist_response(content: Optional[str]) -> Response:
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No recorded segments for this channel and time range"
+        )
+    return Response(
+        content=content,
+        media_type="application/vnd.apple.mpegurl",
+        headers={
+            "Cache-Control": "no-cache, no-store, must-revalidate",
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+
+@router.get("/{channel_id}/dvr.m3u8")
+async def get_dvr_playlist(channel_id: str):
+    """
+    Get the channel's DVR window as a sliding playlist, for pausing and rewinding live TV.
+    """
+    return _dvr_playlist_response(dvr_recorder.render_playlist(channel_id))
+
+
+@router.get("/{channel_id}/catchup.m3u8")
+async def get_catchup_playlist(
+    channel_id: str,
+    start: int = Query(..., description="Start of the programme (Unix time)"),
+    end: Optional[int] = Query(None, description="End of the programme (Unix time); open-ended if omitted")
+):
+    """
+    Get a past or airing programme from the recorded segments.
+
+    The playlist is complete (VOD) once the programme is fully recorded,
+    and grows (EVENT) while it is still airing.
+    """
+    if end is not None and end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must be after start"
+        )
+    return _dvr_playlist_response(dvr_recorder.render_playlist(channel_id, start, end))
+
+
+@router.get("/{channel_id}/dvr/{segment_name}")
+async def get_dvr_segment(channel_id: str, segment_name: str):
+    """
+    Get a recorded segment. Segments never change once recorded.
+    """
+    if not DVR_SEGMENT_PATTERN.match(segment_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid segment name"
+        )
+
+    segment_path = dvr_recorder.segment_path(channel_id, segment_name)
+    if segment_path is None or not segment_path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Segment not found"
+        )
+
+    return FileResponse(
+        segment_path,
+        media_type="video/MP2T",
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+
 @router.get("/{channel_id}/{segment_name}")
 async def get_segment(channel_id: str, segment_name: str):
     """
@@ -100,16 +234,11 @@ async def get_segment(channel_id: str, segment_name: str):
     )
 
 
-@router.get("/{channel_id}/status", response_model=StreamStatus)
-async def get_stream_status(channel_id: str):
-    """Get stream status."""
-    return stream_manager.get_stream_status(channel_id)
-
-
 @router.post("/{channel_id}/restart")
 async def restart_stream(channel_id: str):
     """Restart a stream."""
-    await stream_manager.stop_stream(channel_id)
+    # The new encode continues the playlist, so players don't see numbering start over
+    await stream_manager.stop_stream(channel_id, restarting=True)
     success = await stream_manager.start_stream(channel_id)
 
     if not success:
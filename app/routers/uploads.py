@@ -1,27 +1,44 @@
 """File upload and media browsing endpoints."""
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from pathlib import Path
-from typing import Optional
+from typing import List, Literal, Optional
+import asyncio
+import hashlib
+import json
 import uuid
-import shutil
-from PIL import Image
+import aiofiles
 from app.config import settings
-from app.services.media_scanner import validate_path, scan_directory
+from app.models.media import MediaFile, MediaIndexStatus
+from app.services.logo_store import LOGO_NAME, LOGO_SIZES, logo_store
+from app.services.media_indexer import media_indexer
+from app.services.media_scanner import validate_path, scan_directory, iter_scan_directory
+from app.services.thumbnail_service import IMAGE_NAME, thumbnail_service
+from app.utils.files import path_exists
+from app.utils.listing import paginate, json_list_response
 
 router = APIRouter(tags=["uploads"])
 
+# Bytes read from an upload at a time
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 
 @router.post("/api/uploads/logo/{channel_id}")
 async def upload_logo(channel_id: str, file: UploadFile = File(...)):
     """
     Upload a channel logo image.
 
+    The upload is streamed to disk and rejected as soon as it exceeds
+    max_logo_size_mb. It is then stored as PNG and WebP variants at fixed
+    sizes under content-hashed names; the returned logo_url is the largest
+    PNG variant.
+
     Args:
         channel_id: ID of the channel
         file: Uploaded image file
 
     Returns:
-        Dictionary with logo_url, filename, and size
+        Dictionary with logo_url, filename, size and variants
 
     Raises:
         HTTPException: If file is invalid or upload fails
@@ -38,81 +55,214 @@ async def upload_logo(channel_id: str, file: UploadFile = File(...)):
             detail=f"Invalid file type. Allowed: {', '.join(settings.allowed_logo_extensions)}"
         )
 
-    # Read file content
-    try:
-        contents = await file.read()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
-
-    # Validate file size
-    file_size = len(contents)
+    # Reject oversized uploads before copying them when the size is known
     max_size_bytes = settings.max_logo_size_mb * 1024 * 1024
-    if file_size > max_size_bytes:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size: {settings.max_logo_size_mb}MB"
-        )
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size: {settings.max_logo_size_mb}MB"
+    )
+    if file.size is not None and file.size > max_size_bytes:
+        raise too_large
 
-    # Validate it's a real image using Pillow
+    temp_path = settings.logos_dir / f".upload-{uuid.uuid4().hex}"
+    digest = hashlib.sha256()
+    file_size = 0
     try:
-        image = Image.open(file.file)
-        image.verify()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail="Invalid image file")
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    if file_size > max_size_bytes:
+                        raise too_large
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
+
+        # Validate it's a real image and write the variants
+        try:
+            variants = await asyncio.to_thread(
+                logo_store.create_variants, channel_id, temp_path, digest.hexdigest()[:16]
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid image file")
+        except OSError as e:
+            raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    finally:
+        await asyncio.to_thread(temp_path.unlink, missing_ok=True)
 
     # Delete old logo files for this channel
     try:
-        for old_file in settings.logos_dir.glob(f"{channel_id}_*"):
-            old_file.unlink()
+        await asyncio.to_thread(logo_store.delete_logos, channel_id, variants.values())
     except Exception:
         pass  # Ignore errors deleting old files
 
-    # Generate unique filename
-    unique_id = str(uuid.uuid4())[:8]
-    filename = f"{channel_id}_{unique_id}{file_ext}"
-    file_path = settings.logos_dir / filename
-
-    # Save file
-    try:
-        # Reset file pointer before saving
-        await file.seek(0)
-        with open(file_path, 'wb') as f:
-            shutil.copyfileobj(file.file, f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-
-    # Return logo URL
-    logo_url = f"/logos/{filename}"
+    filename = variants[f"{LOGO_SIZES[-1]}.png"]
     return {
-        "logo_url": logo_url,
+        "logo_url": f"/logos/{filename}",
         "filename": filename,
-        "size": file_size
+        "size": file_size,
+        "variants": {key: f"/logos/{name}" for key, name in variants.items()}
     }
 
 
+@router.get("/logos/{filename}")
+async def get_logo(filename: str):
+    """
+    Serve an uploaded logo.
+
+    Variants are named by the hash of the upload, so they are cached
+    indefinitely; other files (uploaded before variants existed) are
+    revalidated daily.
+    """
+    logo_path = settings.logos_dir / filename
+    if filename.startswith('.') or '/' in filename or '\\' in filename:
+        raise HTTPException(status_code=404, detail="Logo not found")
+    if not await path_exists(logo_path):
+        raise HTTPException(status_code=404, detail="Logo not found")
+
+    if LOGO_NAME.match(filename):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "public, max-age=86400"
+    return FileResponse(logo_path, headers={"Cache-Control": cache_control})
+
+
 @router.get("/api/media/browse")
-async def browse_media(path: Optional[str] = Query(default=None)):
+async def browse_media(
+    path: Optional[str] = Query(default=None),
+    offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    stream: bool = Query(default=False, description="Stream NDJSON events as the listing is built")
+):
     """
     Browse media directory and list files/folders.
 
+    Folders come first, then media files, each sorted by name. Large folders
+    can be paged with offset or cursor plus limit; next_cursor is null on
+    the last page. With stream=true the response is NDJSON: the listing
+    header and items arrive in batches, and durations that were not cached
+    yet follow as they are probed.
+
     Args:
         path: Optional relative path within media directory
+        offset: Entries to skip (ignored when cursor is given)
+        limit: Maximum entries to return
+        cursor: next_cursor from the previous page
+        stream: Return progressive NDJSON events instead of one document
 
     Returns:
-        Dictionary with current_path, parent_path, and items list
+        Dictionary with current_path, parent_path, total, offset,
+        next_cursor and items list
 
     Raises:
         HTTPException: If path is invalid or inaccessible
     """
     # Validate and resolve path
-    validated_path = validate_path(path or '', settings.media_dir)
+    validated_path = await asyncio.to_thread(validate_path, path or '', settings.media_dir)
+
+    if stream:
+        events = iter_scan_directory(validated_path, settings.media_dir, offset, limit, cursor)
+        # Fail before the response starts if the directory can't be listed
+        first = await anext(events)
+
+        async def lines():
+            yield json.dumps(first) + "\n"
+            async for event in events:
+                yield json.dumps(event) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
     # Scan directory
-    result = scan_directory(validated_path, settings.media_dir)
+    result = await scan_directory(validated_path, settings.media_dir, offset, limit, cursor)
 
     return result
 
 
+@router.get("/api/media/search", response_model=List[MediaFile])
+async def search_media(
+    q: Optional[str] = Query(default=None, description="Terms that must all appear in the file path"),
+    min_duration: Optional[int] = Query(default=None, ge=0, description="Minimum duration in seconds"),
+    max_duration: Optional[int] = Query(default=None, ge=0, description="Maximum duration in seconds"),
+    codec: Optional[str] = Query(default=None, description="Video or audio codec, e.g. h264"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """
+    Search the media library index.
+
+    Results are ordered by path; the cursor for the next page is returned
+    in the X-Next-Cursor header.
+    """
+    if not media_indexer.enabled:
+        raise HTTPException(status_code=503, detail="Media indexing is disabled")
+
+    results = media_indexer.search(q, min_duration, max_duration, codec)
+    page, next_cursor = paginate(results, lambda f: (f.path,), limit, cursor)
+    return json_list_response([f.to_model() for f in page], next_cursor=next_cursor)
+
+
+@router.get("/api/media/index", response_model=MediaIndexStatus)
+async def media_index_status():
+    """Get the progress of the background media indexer."""
+    return media_indexer.status()
+
+
+@router.get("/api/media/thumbnail")
+async def get_media_thumbnail(
+    path: str = Query(..., description="File path relative to the media directory"),
+    kind: Literal["poster", "sprite"] = "poster"
+):
+    """
+    Get the poster frame or sprite sheet of a media file.
+
+    Redirects to the stored image when it exists. Otherwise the file is
+    queued for background generation and 202 is returned; retry later.
+    """
+    if not thumbnail_service.enabled:
+        raise HTTPException(status_code=503, detail="Thumbnails are disabled")
+
+    validated_path = await asyncio.to_thread(validate_path, path, settings.media_dir)
+    identity = await asyncio.to_thread(thumbnail_service.identify, validated_path)
+    if not identity:
+        raise HTTPException(status_code=404, detail="Path not found")
+
+    name = thumbnail_service.ready_name(identity, kind)
+    if name:
+        return RedirectResponse(url=f"/api/media/thumbnails/{name}", status_code=307)
+
+    if thumbnail_service.is_failed(identity):
+        raise HTTPException(status_code=404, detail="No thumbnail available for this file")
+
+    thumbnail_service.enqueue(validated_path)
+    return JSONResponse(status_code=202, content={"status": "pending"}, headers={"Retry-After": "5"})
+
+
+@router.get("/api/media/thumbnails/{name}")
+async def get_thumbnail_image(name: str):
+    """
+    Serve a stored thumbnail image.
+
+    Names are content addresses of a file version, so the image behind a
+    name never changes and may be cached indefinitely.
+    """
+    if not IMAGE_NAME.match(name):
+        raise HTTPException(status_code=400, detail="Invalid thumbnail name")
+
+    image_path = thumbnail_service.image_path(name)
+    if not await path_exists(image_path):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    return FileResponse(
+        image_path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
 @router.delete("/api/uploads/logo/{channel_id}")
 async def delete_logo(channel_id: str):
     """
@@ -127,12 +277,8 @@ async def delete_logo(channel_id: str):
     Raises:
         HTTPException: If deletion fails
     """
-    deleted_count = 0
-
     try:
-        for logo_file in settings.logos_dir.glob(f"{channel_id}_*"):
-            logo_file.unlink()
-            deleted_count += 1
+        deleted_count = await asyncio.to_thread(logo_store.delete_logos, channel_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete logo: {str(e)}")
 
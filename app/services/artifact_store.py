@@ -0,0 +1,131 @@
+"""Content-hashed, precompressed copies of the M3U and XMLTV documents."""
+import asyncio
+import hashlib
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+
+class Artifact:
+    """One materialized version of a generated document."""
+
+    def __init__(
+        self,
+        etag: str,
+        last_modified: float,
+        size: int,
+        encodings: Dict[str, bytes],
+        identity: Optional[bytes] = None,
+        version: Any = None
+    ):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        # Content-Encoding -> compressed body
+        self.encodings = encodings
+        # Uncompressed body, if it is kept in memory
+        self.identity = identity
+        # The inputs the document was generated from, as given to materialize()
+        self.version = version
+
+
+class ArtifactStore:
+    def __init__(self):
+        self._artifacts: Dict[str, Artifact] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def available_encodings(self) -> list:
+        """Content encodings the store produces, in order of preference."""
+        return ['zstd', 'gzip'] if zstandard else ['gzip']
+
+    async def materialize(
+        self,
+        name: str,
+        produce: Callable[[], AsyncIterator[bytes]],
+        keep_identity: bool = True,
+        version: Any = None
+    ) -> Artifact:
+        """
+        Return the current artifact for a document, regenerating it only
+        when its inputs have changed.
+
+        When `version` equals that of the stored artifact, the document is
+        not produced at all. Otherwise it is produced once, hashed and
+        compressed chunk by chunk in a worker thread, so the ETag always
+        describes the bytes served. If the content turns out unchanged, the
+        stored artifact and its Last-Modified are kept.
+
+        Args:
+            name: Artifact name, e.g. "xmltv"
+            produce: Callable returning a fresh async iterator of document chunks
+            keep_identity: Keep the uncompressed body in memory; disable for
+                large documents that are streamed from the generator instead
+            version: Comparable description of everything the document is
+                generated from; None regenerates on every call
+
+        Returns:
+            The current Artifact
+        """
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            current = self._artifacts.get(name)
+            if version is not None and current and current.version == version:
+                return current
+
+            artifact = await self._build(produce, keep_identity)
+            artifact.version = version
+            if current and current.etag == artifact.etag:
+                current.version = version
+                return current
+
+            self._artifacts[name] = artifact
+            return artifact
+
+    async def _build(
+        self,
+        produce: Callable[[], AsyncIterator[bytes]],
+        keep_identity: bool
+    ) -> Artifact:
+        # wbits 31 produces a gzip container rather than raw zlib
+        compressors = {'gzip': zlib.compressobj(6, zlib.DEFLATED, 31)}
+        if zstandard:
+            compressors['zstd'] = zstandard.ZstdCompressor(level=9).compressobj()
+
+        outputs: Dict[str, list] = {encoding: [] for encoding in compressors}
+        identity = []
+        size = 0
+        digest = hashlib.sha256()
+
+        def feed(chunk: bytes) -> None:
+            digest.update(chunk)
+            for encoding, compressor in compressors.items():
+                outputs[encoding].append(compressor.compress(chunk))
+
+        async for chunk in produce():
+            size += len(chunk)
+            if keep_identity:
+                identity.append(chunk)
+            await asyncio.to_thread(feed, chunk)
+
+        encodings = {}
+        for encoding, compressor in compressors.items():
+            outputs[encoding].append(compressor.flush())
+            encodings[encoding] = b"".join(outputs[encoding])
+
+        return Artifact(
+            etag=f'"{digest.hexdigest()[:32]}"',
+            last_modified=time.time(),
+            size=size,
+            encodings=encodings,
+            identity=b"".join(identity) if keep_identity else None
+        )
+
+
+# Global instance
+artifact_store = ArtifactStore()
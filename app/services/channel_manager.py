@@ -1,63 +1,68 @@
-import json
+import asyncio
 import uuid
 from pathlib import Path
 from typing import List, Optional
-from app.models.channel import Channel
+from app.models.channel import Channel, ChannelSummary
 from app.config import settings
+from app.services.logo_store import logo_store
+from app.services.weekly_schedule import check_overlaps
+from app.utils.files import JsonModelCache, list_json_files, path_exists, unlink
 
 
 class ChannelManager:
     def __init__(self):
         self.channels_dir = settings.channels_dir
+        self._cache: JsonModelCache[Channel] = JsonModelCache(Channel)
 
-    def list_channels(self) -> List[Channel]:
+    async def list_channels(self) -> List[Channel]:
         """List all channels from JSON files."""
         channels = []
-        for json_file in self.channels_dir.glob("*.json"):
+        for json_file in await list_json_files(self.channels_dir):
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    channel = Channel(**data)
+                channel = await self._cache.load(json_file)
+                if channel:
                     channels.append(channel)
             except Exception as e:
                 print(f"Error loading channel {json_file}: {e}")
 
-        # Sort by channel number
-        channels.sort(key=lambda x: x.number)
+        # Sort by channel number, then ID: the order GET /api/channels pages through
+        channels.sort(key=lambda x: (x.number, x.id))
         return channels
 
-    def get_channel(self, channel_id: str) -> Optional[Channel]:
+    async def get_channel(self, channel_id: str) -> Optional[Channel]:
         """Get a specific channel by ID."""
         json_file = self.channels_dir / f"{channel_id}.json"
-        if not json_file.exists():
-            return None
-
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return Channel(**data)
+            return await self._cache.load(json_file)
         except Exception as e:
             print(f"Error loading channel {channel_id}: {e}")
             return None
 
-    def validate_channel(self, channel: Channel) -> None:
-        """Validate channel references valid playlist."""
+    async def validate_channel(self, channel: Channel) -> None:
+        """Validate channel references valid playlists and its time slots don't conflict."""
+        from app.services.playlist_manager import playlist_manager
+
         if channel.playlist_id:
-            from app.services.playlist_manager import playlist_manager
-            if not playlist_manager.get_playlist(channel.playlist_id):
+            if not await playlist_manager.get_playlist(channel.playlist_id):
                 raise ValueError(f"Playlist {channel.playlist_id} not found")
 
-    def create_channel(self, channel: Channel) -> Channel:
+        for scheduled in channel.scheduled_playlists:
+            if not await playlist_manager.get_playlist(scheduled.playlist_id):
+                raise ValueError(f"Playlist {scheduled.playlist_id} not found")
+
+        check_overlaps(channel.scheduled_playlists)
+
+    async def create_channel(self, channel: Channel) -> Channel:
         """Create a new channel."""
         # Validate playlist reference
-        self.validate_channel(channel)
+        await self.validate_channel(channel)
 
         # Generate ID if not provided
         if not channel.id:
             channel.id = str(uuid.uuid4())
 
         # Ensure unique channel number
-        existing_channels = self.list_channels()
+        existing_channels = await self.list_channels()
         used_numbers = {ch.number for ch in existing_channels}
         if channel.number in used_numbers:
             # Find next available number
@@ -65,34 +70,32 @@ class ChannelManager:
 
         # Save to file
         json_file = self.channels_dir / f"{channel.id}.json"
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(channel.model_dump(mode='json'), f, indent=2, default=str)
+        await self._cache.store(json_file, channel)
 
         return channel
 
-    def update_channel(self, channel_id: str, channel: Channel) -> Optional[Channel]:
+    async def update_channel(self, channel_id: str, channel: Channel) -> Optional[Channel]:
         """Update an existing channel."""
         json_file = self.channels_dir / f"{channel_id}.json"
-        if not json_file.exists():
+        if not await path_exists(json_file):
             return None
 
         # Validate playlist reference
-        self.validate_channel(channel)
+        await self.validate_channel(channel)
 
         # Ensure ID matches
         channel.id = channel_id
 
         # Save to file
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(channel.model_dump(mode='json'), f, indent=2, default=str)
+        await self._cache.store(json_file, channel)
 
         return channel
 
-    def get_channel_with_playlist(self, channel_id: str) -> Optional[dict]:
+    async def get_channel_with_playlist(self, channel_id: str) -> Optional[dict]:
         """Get channel with resolved playlist data."""
         from app.services.playlist_manager import playlist_manager
 
-        channel = self.get_channel(channel_id)
+        channel = await self.get_channel(channel_id)
         if not channel:
             return None
 
@@ -100,7 +103,7 @@ class ChannelManager:
 
         # Resolve playlist reference
         if channel.playlist_id:
-            playlist = playlist_manager.get_playlist(channel.playlist_id)
+            playlist = await playlist_manager.get_playlist(channel.playlist_id)
             if playlist:
                 result['playlist_items'] = playlist.items
                 result['playlist_name'] = playlist.name
@@ -113,28 +116,43 @@ class ChannelManager:
 
         return result
 
-    def delete_channel(self, channel_id: str) -> bool:
-        """Delete a channel and its associated logo file."""
+    async def delete_channel(self, channel_id: str) -> bool:
+        """Delete a channel and its logo files, including every size variant."""
         json_file = self.channels_dir / f"{channel_id}.json"
-        if not json_file.exists():
+        if not await path_exists(json_file):
             return False
 
         # Check if channel has a logo file to delete
         try:
-            channel = self.get_channel(channel_id)
+            channel = await self.get_channel(channel_id)
             if channel and channel.logo_url and channel.logo_url.startswith('/logos/'):
                 # Extract filename from URL
                 logo_filename = channel.logo_url.replace('/logos/', '')
                 logo_file = settings.logos_dir / logo_filename
-                if logo_file.exists():
-                    logo_file.unlink()
+                if await path_exists(logo_file):
+                    await unlink(logo_file)
+            # The other sizes and formats generated on upload
+            await asyncio.to_thread(logo_store.delete_logos, channel_id)
         except Exception as e:
             print(f"Error deleting logo for channel {channel_id}: {e}")
             # Continue with channel deletion even if logo deletion fails
 
-        json_file.unlink()
+        await unlink(json_file)
+        self._cache.invalidate(json_file)
         return True
 
+    def summarize(self, channel: Channel) -> ChannelSummary:
+        """Build the list-view summary of a channel, without its embedded playlist."""
+        fields = {
+            name: getattr(channel, name)
+            for name in ChannelSummary.model_fields
+            if name in Channel.model_fields
+        }
+        return ChannelSummary.model_construct(
+            **fields,
+            embedded_item_count=len(channel.playlist)
+        )
+
 
 # Global instance
 channel_manager = ChannelManager()
@@ -0,0 +1,187 @@
+"""Places live encodes on CPU cores, with thread caps and priorities, keeping a core free for the API."""
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.models.channel import StreamSettings
+from app.utils.ffmpeg import video_encoder_for
+from app.config import settings
+
+# Cores an encode gets by transcode preset; hardware encoders mostly need one for demuxing and audio
+PRESET_CORES = {
+    'software_medium': 4,
+    'software_fast': 2,
+    'software_faster': 2,
+    'software_fastest': 1,
+    'qsv': 1,
+    'nvenc': 1,
+}
+DEFAULT_CORES = 2
+# Period of cgroup cpu.max quotas in microseconds (the kernel default)
+CGROUP_PERIOD = 100000
+
+
+def available_cores() -> List[int]:
+    """CPU cores this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class EncodePlacement:
+    """Where and how one encode runs: CPU cores, x264 threads, priorities and cgroup."""
+
+    def __init__(self, cores: List[int], threads: Optional[int], nice: int, cgroup: Optional[Path]):
+        self.cores = cores
+        self.threads = threads
+        self.nice = nice
+        self.cgroup = cgroup
+
+    def wrap_command(self, cmd: List[str]) -> List[str]:
+        """Prefix the command with ionice when an I/O priority is configured and available."""
+        if settings.encode_ionice < 0 or sys.platform == 'win32':
+            return cmd
+        ionice = shutil.which('ionice')
+        if ionice is None:
+            return cmd
+        # ionice execs the command, so the Popen pid stays FFmpeg's; -t ignores refused priorities
+        return [ionice, '-t', '-c', '2', '-n', str(settings.encode_ionice)] + cmd
+
+    def popen_kwargs(self) -> dict:
+        """Subprocess arguments for the priority on Windows, where apply() has nothing to set."""
+        if sys.platform == 'win32' and self.nice > 0:
+            return {'creationflags': subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+        return {}
+
+    def apply(self, pid: int) -> None:
+        """
+        Move a started encode into its cgroup and apply its niceness and CPU affinity.
+
+        This runs after the process has started rather than in a preexec_fn,
+        which isn't safe in a process with threads. Niceness and affinity
+        are per thread on Linux, so they are set on every thread FFmpeg has
+        started so far; later threads inherit them. Failures must not stop
+        the encode.
+        """
+        if sys.platform == 'win32':
+            return
+        if self.cgroup is not None:
+            try:
+                (self.cgroup / 'cgroup.procs').write_text(str(pid))
+            except OSError:
+                pass
+        try:
+            threads = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+        except OSError:
+            threads = [pid]
+        for tid in threads:
+            if self.nice:
+                try:
+                    os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, 0) + self.nice)
+                except OSError:
+                    # Raising priority needs privileges
+                    pass
+            if self.cores and hasattr(os, 'sched_setaffinity'):
+                try:
+                    os.sched_setaffinity(tid, self.cores)
+                except OSError:
+                    pass
+
+
+class CpuAllocator:
+    """
+    Assigns CPU cores to live encodes.
+
+    The first settings.encode_reserved_cores cores are left to the API
+    server. Each encode is pinned to the least-used of the remaining cores,
+    so encodes spread evenly before any core is shared. An encode takes
+    the stream settings' cpu_cores, or the number its preset needs, and
+    libx264 is capped to that many threads. With settings.encode_cgroup
+    pointing at a cgroup v2 directory delegated to TroutTV, each encode
+    also gets a child cgroup whose cpu.max limits it to its cores.
+    """
+
+    def __init__(self):
+        cores = available_cores()
+        reserved = settings.encode_reserved_cores
+        # A machine with no cores to spare shares them all
+        self.cores = cores[reserved:] if len(cores) > reserved else cores
+        self.assignments: Dict[str, List[int]] = {}
+        self._cgroup_warned = False
+
+    def allocate(self, channel_id: str, stream_settings: StreamSettings) -> EncodePlacement:
+        """
+        Place a channel's encode; replaces the channel's previous placement.
+
+        Args:
+            channel_id: ID of the channel
+            stream_settings: Stream settings of the encode, at the governor's level
+
+        Returns:
+            Placement to start FFmpeg with
+        """
+        self.release(channel_id)
+        preset = stream_settings.transcode_preset.lower()
+        wanted = stream_settings.cpu_cores or PRESET_CORES.get(preset, DEFAULT_CORES)
+        count = max(1, min(wanted, len(self.cores)))
+
+        cores: List[int] = []
+        if settings.encode_pinning:
+            usage = {core: 0 for core in self.cores}
+            for assigned in self.assignments.values():
+                for core in assigned:
+                    if core in usage:
+                        usage[core] += 1
+            # Least-used first; ties go to the lowest core so encodes pack together
+            cores = sorted(sorted(self.cores, key=lambda core: (usage[core], core))[:count])
+            self.assignments[channel_id] = cores
+
+        # Thread caps only apply to libx264; hardware encoders manage their own
+        threads = count if video_encoder_for(preset) == 'libx264' else None
+        nice = stream_settings.nice if stream_settings.nice is not None else settings.encode_nice
+        return EncodePlacement(cores, threads, nice, self._create_cgroup(channel_id, count))
+
+    def release(self, channel_id: str) -> None:
+        """Free a channel's cores once its encode has exited."""
+        self.assignments.pop(channel_id, None)
+        cgroup = self._cgroup_path(channel_id)
+        if cgroup is not None:
+            try:
+                # Only succeeds once the cgroup is empty
+                cgroup.rmdir()
+            except OSError:
+                pass
+
+    def cores_of(self, channel_id: str) -> Optional[List[int]]:
+        return self.assignments.get(channel_id)
+
+    def _cgroup_path(self, channel_id: str) -> Optional[Path]:
+        if not settings.encode_cgroup:
+            return None
+        return Path(settings.encode_cgroup) / ("encode-" + re.sub(r'[^A-Za-z0-9_.-]', '_', channel_id))
+
+    def _create_cgroup(self, channel_id: str, cores: int) -> Optional[Path]:
+        cgroup = self._cgroup_path(channel_id)
+        if cgroup is None:
+            return None
+        quota = int(cores * settings.encode_cpu_max * CGROUP_PERIOD)
+        try:
+            subtree_control = cgroup.parent / 'cgroup.subtree_control'
+            if 'cpu' not in subtree_control.read_text().split():
+                subtree_control.write_text('+cpu')
+            cgroup.mkdir(exist_ok=True)
+            (cgroup / 'cpu.max').write_text(f"{quota} {CGROUP_PERIOD}")
+        except OSError as e:
+            # Not cgroup v2, not delegated, or not writable; run without a quota
+            if not self._cgroup_warned:
+                print(f"Cannot use cgroup {cgroup.parent} for encodes: {e}")
+                self._cgroup_warned = True
+            return None
+        return cgroup
+
+
+# Global instance
+cpu_allocator = CpuAllocator()
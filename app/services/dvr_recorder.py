@@ -0,0 +1,389 @@
+"""
+Timeshift and catch-up: keeps the live HLS segments of DVR channels beyond FFmpeg's window.
+
+FFmpeg deletes segments once they drop out of its short live playlist.
+For channels with a DVR window, each new segment is hard-linked into
+settings.dvr_dir as it appears (copied where the directories are on
+different filesystems), so rewinding and catch-up cost no extra encoding.
+"""
+import asyncio
+import bisect
+import heapq
+import json
+import math
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.services.channel_manager import channel_manager
+from app.utils.hls import format_program_date_time, parse_media_playlist
+from app.config import settings
+
+# Seconds between checks of the live playlists of recording channels
+POLL_INTERVAL = 1.0
+# Seconds between retention passes
+RETENTION_INTERVAL = 30
+# Gap in seconds between consecutive segments that is played as a discontinuity
+DISCONTINUITY_GAP = 1.0
+INDEX_NAME = "index.jsonl"
+
+
+class ArchivedSegment:
+    """One retained segment; start is a UTC timestamp."""
+
+    __slots__ = ('name', 'start', 'duration', 'size', 'sequence', 'discontinuity_sequence')
+
+    def __init__(self, name: str, start: float, duration: float, size: int, sequence: int, discontinuity_sequence: int):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.size = size
+        self.sequence = sequence
+        self.discontinuity_sequence = discontinuity_sequence
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    def to_json(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'ArchivedSegment':
+        return cls(**{slot: data[slot] for slot in cls.__slots__})
+
+
+class ChannelArchive:
+    """Retained segments of one channel, oldest first, with an append-only index file."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.segments: List[ArchivedSegment] = []
+        # Start times, parallel to segments, for bisecting by time
+        self.starts: List[float] = []
+        # Capture state of the current encode: segment names already archived and where it got to
+        self.captured: set = set()
+        self.run_end: Optional[float] = None
+        self.new_run = True
+
+    def load(self) -> None:
+        """Read the index, dropping entries whose files are gone."""
+        try:
+            lines = (self.directory / INDEX_NAME).read_text(encoding='utf-8').splitlines()
+            files = set(os.listdir(self.directory))
+        except OSError:
+            return
+        # Later entries win, so a segment in the index twice is loaded once
+        segments: Dict[str, ArchivedSegment] = {}
+        for line in lines:
+            try:
+                segment = ArchivedSegment.from_json(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+            if segment.name in files:
+                segments[segment.name] = segment
+        self.segments = sorted(segments.values(), key=lambda segment: segment.start)
+        self.starts = [segment.start for segment in self.segments]
+
+    def append(self, segment: ArchivedSegment) -> None:
+        """Add a segment in memory; write_index() records it on disk."""
+        self.segments.append(segment)
+        self.starts.append(segment.start)
+
+    def write_index(self, segments: List[ArchivedSegment]) -> None:
+        """Append segments to the index file."""
+        with open(self.directory / INDEX_NAME, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(segment.to_json()) + "\n" for segment in segments))
+
+    def evict(self, count: int) -> int:
+        """Delete the oldest segments; returns the bytes freed."""
+        evicted, self.segments = self.segments[:count], self.segments[count:]
+        self.starts = self.starts[count:]
+        freed = 0
+        for segment in evicted:
+            try:
+                (self.directory / segment.name).unlink()
+            except OSError:
+                pass
+            freed += segment.size
+        self._rewrite_index()
+        return freed
+
+    def _rewrite_index(self) -> None:
+        temp_path = self.directory / (INDEX_NAME + ".tmp")
+        temp_path.write_text(
+            "".join(json.dumps(segment.to_json()) + "\n" for segment in self.segments),
+            encoding='utf-8'
+        )
+        os.replace(temp_path, self.directory / INDEX_NAME)
+
+    def between(self, start: float, end: float) -> List[ArchivedSegment]:
+        """Segments overlapping [start, end)."""
+        first = max(bisect.bisect_right(self.starts, start) - 1, 0)
+        return [
+            segment for segment in self.segments[first:bisect.bisect_left(self.starts, end)]
+            if segment.end > start
+        ]
+
+    @property
+    def size(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+
+class DvrRecorder:
+    """
+    Archives the segments of DVR channels and serves them as playlists.
+
+    Retention works in two tiers. Each channel keeps the segments of its
+    own DVR window (stream_settings.dvr_window minutes). When all
+    archives together exceed settings.dvr_quota_gb, the oldest segments
+    across all channels go first until the archive fits.
+    """
+
+    def __init__(self):
+        self.dvr_dir = settings.dvr_dir
+        self.archives: Dict[str, ChannelArchive] = {}
+        # Channels whose live output is being archived
+        self.recording: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_recording(self, channel_id: str) -> bool:
+        return channel_id in self.recording
+
+    async def track(self, channel_id: str) -> None:
+        """Archive a channel's live output from a newly started encode."""
+        archive = await self._archive(channel_id)
+        # A new encode starts new timestamps. Segment names continue the
+        # channel's numbering, and the new encode appends to the playlist of
+        # the previous one, whose segments untrack() already archived.
+        try:
+            text = await asyncio.to_thread(
+                (settings.streams_dir / channel_id / "stream.m3u8").read_text, encoding='utf-8'
+            )
+            _, entries = parse_media_playlist(text)
+        except OSError:
+            entries = []
+        archive.captured = {entry.name for entry in entries}
+        archive.run_end = None
+        archive.new_run = True
+        self.recording.add(channel_id)
+
+    async def untrack(self, channel_id: str) -> None:
+        """Stop archiving a channel, first picking up what its encode wrote last."""
+        if channel_id not in self.recording:
+            return
+        await self.capture(channel_id)
+        self.recording.discard(channel_id)
+
+    async def _archive(self, channel_id: str) -> ChannelArchive:
+        archive = self.archives.get(channel_id)
+        if archive is None:
+            archive = await asyncio.to_thread(self._open_archive, channel_id)
+            # Another caller may have opened it meanwhile
+            archive = self.archives.setdefault(channel_id, archive)
+        return archive
+
+    def _open_archive(self, channel_id: str) -> ChannelArchive:
+        archive = ChannelArchive(self.dvr_dir / channel_id)
+        archive.directory.mkdir(parents=True, exist_ok=True)
+        archive.load()
+        return archive
+
+    async def _run(self) -> None:
+        for archive in await asyncio.to_thread(self._load_all):
+            self.archives.setdefault(archive.directory.name, archive)
+        last_retention = 0.0
+        while True:
+            try:
+                for channel_id in list(self.recording):
+                    await self.capture(channel_id)
+                if time.monotonic() - last_retention >= RETENTION_INTERVAL:
+                    last_retention = time.monotonic()
+                    await self.enforce_retention()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in DVR recorder: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _load_all(self) -> List[ChannelArchive]:
+        """Read the archives of earlier runs, so retention covers them too."""
+        if not self.dvr_dir.exists():
+            return []
+        return [
+            self._open_archive(directory.name)
+            for directory in self.dvr_dir.iterdir() if directory.is_dir()
+        ]
+
+    async def capture(self, channel_id: str) -> None:
+        """Archive the segments of a channel's live playlist that are new since the last call."""
+        live_dir = settings.streams_dir / channel_id
+        archive = await self._archive(channel_id)
+        try:
+            text = await asyncio.to_thread((live_dir / "stream.m3u8").read_text, encoding='utf-8')
+        except OSError:
+            return
+        _, entries = parse_media_playlist(text)
+        new = [entry for entry in entries if entry.name not in archive.captured]
+        if not new:
+            return
+
+        # Without EXT-X-PROGRAM-DATE-TIME, the first capture of an encode dates
+        # its segments back from now; later ones continue where it got to
+        if archive.run_end is None:
+            end = time.time()
+            run_end = end - sum(entry.duration for entry in entries[entries.index(new[0]):])
+        else:
+            run_end = archive.run_end
+
+        added: List[ArchivedSegment] = []
+        for entry in new:
+            start = entry.program_date_time if entry.program_date_time is not None else run_end
+            name = f"{int(start * 1000)}.ts"
+            archive.captured.add(entry.name)
+            size = await asyncio.to_thread(self._link, live_dir / entry.name, archive.directory / name)
+            if size is None:
+                continue
+
+            previous = archive.segments[-1] if archive.segments else None
+            discontinuity = previous is not None and (
+                archive.new_run or entry.discontinuity or abs(start - previous.end) > DISCONTINUITY_GAP
+            )
+            archive.new_run = False
+            segment = ArchivedSegment(
+                name=name,
+                start=start,
+                duration=entry.duration,
+                size=size,
+                sequence=previous.sequence + 1 if previous else 0,
+                discontinuity_sequence=(previous.discontinuity_sequence + discontinuity) if previous else 0
+            )
+            archive.append(segment)
+            added.append(segment)
+            run_end = start + entry.duration
+
+        archive.run_end = run_end
+        if added:
+            await asyncio.to_thread(archive.write_index, added)
+
+    def _link(self, source: Path, target: Path) -> Optional[int]:
+        """Archive a live segment; returns the size of the archived file, or None if there was nothing to archive."""
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            return None
+        except OSError:
+            # Different filesystems, or the segment was deleted meanwhile
+            try:
+                shutil.copyfile(source, target)
+            except OSError:
+                return None
+        try:
+            return target.stat().st_size
+        except OSError:
+            return None
+
+    async def enforce_retention(self) -> None:
+        """Evict segments outside each channel's window, then the oldest overall while over quota."""
+        now = time.time()
+        for channel_id, archive in list(self.archives.items()):
+            channel = await channel_manager.get_channel(channel_id)
+            window = channel.stream_settings.dvr_window * 60 if channel else 0
+            expired = bisect.bisect_left([segment.end for segment in archive.segments], now - window)
+            if expired:
+                await asyncio.to_thread(archive.evict, expired)
+
+        quota = settings.dvr_quota_gb * 1024 ** 3
+        archives = list(self.archives.values())
+        excess = sum(archive.size for archive in archives) - quota
+        if excess <= 0:
+            return
+        # Walk all segments oldest first, counting how many each archive must
+        # give up, then evict each archive's share in one go
+        cuts = [0] * len(archives)
+        oldest_first = heapq.merge(*(
+            [(segment.start, index, segment.size) for segment in archive.segments]
+            for index, archive in enumerate(archives)
+        ))
+        for _, index, size in oldest_first:
+            if excess <= 0:
+                break
+            cuts[index] += 1
+            excess -= size
+        for archive, cut in zip(archives, cuts):
+            if cut:
+                await asyncio.to_thread(archive.evict, cut)
+
+    def segment_path(self, channel_id: str, name: str) -> Optional[Path]:
+        """Path of a retained segment, or None if the channel has no archive."""
+        archive = self.archives.get(channel_id)
+        return archive.directory / name if archive is not None else None
+
+    def covers(self, channel_id: str, start: float, end: float) -> bool:
+        """Whether any retained segment overlaps [start, end)."""
+        archive = self.archives.get(channel_id)
+        return bool(archive and archive.between(start, end))
+
+    def render_playlist(self, channel_id: str, start: Optional[float] = None, end: Optional[float] = None) -> Optional[str]:
+        """
+        Playlist of retained segments, by default all of them.
+
+        The whole archive is a sliding window for timeshift. A time range,
+        for catch-up of a programme, ends with EXT-X-ENDLIST once it is
+        fully archived; while the programme is still airing it is an EVENT
+        playlist that grows as segments arrive.
+
+        Returns:
+            The playlist, or None if no segment overlaps
+        """
+        archive = self.archives.get(channel_id)
+        if archive is None:
+            return None
+        if start is None:
+            segments = archive.segments
+        else:
+            segments = archive.between(start, end if end is not None else math.inf)
+        if not segments:
+            return None
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max(segment.duration for segment in segments))}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0].sequence}",
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{segments[0].discontinuity_sequence}",
+        ]
+        finished = False
+        if start is not None:
+            finished = end is not None and (segments[-1].end >= end - DISCONTINUITY_GAP or channel_id not in self.recording)
+            lines.append("#EXT-X-PLAYLIST-TYPE:VOD" if finished else "#EXT-X-PLAYLIST-TYPE:EVENT")
+
+        previous = None
+        for segment in segments:
+            if previous is not None and segment.discontinuity_sequence != previous.discontinuity_sequence:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{format_program_date_time(segment.start)}")
+            lines.append(f"#EXTINF:{segment.duration:.6f},")
+            lines.append(f"dvr/{segment.name}")
+            previous = segment
+
+        if finished:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+
+# Global instance
+dvr_recorder = DvrRecorder()
@@ -0,0 +1,227 @@
+"""Keeps live encodes at realtime by stepping channels down (and back up) a quality ladder."""
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from app.models.channel import StreamSettings
+from app.models.stream import EncoderStatus
+from app.config import settings
+
+# Software presets from slowest to fastest; see FFmpegBuilder.build_hls_command
+SOFTWARE_PRESETS = ['software_medium', 'software_fast', 'software_faster', 'software_fastest']
+# Heights tried when stepping the resolution down, keeping 16:9 widths
+RESOLUTION_STEPS = [(1920, 1080), (1280, 720), (960, 540), (854, 480), (640, 360)]
+# Bitrate steps applied last, as a share of the configured video bitrate
+BITRATE_STEPS = [0.75, 0.5]
+MIN_VIDEO_BITRATE = 500  # kbps
+
+# Seconds after a (re)start before speed is judged; seeking and probing make it noisy
+WARMUP_SECONDS = 10
+# Longest wait before trying a step up again after step-ups kept failing
+MAX_RECOVER_SECONDS = 3600
+
+
+def _parse_resolution(resolution: str) -> Optional[Tuple[int, int]]:
+    try:
+        width, height = resolution.lower().split('x')
+        return int(width), int(height)
+    except (AttributeError, ValueError):
+        return None
+
+
+def quality_ladder(base: StreamSettings) -> List[StreamSettings]:
+    """
+    Progressively cheaper variants of a channel's stream settings.
+
+    Level 0 is the configured settings. Software encodes first move to
+    faster x264 presets, then every encode steps down in resolution and
+    finally in bitrate. Hardware encoders have no preset steps.
+
+    Returns:
+        Stream settings per level, most expensive first
+    """
+    ladder = [base]
+    current = base
+
+    preset = base.transcode_preset.lower()
+    if preset in SOFTWARE_PRESETS:
+        for faster in SOFTWARE_PRESETS[SOFTWARE_PRESETS.index(preset) + 1:]:
+            current = current.model_copy(update={'transcode_preset': faster})
+            ladder.append(current)
+
+    size = _parse_resolution(current.resolution)
+    if size:
+        for width, height in RESOLUTION_STEPS:
+            if height < size[1]:
+                current = current.model_copy(update={'resolution': f"{width}x{height}"})
+                ladder.append(current)
+
+    for share in BITRATE_STEPS:
+        bitrate = max(int(base.video_bitrate * share), MIN_VIDEO_BITRATE)
+        if bitrate < current.video_bitrate:
+            current = current.model_copy(update={'video_bitrate': bitrate})
+            ladder.append(current)
+
+    return ladder
+
+
+def parse_speed(value: Optional[str]) -> Optional[float]:
+    """Parse ffmpeg's speed field, e.g. "0.98x"; "N/A" gives None."""
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+class ChannelEncoder:
+    """Governor state of one channel's encode."""
+
+    def __init__(self, ladder: List[StreamSettings]):
+        self.ladder = ladder
+        self.level = 0
+        self.started = time.monotonic()
+        # (monotonic time, seconds of media encoded) over the last window
+        self.samples: Deque[Tuple[float, float]] = deque()
+        self.steady_since: Optional[float] = None
+        self.recover_after = float(settings.governor_recover_after)
+        self.last_step_down: Optional[float] = None
+        self.last_step_up: Optional[float] = None
+        self.progress: Dict[str, str] = {}
+        self.window_speed: Optional[float] = None
+
+    def restart(self, now: float) -> None:
+        self.started = now
+        self.samples.clear()
+        self.steady_since = None
+        self.window_speed = None
+
+
+class EncoderGovernor:
+    """
+    Watches the -progress output of each live encode and adjusts its quality.
+
+    Speed is measured over a sliding window of settings.governor_window
+    seconds as media time encoded per wall-clock second. ffmpeg's own speed
+    field is an average since the start, which reacts far too slowly. When
+    the window speed stays below settings.governor_min_speed, the channel
+    steps one level down its quality ladder.
+
+    Inputs are read with -re, so speed cannot rise above 1.0x to show
+    headroom. Instead, after settings.governor_recover_after seconds at
+    realtime the governor steps back up one level. If that level falls
+    behind again soon after, the wait before the next attempt doubles.
+    """
+
+    def __init__(self):
+        self.enabled = settings.governor_enabled
+        self.window = settings.governor_window
+        self.min_speed = settings.governor_min_speed
+        self._channels: Dict[str, ChannelEncoder] = {}
+
+    def settings_for(self, channel_id: str, base: StreamSettings) -> StreamSettings:
+        """
+        Stream settings for a new encode of a channel, at its current level.
+
+        Call whenever the channel's FFmpeg is (re)started.
+        """
+        ladder = quality_ladder(base)
+        encoder = self._channels.get(channel_id)
+        if encoder is None or encoder.ladder[0] != base:
+            # First start, or the channel's settings were edited
+            encoder = self._channels[channel_id] = ChannelEncoder(ladder)
+        encoder.restart(time.monotonic())
+        return ladder[encoder.level]
+
+    def forget(self, channel_id: str) -> None:
+        """Drop a channel's state once its stream stopped for good."""
+        self._channels.pop(channel_id, None)
+
+    def observe(self, channel_id: str, progress: Dict[str, str], now: Optional[float] = None) -> Optional[int]:
+        """
+        Take one -progress block of a channel's encode.
+
+        Args:
+            channel_id: ID of the channel
+            progress: Key/value pairs of the block (frame, fps, speed, out_time_us, ...)
+            now: Monotonic time of the block
+
+        Returns:
+            The level the channel should be restarted at, or None to keep it
+        """
+        encoder = self._channels.get(channel_id)
+        if encoder is None:
+            return None
+        now = time.monotonic() if now is None else now
+        encoder.progress = progress
+
+        try:
+            media_seconds = int(progress.get('out_time_us', '')) / 1_000_000
+        except ValueError:
+            return None
+        if now - encoder.started < WARMUP_SECONDS:
+            return None
+
+        encoder.samples.append((now, media_seconds))
+        while len(encoder.samples) > 2 and now - encoder.samples[1][0] >= self.window:
+            encoder.samples.popleft()
+
+        first_time, first_media = encoder.samples[0]
+        elapsed = now - first_time
+        if elapsed <= 0:
+            return None
+        encoder.window_speed = (media_seconds - first_media) / elapsed
+
+        if not self.enabled or elapsed < self.window * 0.9:
+            return None
+
+        if encoder.window_speed < self.min_speed:
+            encoder.steady_since = None
+            if encoder.level + 1 >= len(encoder.ladder):
+                return None
+            # Falling behind right after a step up: wait longer before the next one
+            if encoder.last_step_up and now - encoder.last_step_up < encoder.recover_after:
+                encoder.recover_after = min(encoder.recover_after * 2, MAX_RECOVER_SECONDS)
+            encoder.level += 1
+            encoder.last_step_down = now
+            encoder.restart(now)
+            return encoder.level
+
+        if encoder.steady_since is None:
+            encoder.steady_since = now
+        if encoder.level > 0 and now - encoder.steady_since >= encoder.recover_after:
+            encoder.level -= 1
+            encoder.last_step_up = now
+            encoder.restart(now)
+            return encoder.level
+
+        return None
+
+    def status(self, channel_id: str) -> Optional[EncoderStatus]:
+        encoder = self._channels.get(channel_id)
+        if encoder is None:
+            return None
+        current = encoder.ladder[encoder.level]
+        progress = encoder.progress
+
+        def number(key: str) -> Optional[float]:
+            try:
+                return float(progress[key])
+            except (KeyError, ValueError):
+                return None
+
+        return EncoderStatus(
+            level=encoder.level,
+            max_level=len(encoder.ladder) - 1,
+            transcode_preset=current.transcode_preset,
+            resolution=current.resolution,
+            video_bitrate=current.video_bitrate,
+            speed=round(encoder.window_speed, 3) if encoder.window_speed is not None else None,
+            reported_speed=parse_speed(progress.get('speed')),
+            fps=number('fps'),
+            frame=int(number('frame')) if number('frame') is not None else None,
+            drop_frames=int(number('drop_frames') or 0),
+            dup_frames=int(number('dup_frames') or 0)
+        )
+
+
+# Global instance
+encoder_governor = EncoderGovernor()
@@ -0,0 +1,195 @@
+"""Batch EPG computation for many channels over one time window."""
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+from app.models.channel import Channel
+from app.models.playlist import PlaylistItem
+from app.services.playlist_scheduler import playlist_scheduler
+from app.services.schedule_index import ScheduleIndex
+
+
+class ChannelGuide:
+    """
+    Programs of one channel within a window, stored as parallel arrays.
+
+    starts and ends are UTC timestamps; program k shows item
+    item_indexes[k] of the playlist sources[source_indexes[k]].
+    """
+
+    def __init__(
+        self,
+        channel: Channel,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        source_indexes: np.ndarray,
+        item_indexes: np.ndarray,
+        sources: List[ScheduleIndex]
+    ):
+        self.channel = channel
+        self.starts = starts
+        self.ends = ends
+        self.source_indexes = source_indexes
+        self.item_indexes = item_indexes
+        self.sources = sources
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def programs(self) -> Iterator[Tuple[float, float, PlaylistItem]]:
+        """Yield (start, end, item) for each program in order."""
+        source_indexes = self.source_indexes.tolist()
+        item_indexes = self.item_indexes.tolist()
+        for k, (start, end) in enumerate(zip(self.starts.tolist(), self.ends.tolist())):
+            yield start, end, self.sources[source_indexes[k]].items[item_indexes[k]]
+
+
+class EPGEngine:
+    def __init__(self):
+        self.scheduler = playlist_scheduler
+
+    async def build(self, channels: List[Channel], start: float, end: float) -> List[ChannelGuide]:
+        """
+        Compute the guide for every channel over [start, end).
+
+        Programs keep their real start and end times, so the first and last
+        may extend past the window. Each channel's time slots are resolved
+        first; the programs of every slot are then computed with array
+        operations over the playlist's cumulative offsets. Slots that share
+        a playlist, origin and window (for example channels running the same
+        playlist from the same start time) are computed once.
+
+        Args:
+            channels: Channels to schedule
+            start: Window start timestamp
+            end: Window end timestamp
+
+        Returns:
+            One ChannelGuide per channel, in input order
+        """
+        window_cache: Dict[tuple, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        return [await self._build_channel(channel, start, end, window_cache) for channel in channels]
+
+    async def now_next(self, channels: List[Channel], at: float) -> List[Tuple[Channel, list]]:
+        """
+        Find the program airing at a time and the one after it, per channel.
+
+        Args:
+            channels: Channels to look up
+            at: UTC timestamp
+
+        Returns:
+            One (channel, programs) pair per channel, in input order, where
+            programs holds up to two (start, end, item) tuples: the current
+            program and the next one. It is empty when nothing airs at that
+            time, and holds only the current program when nothing follows.
+        """
+        window_cache: Dict[tuple, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        results = []
+        for channel in channels:
+            guide = await self._build_channel(channel, at, at + 1, window_cache)
+            current = next(guide.programs(), None)
+            if current is None or current[0] > at:
+                results.append((channel, []))
+                continue
+
+            # Programs keep their real end, so the next one starts there
+            following = await self._build_channel(channel, current[1], current[1] + 1, window_cache)
+            upcoming = next(following.programs(), None)
+            results.append((channel, [current, upcoming] if upcoming else [current]))
+
+        return results
+
+    async def _build_channel(
+        self,
+        channel: Channel,
+        start: float,
+        end: float,
+        window_cache: Dict[tuple, Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    ) -> ChannelGuide:
+        slots = []
+        for slot_start, slot_end, owner, airtime in self._slots(channel, start, end):
+            index = await self.scheduler.get_slot_index(channel, owner)
+            if index:
+                slots.append((slot_start, slot_end, airtime, index))
+
+        return self._compute(channel, slots, start, end, window_cache)
+
+    def _slots(self, channel: Channel, start: float, end: float):
+        """Time slots of a channel overlapping the window."""
+        origin = self.scheduler.get_schedule_origin(channel)
+
+        weekly = self.scheduler.get_weekly_schedule(channel)
+        if weekly:
+            return weekly.iter_slots(start, end, origin)
+
+        # The channel's own playlist airs in one unbounded slot
+        if origin > start:
+            # Start time in future - the first item is shown from the window start
+            origin = start
+        return [(origin, float('inf'), None, 0.0)]
+
+    def _compute(
+        self,
+        channel: Channel,
+        slots: List[Tuple[float, float, float, ScheduleIndex]],
+        window_start: float,
+        window_end: float,
+        window_cache: Dict[tuple, Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    ) -> ChannelGuide:
+        sources: List[ScheduleIndex] = []
+        parts = []
+
+        for slot_start, slot_end, airtime, index in slots:
+            playlist_origin = slot_start - airtime
+            # Programs starting in the window; the last one keeps its real end
+            key = (
+                id(index), playlist_origin, max(slot_start, window_start),
+                min(slot_end, window_end), channel.loop
+            )
+            window = window_cache.get(key)
+            if window is None:
+                window = index.window_arrays(*key[1:])
+                window_cache[key] = window
+
+            starts, ends, item_indexes = window
+            if not len(starts):
+                continue
+
+            # Cut programs at the slot boundaries
+            starts = np.maximum(starts, slot_start)
+            ends = np.minimum(ends, slot_end)
+
+            if index not in sources:
+                sources.append(index)
+            source = np.full(len(starts), sources.index(index), dtype=np.int64)
+            parts.append((starts, ends, source, item_indexes))
+
+        if not parts:
+            empty = np.empty(0)
+            empty_int = np.empty(0, dtype=np.int64)
+            return ChannelGuide(channel, empty, empty, empty_int, empty_int, sources)
+
+        return ChannelGuide(
+            channel,
+            np.concatenate([part[0] for part in parts]),
+            np.concatenate([part[1] for part in parts]),
+            np.concatenate([part[2] for part in parts]),
+            np.concatenate([part[3] for part in parts]),
+            sources
+        )
+
+
+def format_xmltv_times(timestamps: np.ndarray) -> List[str]:
+    """Format UTC timestamps as XMLTV times (YYYYMMDDHHmmss +0000) in one pass."""
+    iso = np.datetime_as_string(timestamps.astype('datetime64[s]'), unit='s')
+    compact = np.char.replace(np.char.replace(np.char.replace(iso, '-', ''), ':', ''), 'T', '')
+    return np.char.add(compact, ' +0000').tolist()
+
+
+def format_iso_times(timestamps: np.ndarray) -> List[str]:
+    """Format UTC timestamps as ISO 8601 strings (YYYY-MM-DDTHH:MM:SSZ) in one pass."""
+    iso = np.datetime_as_string(timestamps.astype('datetime64[s]'), unit='s')
+    return np.char.add(iso, 'Z').tolist()
+
+
+# Global instance
+epg_engine = EPGEngine()
@@ -0,0 +1,124 @@
+"""Channel logo storage: uploads normalized into content-addressed size variants."""
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from app.config import settings
+
+# Bounding boxes of the stored variants, smallest first; images are never upscaled
+LOGO_SIZES = (128, 256, 512)
+LOGO_FORMATS = ('png', 'webp')
+
+# <channel id>_<source hash>_<size>.<format>
+LOGO_NAME = re.compile(r'^(?P<channel>[^/]+)_(?P<hash>[0-9a-f]{16})_(?P<size>\d+)\.(?P<format>png|webp)$')
+
+
+def variant_name(channel_id: str, digest: str, size: int, fmt: str) -> str:
+    return f"{channel_id}_{digest}_{size}.{fmt}"
+
+
+def nearest_size(size: int) -> int:
+    """Smallest stored size that is at least `size`, or the largest one."""
+    return next((s for s in LOGO_SIZES if s >= size), LOGO_SIZES[-1])
+
+
+class LogoStore:
+    """
+    Stores each uploaded logo as PNG and WebP variants at fixed sizes.
+
+    Variant names contain a hash of the uploaded bytes, so the file behind
+    a name never changes and can be cached by clients indefinitely. The
+    original upload is not kept.
+    """
+
+    def __init__(self):
+        self.logos_dir = settings.logos_dir
+
+    def create_variants(self, channel_id: str, source: Path, digest: str) -> Dict[str, str]:
+        """
+        Verify an uploaded image and write its variants.
+
+        Runs in a worker thread.
+
+        Args:
+            channel_id: ID of the channel
+            source: Uploaded file
+            digest: Hash of the uploaded bytes, used in the variant names
+
+        Returns:
+            Dictionary of "<size>.<format>" -> variant filename
+
+        Raises:
+            ValueError: If the file is not a readable image
+            OSError: If a variant can't be written
+        """
+        # Pillow is only needed for uploads; keep it out of startup
+        from PIL import Image, ImageOps, UnidentifiedImageError
+
+        try:
+            with Image.open(source) as image:
+                image.verify()
+            with Image.open(source) as image:
+                # Apply camera rotation; animated images keep their first frame
+                image = ImageOps.exif_transpose(image).convert('RGBA')
+        except (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError, OSError) as e:
+            raise ValueError(f"Invalid image: {e}") from e
+
+        variants = {}
+
+        for size in reversed(LOGO_SIZES):
+            # Each variant is scaled from the next larger one, which is much cheaper
+            # than scaling every variant from a large original
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for fmt in LOGO_FORMATS:
+                name = variant_name(channel_id, digest, size, fmt)
+                target = self.logos_dir / name
+                temp_path = target.with_name(f".{name}.tmp")
+                if fmt == 'png':
+                    image.save(temp_path, 'PNG', optimize=True)
+                else:
+                    image.save(temp_path, 'WEBP', quality=85, method=4)
+                os.replace(temp_path, target)
+                variants[f"{size}.{fmt}"] = name
+        return variants
+
+    def delete_logos(self, channel_id: str, keep: Iterable[str] = ()) -> int:
+        """Delete the logo files of a channel, except `keep`, and return how many were removed."""
+        keep = set(keep)
+        deleted_count = 0
+        for logo_file in self.logos_dir.glob(f"{channel_id}_*"):
+            if logo_file.name in keep:
+                continue
+            # The glob also matches channels whose ID extends this one, e.g. "news_2"
+            match = LOGO_NAME.match(logo_file.name)
+            if match and match['channel'] != channel_id:
+                continue
+            logo_file.unlink()
+            deleted_count += 1
+        return deleted_count
+
+    def variant_url(self, logo_url: Optional[str], size: int, fmt: str = 'png') -> Optional[str]:
+        """
+        URL of another variant of an uploaded logo.
+
+        URLs that are not stored variants (external links, logos uploaded
+        before variants existed) are returned unchanged.
+        """
+        if not logo_url or not logo_url.startswith('/logos/'):
+            return logo_url
+        match = LOGO_NAME.match(logo_url[len('/logos/'):])
+        if not match:
+            return logo_url
+        name = variant_name(match['channel'], match['hash'], nearest_size(size), fmt)
+        return f"/logos/{name}"
+
+    def client_url(self, logo_url: str) -> str:
+        """Absolute URL of the logo variant linked from the M3U playlist and XMLTV guide."""
+        logo_url = self.variant_url(logo_url, settings.m3u_logo_size)
+        if logo_url.startswith('/'):
+            return f"{settings.base_url}{logo_url}"
+        return logo_url
+
+
+# Global instance
+logo_store = LogoStore()
@@ -1,12 +1,19 @@
+import math
 from typing import List
 from app.models.channel import Channel
+from app.services.logo_store import logo_store
 
 
 class M3UGenerator:
-    def generate_m3u(self, channels: List[Channel], base_url: str) -> str:
+    def generate_m3u(self, channels: List[Channel], base_url: str, stream_format: str = "hls") -> str:
         """
         Generate M3U playlist for IPTV clients.
 
+        With stream_format "ts" the entries point at the continuous MPEG-TS
+        streams instead of the HLS playlists. Channels with a DVR window get
+        catch-up attributes; clients fill in {utc} and {utcend} with the
+        programme's start and end.
+
         Format:
         #EXTM3U
         #EXTINF:-1 tvg-id="channel1" tvg-name="Channel 1" tvg-logo="http://..." group-title="Movies",Channel 1
@@ -27,16 +34,26 @@ class M3UGenerator:
             extinf_parts.append(f'tvg-chno="{channel.number}"')
 
             if channel.logo_url:
-                extinf_parts.append(f'tvg-logo="{channel.logo_url}"')
+                extinf_parts.append(f'tvg-logo="{logo_store.client_url(channel.logo_url)}"')
 
             extinf_parts.append(f'group-title="{channel.category}"')
 
+            if channel.stream_settings.dvr_window > 0:
+                extinf_parts.append('catchup="default"')
+                extinf_parts.append(f'catchup-days="{math.ceil(channel.stream_settings.dvr_window / 1440)}"')
+                extinf_parts.append(
+                    f'catchup-source="{base_url}/stream/{channel.id}/catchup.m3u8?start={{utc}}&end={{utcend}}"'
+                )
+
             # Channel name at the end
             extinf_line = " ".join(extinf_parts) + f",{channel.name}"
             lines.append(extinf_line)
 
             # Stream URL
-            stream_url = f"{base_url}/stream/{channel.id}/master.m3u8"
+            if stream_format == "ts":
+                stream_url = f"{base_url}/stream/{channel.id}.ts"
+            else:
+                stream_url = f"{base_url}/stream/{channel.id}/master.m3u8"
             lines.append(stream_url)
 
         return "\n".join(lines) + "\n"
@@ -0,0 +1,249 @@
+"""Background index of the media library for instant search."""
+import asyncio
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from app.models.media import MediaFile, MediaIndexStatus
+from app.services.media_scanner import is_allowed_media_file
+from app.services.probe_cache import probe_cache
+from app.services.thumbnail_service import thumbnail_service
+from app.config import settings
+
+
+class IndexedFile:
+    """One media file in the index; kept small since libraries can be huge."""
+
+    __slots__ = (
+        'path', 'search_text', 'size', 'mtime_ns', 'probed',
+        'duration', 'video_codec', 'audio_codec', 'width', 'height'
+    )
+
+    def __init__(self, path: str, size: int, mtime_ns: int):
+        self.path = path
+        # Lowercase relative path, so folder names (show, season) match too
+        self.search_text = path.lower()
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.probed = False
+        self.duration: Optional[int] = None
+        self.video_codec: Optional[str] = None
+        self.audio_codec: Optional[str] = None
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+
+    def to_model(self) -> MediaFile:
+        return MediaFile(
+            path=self.path,
+            name=self.path.rsplit('/', 1)[-1],
+            size=self.size,
+            modified=datetime.fromtimestamp(self.mtime_ns / 1e9),
+            duration=self.duration,
+            video_codec=self.video_codec,
+            audio_codec=self.audio_codec,
+            width=self.width,
+            height=self.height
+        )
+
+
+def crawl_media(media_dir: Path) -> Dict[str, Tuple[int, int]]:
+    """
+    Walk the media directory and stat every media file.
+
+    Runs in a worker thread. Hidden entries are skipped, and each directory
+    is visited once even if symlinks lead to it again.
+
+    Returns:
+        Dictionary of relative path -> (size, mtime_ns)
+    """
+    found: Dict[str, Tuple[int, int]] = {}
+    visited = set()
+    stack = [(str(media_dir), '')]
+
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            stat = os.stat(directory)
+            if (stat.st_dev, stat.st_ino) in visited:
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    relative = prefix + entry.name
+                    try:
+                        if entry.is_dir():
+                            stack.append((entry.path, relative + '/'))
+                        elif entry.is_file() and is_allowed_media_file(entry.name):
+                            entry_stat = entry.stat()
+                            found[relative] = (entry_stat.st_size, entry_stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error indexing {directory}: {e}")
+
+    return found
+
+
+class MediaIndexer:
+    """
+    Keeps an in-memory index of every media file under settings.media_dir.
+
+    The library is crawled at startup and re-crawled every
+    settings.media_index_interval seconds; files whose size or mtime changed
+    are re-probed. Probe results come from the shared probe cache, so a
+    restart only runs ffprobe for files that are new or changed. Background
+    probing uses at most half of settings.probe_concurrency, leaving room
+    for interactive browsing. Probed video files are handed on to the
+    thumbnail service.
+    """
+
+    def __init__(self):
+        self.media_dir = settings.media_dir
+        self.enabled = settings.media_index_enabled
+        self.interval = settings.media_index_interval
+        # relative path -> indexed file
+        self._files: Dict[str, IndexedFile] = {}
+        # Files ordered by path, rebuilt after each scan
+        self._sorted: List[IndexedFile] = []
+        self._queue: "asyncio.Queue[IndexedFile]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._last_scan: Optional[float] = None
+        self._scan_seconds: Optional[float] = None
+        self._scanning = False
+        self._stopping = False
+
+    def start(self) -> None:
+        """Start the crawl loop and the background probe workers."""
+        if not self.enabled or self._tasks:
+            return
+        self._stopping = False
+        self._tasks.append(asyncio.create_task(self._scan_loop()))
+        for _ in range(max(settings.probe_concurrency // 2, 1)):
+            self._tasks.append(asyncio.create_task(self._probe_worker()))
+
+    async def stop(self) -> None:
+        """Cancel the background tasks."""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _scan_loop(self) -> None:
+        while True:
+            try:
+                await self.scan()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in media index scan: {e}")
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    async def scan(self) -> None:
+        """Crawl the library once and apply the differences to the index."""
+        self._scanning = True
+        started = time.monotonic()
+        try:
+            found = await asyncio.to_thread(crawl_media, self.media_dir)
+
+            for path in set(self._files) - set(found):
+                del self._files[path]
+
+            for path, (size, mtime_ns) in found.items():
+                indexed = self._files.get(path)
+                if indexed and indexed.size == size and indexed.mtime_ns == mtime_ns:
+                    continue
+                indexed = IndexedFile(path, size, mtime_ns)
+                self._files[path] = indexed
+                self._queue.put_nowait(indexed)
+
+            self._sorted = sorted(self._files.values(), key=lambda f: f.path)
+        finally:
+            self._scanning = False
+            self._last_scan = time.time()
+            self._scan_seconds = time.monotonic() - started
+
+    async def _probe_worker(self) -> None:
+        while True:
+            indexed = await self._queue.get()
+            # Skip files that were replaced or removed while queued
+            if self._files.get(indexed.path) is not indexed:
+                continue
+            try:
+                probe = await probe_cache.probe(self.media_dir / indexed.path)
+            except asyncio.CancelledError:
+                # A probe shared with another caller can be cancelled
+                # without this worker being stopped
+                if self._stopping:
+                    raise
+                print(f"Probe of {indexed.path} was cancelled")
+                probe = None
+            except Exception as e:
+                print(f"Error probing {indexed.path}: {e}")
+                probe = None
+
+            indexed.probed = True
+            if probe:
+                indexed.duration = int(probe.duration) if probe.duration else None
+                indexed.video_codec = probe.video_codec
+                indexed.audio_codec = probe.audio_codec
+                indexed.width = probe.width
+                indexed.height = probe.height
+                if probe.video_codec:
+                    thumbnail_service.enqueue(self.media_dir / indexed.path)
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        min_duration: Optional[int] = None,
+        max_duration: Optional[int] = None,
+        codec: Optional[str] = None
+    ) -> List[IndexedFile]:
+        """
+        Find indexed files, ordered by path.
+
+        Args:
+            query: Whitespace-separated terms that must all appear in the
+                file's relative path (case-insensitive)
+            min_duration: Minimum duration in seconds
+            max_duration: Maximum duration in seconds
+            codec: Video or audio codec name, e.g. "h264" or "aac"
+
+        Returns:
+            Matching files; files not probed yet never match duration or
+            codec filters
+        """
+        results = self._sorted
+        terms = query.lower().split() if query else []
+        for term in terms:
+            results = [f for f in results if term in f.search_text]
+
+        if min_duration is not None:
+            results = [f for f in results if f.duration is not None and f.duration >= min_duration]
+        if max_duration is not None:
+            results = [f for f in results if f.duration is not None and f.duration <= max_duration]
+        if codec:
+            codec = codec.lower()
+            results = [f for f in results if codec in (f.video_codec, f.audio_codec)]
+
+        return results
+
+    def status(self) -> MediaIndexStatus:
+        return MediaIndexStatus(
+            enabled=self.enabled,
+            files=len(self._files),
+            probed=sum(1 for f in self._sorted if f.probed),
+            last_scan=datetime.fromtimestamp(self._last_scan) if self._last_scan else None,
+            scan_seconds=round(self._scan_seconds, 3) if self._scan_seconds is not None else None,
+            scanning=self._scanning
+        )
+
+
+# Global instance
+media_indexer = MediaIndexer()
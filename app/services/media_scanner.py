@@ -1,12 +1,22 @@
 """Media directory scanning service for browsing and metadata extraction."""
+from bisect import bisect_right
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, List
-import subprocess
-import json
+from typing import AsyncIterator, Optional, Dict, List, Tuple
+import asyncio
+import os
+import threading
 from datetime import datetime
+from stat import S_ISLNK
 from fastapi import HTTPException
+from app.services.probe_cache import probe_cache
+from app.services.thumbnail_service import file_identity, thumbnail_service
+from app.utils.listing import decode_cursor, encode_cursor
 from app.config import settings
 
+# Items per event of a streamed listing
+STREAM_BATCH_SIZE = 500
+
 
 def validate_path(user_path: str, base_dir: Path) -> Path:
     """
@@ -65,9 +75,12 @@ def is_allowed_media_file(filename: str) -> bool:
     return ext in settings.allowed_media_extensions
 
 
-def get_video_duration(file_path: Path) -> Optional[int]:
+async def get_video_duration(file_path: Path) -> Optional[int]:
     """
-    Extract video duration using ffprobe.
+    Get video duration from the shared probe cache.
+
+    ffprobe only runs when the file is new or has changed since it was last
+    probed.
 
     Args:
         file_path: Path to the video file
@@ -75,41 +88,113 @@ def get_video_duration(file_path: Path) -> Optional[int]:
     Returns:
         Duration in seconds, or None if extraction fails
     """
-    try:
-        result = subprocess.run(
-            [
-                settings.ffprobe_path,
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'json',
-                str(file_path)
-            ],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            duration = data.get('format', {}).get('duration')
-            if duration:
-                return int(float(duration))
-    except (subprocess.TimeoutExpired, json.JSONDecodeError, ValueError, FileNotFoundError):
-        pass
-
-    return None
-
-
-def scan_directory(path: Path, media_dir: Path) -> Dict:
+    duration = await probe_cache.get_duration(file_path)
+    return int(duration) if duration else None
+
+
+# Sorted entries of recently listed directories: path -> (directory mtime_ns, entries)
+_entry_cache: "OrderedDict[str, Tuple[int, List[Tuple[bool, str, str]]]]" = OrderedDict()
+_entry_cache_lock = threading.Lock()
+ENTRY_CACHE_SIZE = 32
+
+
+def _read_entries(path: Path) -> List[Tuple[bool, str, str]]:
     """
-    Scan a directory and return file/folder listing with metadata.
+    Read a directory's visible folders and media files, sorted for display.
+
+    Uses os.scandir's cached entry types, so no entry is stat'ed. The sorted
+    result is cached until the directory's mtime changes (entries added,
+    removed or renamed).
+
+    Returns:
+        Sorted list of (is_file, lowercase name, name); folders come first
+    """
+    key = str(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    with _entry_cache_lock:
+        cached = _entry_cache.get(key)
+        if cached and cached[0] == mtime_ns:
+            _entry_cache.move_to_end(key)
+            return cached[1]
+
+    entries = []
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            # Skip hidden files
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_dir():
+                    entries.append((False, entry.name.lower(), entry.name))
+                elif entry.is_file() and is_allowed_media_file(entry.name):
+                    entries.append((True, entry.name.lower(), entry.name))
+            except OSError:
+                continue
+    entries.sort()
+
+    with _entry_cache_lock:
+        _entry_cache[key] = (mtime_ns, entries)
+        if len(_entry_cache) > ENTRY_CACHE_SIZE:
+            _entry_cache.popitem(last=False)
+    return entries
+
+
+def _describe_entries(path: Path, prefix: str, entries: List[Tuple[bool, str, str]]) -> List[Dict]:
+    """Stat a page of entries and build their listing items."""
+    items: List[Dict] = []
+    # Thumbnails are named by the resolved path; resolving the folder once
+    # covers every entry that isn't itself a symlink
+    resolved_dir = path.resolve() if thumbnail_service.enabled else path
+    for is_file, _, name in entries:
+        try:
+            stat = os.lstat(path / name)
+            if S_ISLNK(stat.st_mode):
+                resolved = str((path / name).resolve())
+                stat = os.stat(path / name)
+            else:
+                resolved = str(resolved_dir / name)
+        except OSError:
+            # Removed since the directory was read
+            continue
+
+        item = {
+            'name': name,
+            'type': 'file' if is_file else 'directory',
+            'path': prefix + name,
+        }
+        if is_file:
+            item['size'] = stat.st_size
+            if thumbnail_service.enabled:
+                poster = thumbnail_service.ready_name(file_identity(resolved, stat.st_size, stat.st_mtime_ns))
+                if poster:
+                    item['thumbnail'] = f"/api/media/thumbnails/{poster}"
+        item['modified'] = datetime.fromtimestamp(stat.st_mtime).isoformat()
+        items.append(item)
+    return items
+
+
+def _select_page(
+    path: Path,
+    media_dir: Path,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[Dict, List[Tuple[bool, str, str]], str]:
+    """
+    Pick one page of a directory's entries.
 
     Args:
-        path: Directory path to scan
+        path: Directory path to list
         media_dir: Base media directory (for calculating relative paths)
+        offset: Entries to skip; ignored when a cursor is given
+        limit: Maximum entries to return, or None for all
+        cursor: next_cursor of the previous page
 
     Returns:
-        Dictionary with current_path, parent_path, and items list
+        Tuple of (listing header, page entries, relative path prefix of the entries)
+
+    Raises:
+        HTTPException: If the path is not a readable directory or the cursor is invalid
     """
     if not path.is_dir():
         raise HTTPException(status_code=400, detail="Path is not a directory")
@@ -132,48 +217,153 @@ def scan_directory(path: Path, media_dir: Path) -> Dict:
         except ValueError:
             parent_path = ''
 
-    # Scan directory
-    items: List[Dict] = []
-
     try:
-        for entry in sorted(path.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-            # Skip hidden files
-            if entry.name.startswith('.'):
-                continue
-
-            if entry.is_dir():
-                # Directory entry
-                item_relative = str(entry.relative_to(media_dir)).replace('\\', '/')
-                items.append({
-                    'name': entry.name,
-                    'type': 'directory',
-                    'path': item_relative,
-                    'modified': datetime.fromtimestamp(entry.stat().st_mtime).isoformat()
-                })
-            elif entry.is_file() and is_allowed_media_file(entry.name):
-                # Media file entry
-                item_relative = str(entry.relative_to(media_dir)).replace('\\', '/')
-                stat = entry.stat()
-
-                item = {
-                    'name': entry.name,
-                    'type': 'file',
-                    'path': item_relative,
-                    'size': stat.st_size,
-                    'modified': datetime.fromtimestamp(stat.st_mtime).isoformat()
-                }
-
-                # Try to get video duration
-                duration = get_video_duration(entry)
-                if duration:
-                    item['duration'] = duration
-
-                items.append(item)
+        entries = _read_entries(path)
     except PermissionError:
         raise HTTPException(status_code=403, detail="Permission denied")
 
-    return {
+    if cursor:
+        try:
+            start = bisect_right(entries, tuple(decode_cursor(cursor)))
+        except TypeError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        start = min(max(offset, 0), len(entries))
+    end = len(entries) if limit is None else min(start + limit, len(entries))
+    selected = entries[start:end]
+
+    header = {
         'current_path': current_relative,
         'parent_path': parent_path,
-        'items': items
+        'total': len(entries),
+        'offset': start,
+        'next_cursor': encode_cursor(selected[-1]) if selected and end < len(entries) else None,
     }
+    prefix = current_relative + '/' if current_relative else ''
+    return header, selected, prefix
+
+
+def _list_directory(
+    path: Path,
+    media_dir: Path,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Dict:
+    """
+    Build one page of the directory listing without probing media durations.
+
+    This does all of the blocking filesystem work for scan_directory and is
+    meant to run in a worker thread. Only the entries on the requested page
+    are stat'ed.
+    """
+    header, entries, prefix = _select_page(path, media_dir, offset, limit, cursor)
+    return {**header, 'items': _describe_entries(path, prefix, entries)}
+
+
+async def probe_durations(path: Path, items: List[Dict]) -> AsyncIterator[Tuple[Dict, Optional[int]]]:
+    """
+    Probe the listed files concurrently, yielding (item, duration) as each finishes.
+
+    Concurrency is bounded by the probe cache (settings.probe_concurrency),
+    and each probe is killed after settings.probe_timeout seconds.
+    """
+    async def probe(item: Dict) -> Tuple[Dict, Optional[int]]:
+        return item, await get_video_duration(path / item['name'])
+
+    tasks = [asyncio.create_task(probe(item)) for item in items if item['type'] == 'file']
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding probes if the consumer goes away
+        for task in tasks:
+            task.cancel()
+
+
+async def scan_directory(
+    path: Path,
+    media_dir: Path,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Dict:
+    """
+    Scan a directory and return file/folder listing with metadata.
+
+    Folders come first, then media files, each sorted by name. Only files on
+    the returned page are probed.
+
+    Args:
+        path: Directory path to scan
+        media_dir: Base media directory (for calculating relative paths)
+        offset: Entries to skip; ignored when a cursor is given
+        limit: Maximum entries to return, or None for all
+        cursor: next_cursor of the previous page
+
+    Returns:
+        Dictionary with current_path, parent_path, total, offset,
+        next_cursor and items list
+    """
+    result = await asyncio.to_thread(_list_directory, path, media_dir, offset, limit, cursor)
+
+    async for item, duration in probe_durations(path, result['items']):
+        if duration:
+            item['duration'] = duration
+
+    return result
+
+
+async def _fill_cached_durations(path: Path, items: List[Dict]) -> List[Dict]:
+    """Set durations the probe cache already knows; return the files still to probe."""
+    files = [item for item in items if item['type'] == 'file']
+    lookups = await asyncio.gather(*(probe_cache.cached(path / item['name']) for item in files))
+
+    pending = []
+    for item, (hit, probe) in zip(files, lookups):
+        if not hit:
+            pending.append(item)
+        elif probe and probe.duration:
+            item['duration'] = int(probe.duration)
+    return pending
+
+
+async def iter_scan_directory(
+    path: Path,
+    media_dir: Path,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> AsyncIterator[Dict]:
+    """
+    Scan a directory progressively.
+
+    The listing header comes first with the first batch of items; further
+    items follow in batches of STREAM_BATCH_SIZE, each with durations
+    already known to the probe cache filled in. Durations of the remaining
+    files follow one event at a time as their probes finish.
+
+    Yields:
+        {'type': 'listing', 'current_path', 'parent_path', 'total',
+        'offset', 'next_cursor', 'items'}, then {'type': 'items', 'items'}
+        per further batch, then {'type': 'duration', 'path', 'duration'}
+        per probed file, then {'type': 'done'}
+    """
+    header, entries, prefix = await asyncio.to_thread(
+        _select_page, path, media_dir, offset, limit, cursor
+    )
+
+    pending = []
+    for start in range(0, max(len(entries), 1), STREAM_BATCH_SIZE):
+        batch = entries[start:start + STREAM_BATCH_SIZE]
+        items = await asyncio.to_thread(_describe_entries, path, prefix, batch)
+        pending.extend(await _fill_cached_durations(path, items))
+        if start == 0:
+            yield {'type': 'listing', **header, 'items': items}
+        else:
+            yield {'type': 'items', 'items': items}
+
+    async for item, duration in probe_durations(path, pending):
+        yield {'type': 'duration', 'path': item['path'], 'duration': duration}
+
+    yield {'type': 'done'}
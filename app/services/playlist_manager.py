@@ -1,50 +1,47 @@
-import json
 import uuid
 from pathlib import Path
-from typing import List, Optional
-from app.models.playlist import Playlist
+from typing import Dict, List, Optional, Tuple
+from app.models.playlist import Playlist, PlaylistSummary
 from app.config import settings
+from app.utils.files import JsonModelCache, list_json_files, path_exists, unlink
 
 
 class PlaylistManager:
     def __init__(self):
         self.playlists_dir = settings.playlists_dir
+        self._cache: JsonModelCache[Playlist] = JsonModelCache(Playlist)
+        # playlist_id -> (playlist instance the summary was built from, summary)
+        self._summaries: Dict[str, Tuple[Playlist, PlaylistSummary]] = {}
 
-    def list_playlists(self) -> List[Playlist]:
+    async def list_playlists(self) -> List[Playlist]:
         """List all playlists from JSON files."""
         playlists = []
-        for json_file in self.playlists_dir.glob("*.json"):
+        for json_file in await list_json_files(self.playlists_dir):
             # Skip migration log file
             if json_file.name.startswith("_"):
                 continue
 
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    playlist = Playlist(**data)
+                playlist = await self._cache.load(json_file)
+                if playlist:
                     playlists.append(playlist)
             except Exception as e:
                 print(f"Error loading playlist {json_file}: {e}")
 
-        # Sort by name
-        playlists.sort(key=lambda x: x.name.lower())
+        # Sort by name, then ID: the order GET /api/playlists pages through
+        playlists.sort(key=lambda x: (x.name.lower(), x.id))
         return playlists
 
-    def get_playlist(self, playlist_id: str) -> Optional[Playlist]:
+    async def get_playlist(self, playlist_id: str) -> Optional[Playlist]:
         """Get a specific playlist by ID."""
         json_file = self.playlists_dir / f"{playlist_id}.json"
-        if not json_file.exists():
-            return None
-
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return Playlist(**data)
+            return await self._cache.load(json_file)
         except Exception as e:
             print(f"Error loading playlist {playlist_id}: {e}")
             return None
 
-    def create_playlist(self, playlist: Playlist) -> Playlist:
+    async def create_playlist(self, playlist: Playlist) -> Playlist:
         """Create a new playlist."""
         # Generate ID if not provided
         if not playlist.id:
@@ -52,15 +49,14 @@ class PlaylistManager:
 
         # Save to file
         json_file = self.playlists_dir / f"{playlist.id}.json"
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(playlist.model_dump(mode='json'), f, indent=2, default=str)
+        await self._cache.store(json_file, playlist)
 
         return playlist
 
-    def update_playlist(self, playlist_id: str, playlist: Playlist) -> Optional[Playlist]:
+    async def update_playlist(self, playlist_id: str, playlist: Playlist) -> Optional[Playlist]:
         """Update an existing playlist."""
         json_file = self.playlists_dir / f"{playlist_id}.json"
-        if not json_file.exists():
+        if not await path_exists(json_file):
             return None
 
         # Ensure ID matches
@@ -71,25 +67,50 @@ class PlaylistManager:
         playlist.updated_at = datetime.utcnow()
 
         # Save to file
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(playlist.model_dump(mode='json'), f, indent=2, default=str)
+        await self._cache.store(json_file, playlist)
 
         return playlist
 
-    def delete_playlist(self, playlist_id: str) -> bool:
+    async def delete_playlist(self, playlist_id: str) -> bool:
         """Delete a playlist."""
         json_file = self.playlists_dir / f"{playlist_id}.json"
-        if not json_file.exists():
+        if not await path_exists(json_file):
             return False
 
-        json_file.unlink()
+        await unlink(json_file)
+        self._cache.invalidate(json_file)
+        self._summaries.pop(playlist_id, None)
         return True
 
-    def is_playlist_in_use(self, playlist_id: str) -> bool:
+    def summarize(self, playlist: Playlist) -> PlaylistSummary:
+        """
+        Build the list-view summary of a playlist.
+
+        Summaries are memoized per cached playlist instance, so item counts and
+        total durations are only recomputed after the playlist file changes.
+        """
+        cached = self._summaries.get(playlist.id)
+        if cached and cached[0] is playlist:
+            return cached[1]
+
+        summary = PlaylistSummary.model_construct(
+            id=playlist.id,
+            name=playlist.name,
+            description=playlist.description,
+            tags=playlist.tags,
+            item_count=len(playlist.items),
+            total_duration=sum(item.duration for item in playlist.items),
+            created_at=playlist.created_at,
+            updated_at=playlist.updated_at
+        )
+        self._summaries[playlist.id] = (playlist, summary)
+        return summary
+
+    async def is_playlist_in_use(self, playlist_id: str) -> bool:
         """Check if any channel references this playlist."""
         from app.services.channel_manager import channel_manager
 
-        channels = channel_manager.list_channels()
+        channels = await channel_manager.list_channels()
         for channel in channels:
             # Check both playlist_id and scheduled_playlists
             if channel.playlist_id == playlist_id:
@@ -1,74 +1,147 @@
-import subprocess
-import json
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
 from app.models.channel import Channel
+from app.models.playlist import PlaylistItem
+from app.services.probe_cache import probe_cache
+from app.services.schedule_index import ScheduleIndex
+from app.services.weekly_schedule import WeeklySchedule
 from app.config import settings
 
 
 class PlaylistScheduler:
     def __init__(self):
-        self.ffprobe_path = settings.ffprobe_path
-
-    def get_media_duration(self, file_path: str) -> Optional[float]:
-        """Get media duration in seconds using FFprobe."""
-        try:
-            cmd = [
-                self.ffprobe_path,
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'json',
-                file_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                duration = float(data.get('format', {}).get('duration', 0))
-                return duration
-            return None
-        except Exception as e:
-            print(f"Error getting duration for {file_path}: {e}")
-            return None
-
-    def get_current_media(self, channel: Channel) -> Optional[Tuple[str, float, str]]:
-        """
-        Calculate which media file should be playing right now and at what position.
-
-        Returns:
-            Tuple of (file_path, seek_seconds, title) or None if playlist is empty
-        """
-        # Resolve playlist items
+        self.timezone = ZoneInfo(settings.schedule_timezone)
+        # playlist key -> compiled index for its current item list
+        self._indexes: Dict[str, ScheduleIndex] = {}
+        # channel_id -> compiled time slots for its scheduled playlists
+        self._weekly: Dict[str, WeeklySchedule] = {}
+
+    async def get_media_duration(self, file_path: str) -> Optional[float]:
+        """Get media duration in seconds from the shared probe cache."""
+        return await probe_cache.get_duration(Path(file_path))
+
+    async def get_playlist_items(self, channel: Channel) -> List[PlaylistItem]:
+        """Resolve the items a channel plays, following its playlist reference."""
         from app.services.playlist_manager import playlist_manager
 
-        playlist_items = []
         if channel.playlist_id:
-            playlist = playlist_manager.get_playlist(channel.playlist_id)
+            playlist = await playlist_manager.get_playlist(channel.playlist_id)
             if playlist:
-                playlist_items = playlist.items
+                return playlist.items
         elif channel.playlist:
             # Fallback to embedded playlist for backward compatibility
-            playlist_items = channel.playlist
+            return channel.playlist
 
+        return []
+
+    def get_schedule_index(self, key: str, items: List[PlaylistItem]) -> ScheduleIndex:
+        """
+        Return the compiled index for a playlist, rebuilding it only when the
+        item list changes.
+
+        Playlist managers hand out the same cached item list until the
+        playlist file changes, so list identity serves as the version.
+        """
+        index = self._indexes.get(key)
+        if index is None or index.items is not items:
+            index = ScheduleIndex(items)
+            self._indexes[key] = index
+        return index
+
+    async def get_channel_index(self, channel: Channel) -> Optional[ScheduleIndex]:
+        """Resolve a channel's own playlist and return its compiled index."""
+        playlist_items = await self.get_playlist_items(channel)
         if not playlist_items:
             return None
 
-        # Calculate elapsed time since start
-        now_utc = datetime.now(timezone.utc)
+        key = channel.playlist_id or f"channel:{channel.id}"
+        return self.get_schedule_index(key, playlist_items)
+
+    async def get_slot_index(self, channel: Channel, owner: Optional[str]) -> Optional[ScheduleIndex]:
+        """
+        Return the compiled index for the playlist airing in a time slot.
+
+        Args:
+            channel: Channel being scheduled
+            owner: Scheduled playlist ID, or None for the channel's own playlist
+        """
+        if owner is None:
+            return await self.get_channel_index(channel)
 
+        from app.services.playlist_manager import playlist_manager
+
+        playlist = await playlist_manager.get_playlist(owner)
+        if not playlist or not playlist.items:
+            return None
+        return self.get_schedule_index(owner, playlist.items)
+
+    def get_weekly_schedule(self, channel: Channel) -> Optional[WeeklySchedule]:
+        """
+        Return the compiled time slots for a channel's scheduled playlists.
+
+        Compiled once per rule list; channel managers hand out the same cached
+        channel until its file changes.
+        """
+        if not channel.scheduled_playlists:
+            self._weekly.pop(channel.id, None)
+            return None
+
+        weekly = self._weekly.get(channel.id)
+        if weekly is None or weekly.rules is not channel.scheduled_playlists:
+            weekly = WeeklySchedule(channel.scheduled_playlists, self.timezone)
+            self._weekly[channel.id] = weekly
+        return weekly
+
+    def get_schedule_origin(self, channel: Channel) -> float:
+        """Timestamp at which the channel's playlist started its first pass."""
         if channel.start_time:
-            # Start from specific time
-            elapsed = (now_utc - channel.start_time.replace(tzinfo=timezone.utc)).total_seconds()
+            return channel.start_time.replace(tzinfo=timezone.utc).timestamp()
+        # Continuous mode - start from epoch
+        return 0.0
+
+    def get_segment_number(self, channel: Channel, at: Optional[float] = None) -> int:
+        """
+        Number of the HLS segment that airs at a time on the channel's timeline.
+
+        Segments are counted in segment_duration steps from the schedule
+        origin, so encodes started at any point number their segments
+        where the channel's earlier encodes left off.
+        """
+        now = at if at is not None else datetime.now(timezone.utc).timestamp()
+        elapsed = now - self.get_schedule_origin(channel)
+        return max(0, int(elapsed // max(channel.stream_settings.segment_duration, 1)))
+
+    async def get_current_media(self, channel: Channel) -> Optional[Tuple[str, float, str]]:
+        """
+        Calculate which media file should be playing right now and at what position.
+
+        Returns:
+            Tuple of (file_path, seek_seconds, title) or None if playlist is empty
+        """
+        now = datetime.now(timezone.utc).timestamp()
+        origin = self.get_schedule_origin(channel)
+
+        weekly = self.get_weekly_schedule(channel)
+        if weekly:
+            # Only time the slot's playlist has been on air counts
+            owner, elapsed = weekly.resolve(now, origin)
+            index = await self.get_slot_index(channel, owner)
         else:
-            # Continuous mode - start from epoch
-            elapsed = now_utc.timestamp()
+            elapsed = now - origin
+            index = await self.get_channel_index(channel)
+
+        if not index:
+            return None
+
+        playlist_items = index.items
 
         # If elapsed is negative (start time in future), wait at first item
         if elapsed < 0:
             return (playlist_items[0].file_path, 0, playlist_items[0].title)
 
-        # Calculate total playlist duration
-        total_duration = sum(item.duration for item in playlist_items)
-
+        total_duration = index.total_duration
         if total_duration == 0:
             return None
 
@@ -81,103 +154,35 @@ class PlaylistScheduler:
             return (last_item.file_path, last_item.duration, last_item.title)
 
         # Find current item and seek position
-        accumulated = 0
-        for item in playlist_items:
-            if accumulated + item.duration > elapsed:
-                seek = elapsed - accumulated
-                return (item.file_path, seek, item.title)
-            accumulated += item.duration
-
-        # Fallback (shouldn't reach here)
-        return (playlist_items[0].file_path, 0, playlist_items[0].title)
+        item_index, seek = index.locate(elapsed)
+        item = playlist_items[item_index]
+        return (item.file_path, seek, item.title)
 
-    def get_upcoming_programs(self, channel: Channel, hours_ahead: int = 6) -> list:
+    async def get_upcoming_programs(self, channel: Channel, hours_ahead: int = 6) -> list:
         """
         Get upcoming programs for EPG generation.
 
+        Programs are aligned to the real item boundaries, so the first one
+        starts when the currently playing item started. With scheduled
+        playlists, programs are cut at time slot boundaries.
+
         Returns:
             List of tuples: (start_time, end_time, title, description)
         """
-        # Resolve playlist items
-        from app.services.playlist_manager import playlist_manager
-
-        playlist_items = []
-        if channel.playlist_id:
-            playlist = playlist_manager.get_playlist(channel.playlist_id)
-            if playlist:
-                playlist_items = playlist.items
-        elif channel.playlist:
-            # Fallback to embedded playlist for backward compatibility
-            playlist_items = channel.playlist
-
-        if not playlist_items:
-            return []
-
-        programs = []
-        now_utc = datetime.now(timezone.utc)
-
-        # Calculate starting position
-        if channel.start_time:
-            start_ref = channel.start_time.replace(tzinfo=timezone.utc)
-            elapsed = (now_utc - start_ref).total_seconds()
-        else:
-            start_ref = datetime.fromtimestamp(0, tz=timezone.utc)
-            elapsed = now_utc.timestamp()
-
-        total_duration = sum(item.duration for item in playlist_items)
-        if total_duration == 0:
-            return []
-
-        # Handle looping to find current position
-        if channel.loop and elapsed >= 0:
-            elapsed = elapsed % total_duration
+        from app.services.epg_engine import epg_engine
 
-        # Generate programs
-        current_time = now_utc
-        end_time = now_utc.timestamp() + (hours_ahead * 3600)
-
-        playlist_index = 0
-        position_in_playlist = 0
-
-        # Find current position in playlist
-        if elapsed >= 0:
-            for i, item in enumerate(playlist_items):
-                if position_in_playlist + item.duration > elapsed:
-                    playlist_index = i
-                    # Start from current position in current item
-                    current_time = now_utc
-                    break
-                position_in_playlist += item.duration
-
-        # Generate upcoming programs
-        iterations = 0
-        max_iterations = 1000  # Prevent infinite loops
-
-        while current_time.timestamp() < end_time and iterations < max_iterations:
-            iterations += 1
-            item = playlist_items[playlist_index]
-
-            program_start = current_time
-            program_end = datetime.fromtimestamp(
-                current_time.timestamp() + item.duration,
-                tz=timezone.utc
-            )
+        now = datetime.now(timezone.utc).timestamp()
+        guides = await epg_engine.build([channel], now, now + hours_ahead * 3600)
 
-            programs.append((
-                program_start,
-                program_end,
+        return [
+            (
+                datetime.fromtimestamp(start, tz=timezone.utc),
+                datetime.fromtimestamp(end, tz=timezone.utc),
                 item.title,
                 item.description or ""
-            ))
-
-            current_time = program_end
-            playlist_index = (playlist_index + 1) % len(playlist_items)
-
-            # If not looping and reached end, stop
-            if not channel.loop and playlist_index == 0 and iterations > 0:
-                break
-
-        return programs
+            )
+            for start, end, item in guides[0].programs()
+        ]
 
 
 # Global instance
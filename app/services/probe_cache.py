@@ -0,0 +1,243 @@
+"""Persistent cache of ffprobe results, shared by everything that probes media."""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from app.models.media import MediaProbe, ProbeStream
+from app.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    probe TEXT
+)
+"""
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ffprobe(data: Dict) -> MediaProbe:
+    """Build a MediaProbe from ffprobe's -show_format -show_streams JSON output."""
+    fmt = data.get('format', {})
+    streams = []
+    for stream in data.get('streams', []):
+        streams.append(ProbeStream(
+            index=stream.get('index', len(streams)),
+            codec_type=stream.get('codec_type'),
+            codec_name=stream.get('codec_name'),
+            width=_int(stream.get('width')),
+            height=_int(stream.get('height')),
+            channels=_int(stream.get('channels')),
+            language=stream.get('tags', {}).get('language')
+        ))
+
+    video = next((s for s in streams if s.codec_type == 'video'), None)
+    audio = next((s for s in streams if s.codec_type == 'audio'), None)
+
+    return MediaProbe(
+        duration=_float(fmt.get('duration')),
+        format_name=fmt.get('format_name'),
+        bit_rate=_int(fmt.get('bit_rate')),
+        video_codec=video.codec_name if video else None,
+        audio_codec=audio.codec_name if audio else None,
+        width=video.width if video else None,
+        height=video.height if video else None,
+        streams=streams
+    )
+
+
+class ProbeCache:
+    """
+    ffprobe results stored in SQLite, keyed by path, size and mtime.
+
+    A file is probed again only when its size or modification time changes.
+    Files ffprobe cannot read are remembered too, so they are not retried
+    until they change. Concurrent requests for the same file share one probe.
+    """
+
+    def __init__(self):
+        self.db_path = settings.probe_cache_path
+        self.ffprobe_path = settings.ffprobe_path
+        self.timeout = settings.probe_timeout
+        # Bounds concurrent ffprobe processes across all callers
+        self._slots = asyncio.Semaphore(max(settings.probe_concurrency, 1))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, int, int], asyncio.Task] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _file_key(self, file_path: Path) -> Tuple[str, int, int]:
+        """Cache key of the current version of a file: (path, size, mtime_ns)."""
+        stat = os.stat(file_path)
+        return str(Path(file_path).resolve()), stat.st_size, stat.st_mtime_ns
+
+    def _lookup(self, path: str, size: int, mtime_ns: int) -> Tuple[bool, Optional[str]]:
+        """Return (hit, probe JSON) for the current version of a file."""
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT size, mtime_ns, probe FROM probes WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == size and row[1] == mtime_ns:
+            return True, row[2]
+        return False, None
+
+    def _save(self, path: str, size: int, mtime_ns: int, probe: Optional[str]) -> None:
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO probes (path, size, mtime_ns, probe) VALUES (?, ?, ?, ?)",
+                (path, size, mtime_ns, probe)
+            )
+            conn.commit()
+
+    def _forget(self, path: str) -> None:
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM probes WHERE path = ?", (path,))
+            conn.commit()
+
+    async def probe(self, file_path: Path) -> Optional[MediaProbe]:
+        """
+        Get the metadata of a media file, probing it only on a cache miss.
+
+        Args:
+            file_path: Path to the media file
+
+        Returns:
+            MediaProbe, or None if the file is missing or ffprobe can't read it
+        """
+        try:
+            key = await asyncio.to_thread(self._file_key, file_path)
+        except OSError:
+            return None
+
+        # Share an in-flight probe of the same file version. The probe runs in
+        # its own task, so a cancelled caller doesn't cancel it for the others.
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.create_task(self._probe_cached(*key))
+            task.add_done_callback(lambda done: self._finish_probe(key, done))
+        return await asyncio.shield(task)
+
+    def _finish_probe(self, key: Tuple[str, int, int], task: asyncio.Task) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # Mark the exception retrieved when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def cached(self, file_path: Path) -> Tuple[bool, Optional[MediaProbe]]:
+        """
+        Look up a file without probing it.
+
+        Returns:
+            Tuple of (hit, probe); hit is False when the file would need probing
+        """
+        try:
+            key = await asyncio.to_thread(self._file_key, file_path)
+        except OSError:
+            return True, None
+        return await self._lookup_probe(*key)
+
+    async def _lookup_probe(self, path: str, size: int, mtime_ns: int) -> Tuple[bool, Optional[MediaProbe]]:
+        try:
+            hit, cached = await asyncio.to_thread(self._lookup, path, size, mtime_ns)
+        except sqlite3.Error as e:
+            print(f"Error reading probe cache: {e}")
+            return False, None
+        return hit, MediaProbe.model_validate_json(cached) if cached else None
+
+    async def _probe_cached(self, path: str, size: int, mtime_ns: int) -> Optional[MediaProbe]:
+        hit, probe = await self._lookup_probe(path, size, mtime_ns)
+        if hit:
+            return probe
+
+        async with self._slots:
+            probe, definitive = await self._run_ffprobe(path)
+        if definitive:
+            try:
+                await asyncio.to_thread(
+                    self._save, path, size, mtime_ns, probe.model_dump_json() if probe else None
+                )
+            except sqlite3.Error as e:
+                print(f"Error writing probe cache: {e}")
+        return probe
+
+    async def _run_ffprobe(self, path: str) -> Tuple[Optional[MediaProbe], bool]:
+        """
+        Run ffprobe on a file.
+
+        Returns:
+            Tuple of (probe, definitive); failures that may be transient,
+            such as a missing ffprobe binary or a timeout, are not definitive
+            and must not be cached
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.ffprobe_path,
+                '-v', 'error',
+                '-show_format',
+                '-show_streams',
+                '-of', 'json',
+                path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except (FileNotFoundError, OSError):
+            return None, False
+
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return None, False
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+
+        if process.returncode != 0:
+            return None, True
+
+        try:
+            return parse_ffprobe(json.loads(stdout)), True
+        except (json.JSONDecodeError, ValueError):
+            return None, True
+
+    async def get_duration(self, file_path: Path) -> Optional[float]:
+        """Get the duration of a media file in seconds."""
+        probe = await self.probe(file_path)
+        return probe.duration if probe else None
+
+    async def invalidate(self, file_path: Path) -> None:
+        """Drop the cached result of a file, e.g. after it was replaced in place."""
+        await asyncio.to_thread(self._forget, str(Path(file_path).resolve()))
+
+
+# Global instance
+probe_cache = ProbeCache()
@@ -0,0 +1,100 @@
+"""Compiled playlist timeline for fast now-playing and EPG window lookups."""
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+import numpy as np
+from app.models.playlist import PlaylistItem
+
+EMPTY_WINDOW = (np.empty(0), np.empty(0), np.empty(0, dtype=np.int64))
+
+
+class ScheduleIndex:
+    """
+    Cumulative start offsets of a playlist's items.
+
+    offsets[i] is the position, in seconds from the start of the playlist, at
+    which item i begins; offsets[-1] is the total duration. Looking up the item
+    playing at a position is a bisection, and enumerating a time window is
+    array arithmetic over the offsets instead of a walk from the first item.
+    """
+
+    def __init__(self, items: List[PlaylistItem]):
+        self.items = items
+        self.offsets = array('q', [0])
+        for item in items:
+            self.offsets.append(self.offsets[-1] + max(item.duration, 0))
+
+    @property
+    def total_duration(self) -> int:
+        return self.offsets[-1]
+
+    def locate(self, position: float) -> Tuple[int, float]:
+        """
+        Find the item playing at a position within one pass of the playlist.
+
+        Args:
+            position: Seconds from the start of the playlist, 0 <= position < total
+
+        Returns:
+            Tuple of (item_index, seek_seconds)
+        """
+        index = bisect_right(self.offsets, position) - 1
+        # Clamp so positions at or past the end resolve to the last item
+        index = min(max(index, 0), len(self.items) - 1)
+        return index, position - self.offsets[index]
+
+    def window_arrays(
+        self,
+        origin: float,
+        start: float,
+        end: float,
+        loop: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compute the programs overlapping [start, end) as arrays.
+
+        Programs are numbered consecutively across loop passes, so the window
+        is a contiguous range of program numbers whose boundaries follow from
+        the offsets in a few vectorized operations.
+
+        Args:
+            origin: Timestamp at which the first item of the playlist starts
+            start: Window start timestamp
+            end: Window end timestamp
+            loop: Whether the playlist repeats after its last item
+
+        Returns:
+            Tuple of (program_starts, program_ends, item_indexes); zero-length
+            items are skipped
+        """
+        total = self.total_duration
+        count = len(self.items)
+        if total <= 0 or end <= start:
+            return EMPTY_WINDOW
+
+        # First program: the one playing at the window start
+        elapsed = max(start - origin, 0.0)
+        if loop:
+            first_cycle, position = divmod(elapsed, total)
+        elif elapsed >= total:
+            return EMPTY_WINDOW
+        else:
+            first_cycle, position = 0, elapsed
+        first = int(first_cycle) * count + self.locate(position)[0]
+
+        # Last program: the last one starting before the window end
+        last_cycle, position = divmod(end - origin, total)
+        last = int(last_cycle) * count + bisect_left(self.offsets, position) - 1
+        if not loop:
+            last = min(last, count - 1)
+        last = max(last, first)
+
+        offsets = np.frombuffer(self.offsets, dtype=np.int64)
+        numbers = np.arange(first, last + 1, dtype=np.int64)
+        cycles, item_indexes = np.divmod(numbers, count)
+
+        starts = origin + cycles * float(total) + offsets[item_indexes]
+        ends = origin + cycles * float(total) + offsets[item_indexes + 1]
+
+        aired = (ends > starts) & (starts < end)
+        return starts[aired], ends[aired], item_indexes[aired]
@@ -1,57 +1,138 @@
 import asyncio
 import subprocess
 import shutil
+import threading
+import time
+import uuid
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Dict, Optional, Set, Union
+from app.models.channel import Channel, StreamSettings
 from app.models.stream import StreamStatus
+from app.models.transcode import TranscodeJob
 from app.services.channel_manager import channel_manager
+from app.services.cpu_allocator import cpu_allocator
+from app.services.dvr_recorder import dvr_recorder
+from app.services.encoder_governor import encoder_governor
 from app.services.playlist_scheduler import playlist_scheduler
-from app.utils.ffmpeg import ffmpeg_builder
+from app.services.transcode_pool import RemoteJob, transcode_pool
+from app.services.ts_broadcaster import ts_broadcaster
+from app.utils.ffmpeg import ProgressParser, ffmpeg_builder
+from app.utils.files import path_exists
+from app.utils.hls import parse_media_playlist
+from app.utils.tracing import PhaseHistograms, PhaseTrace
 from app.config import settings
 
+# Seconds start_stream waits for the first segment before responding anyway
+FIRST_SEGMENT_WAIT = 2
+# Seconds the first segment is watched for in the background
+FIRST_SEGMENT_TIMEOUT = 60
+FIRST_SEGMENT_POLL = 0.1
+
 
 class StreamManager:
     def __init__(self):
         self.streams_dir = settings.streams_dir
-        self.active_streams: Dict[str, subprocess.Popen] = {}
+        # Local FFmpeg processes, or jobs on transcode workers when those are configured
+        self.active_streams: Dict[str, Union[subprocess.Popen, RemoteJob]] = {}
         self.stream_metadata: Dict[str, dict] = {}
         self.last_request_time: Dict[str, datetime] = {}
-
-    async def start_stream(self, channel_id: str) -> bool:
+        # Phase timings of the most recent start request and of all starts, per channel
+        self.last_start: Dict[str, PhaseTrace] = {}
+        self.start_histograms: Dict[str, PhaseHistograms] = {}
+        # Channels being restarted, at a new quality level or on the next programme
+        self._requality: Set[str] = set()
+        # Segment number after the last one each channel's playlist handed out,
+        # so numbering never goes backwards once the output is deleted
+        self.next_segment: Dict[str, int] = {}
+        # Per-channel start locks, so concurrent requests spawn one encoder,
+        # with the number of requests holding or waiting for each
+        self._start_locks: Dict[str, asyncio.Lock] = {}
+        self._start_waiters: Dict[str, int] = {}
+        transcode_pool.on_progress = self._on_progress
+        transcode_pool.on_adopt = self._adopt_job
+        transcode_pool.on_exit = self._on_exit
+
+    async def start_stream(self, channel_id: str, trace: Optional[PhaseTrace] = None) -> bool:
         """
         Start FFmpeg stream for a channel.
 
+        Each phase (channel lookup, scheduling, file check, FFmpeg spawn,
+        first segment) is timed into `trace`, which is kept as the channel's
+        last start and added to its phase histograms.
+
+        Args:
+            channel_id: ID of the channel
+            trace: Trace to record the phases in; a new one is used if omitted
+
         Returns:
             True if stream started successfully, False otherwise
         """
+        trace = trace or PhaseTrace()
+        lock = self._start_locks.setdefault(channel_id, asyncio.Lock())
+        self._start_waiters[channel_id] = self._start_waiters.get(channel_id, 0) + 1
+        try:
+            # Requests that waited find the stream running
+            async with lock:
+                started = await self._start_stream(channel_id, trace)
+        finally:
+            self._start_waiters[channel_id] -= 1
+            if not self._start_waiters[channel_id]:
+                del self._start_waiters[channel_id]
+                del self._start_locks[channel_id]
+        # Requests served by a running stream are not starts, and unknown
+        # channel IDs get no entries, so requests can't grow these maps
+        if trace.outcome in ('running', 'channel_not_found'):
+            return started
+
+        self.last_start[channel_id] = trace
+        # Successful starts are counted once their first segment is in
+        if trace.outcome != 'started':
+            self._observe_start(channel_id, trace)
+        return started
+
+    def _observe_start(self, channel_id: str, trace: PhaseTrace) -> None:
+        self.start_histograms.setdefault(channel_id, PhaseHistograms()).observe_trace(trace)
+
+    async def _start_stream(self, channel_id: str, trace: PhaseTrace) -> bool:
         # Check if stream is already active
         if channel_id in self.active_streams:
             process = self.active_streams[channel_id]
             if process.poll() is None:
                 # Stream is still running
                 self.track_request(channel_id)
+                trace.finish('running')
                 return True
             else:
-                # Process died, clean up
-                await self.stop_stream(channel_id)
+                # Process died, e.g. its file ended; the new encode continues its playlist
+                with trace.span('cleanup'):
+                    await self.stop_stream(channel_id, restarting=True)
 
         # Get channel configuration
-        channel = channel_manager.get_channel(channel_id)
-        if not channel or not channel.enabled:
-            print(f"Channel {channel_id} not found or disabled")
+        with trace.span('channel'):
+            channel = await channel_manager.get_channel(channel_id)
+        if not channel:
+            print(f"Channel {channel_id} not found")
+            trace.finish('channel_not_found')
+            return False
+        if not channel.enabled:
+            print(f"Channel {channel_id} is disabled")
+            trace.finish('channel_unavailable')
             return False
 
         # Check if channel has a playlist assigned
         if not channel.playlist_id and not channel.playlist:
             print(f"Channel {channel_id} has no playlist assigned")
+            trace.finish('no_playlist')
             return False
 
         # Get current media file and seek position
         # playlist_scheduler will resolve playlist_id reference
-        media_info = playlist_scheduler.get_current_media(channel)
+        with trace.span('schedule'):
+            media_info = await playlist_scheduler.get_current_media(channel)
         if not media_info:
             print(f"No media to play for channel {channel_id} (playlist may be empty)")
+            trace.finish('no_media')
             return False
 
         file_path, seek, title = media_info
@@ -63,27 +144,35 @@ class StreamManager:
             path_obj = settings.media_dir / file_path
 
         # Verify file exists
-        if not path_obj.exists():
+        with trace.span('file_check'):
+            exists = await path_exists(path_obj)
+        if not exists:
             print(f"Media file not found: {path_obj}")
+            trace.finish('file_missing')
             return False
 
-        # Build FFmpeg command (use absolute path)
+        # Start FFmpeg (with the absolute path) at the level the governor chose,
+        # here or on a transcode worker
         output_dir = self.streams_dir / channel_id
-        cmd = ffmpeg_builder.build_hls_command(
-            str(path_obj),
-            output_dir,
-            seek,
-            channel.stream_settings
-        )
-
-        # Start FFmpeg process
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                stdin=subprocess.DEVNULL
-            )
+            with trace.span('spawn'):
+                stream_settings = encoder_governor.settings_for(channel_id, channel.stream_settings)
+                start_number = await self._next_segment_number(channel, output_dir)
+                if transcode_pool.enabled:
+                    process = await transcode_pool.start_job(TranscodeJob(
+                        job_id=uuid.uuid4().hex,
+                        channel_id=channel_id,
+                        input_file=str(path_obj),
+                        seek=seek,
+                        stream_settings=stream_settings,
+                        title=title,
+                        start_number=start_number
+                    ))
+                else:
+                    process = self._spawn_local(
+                        channel_id, str(path_obj), output_dir, seek, stream_settings, start_number
+                    )
+            spawned_at = time.perf_counter()
 
             self.active_streams[channel_id] = process
             self.stream_metadata[channel_id] = {
@@ -93,68 +182,290 @@ class StreamManager:
                 'start_time': datetime.now(timezone.utc)
             }
             self.track_request(channel_id)
+            if channel.stream_settings.dvr_window > 0:
+                await dvr_recorder.track(channel_id)
 
-            print(f"Started stream for channel {channel_id}: {title} (seek: {seek:.1f}s)")
-
-            # Wait a bit for FFmpeg to generate initial segments
-            await asyncio.sleep(2)
-
-            return True
+            worker = f" on worker {process.client.address}" if isinstance(process, RemoteJob) else ""
+            print(f"Started stream for channel {channel_id}{worker}: {title} (seek: {seek:.1f}s)")
 
         except Exception as e:
             print(f"Error starting stream for channel {channel_id}: {e}")
+            trace.finish('spawn_failed')
             return False
 
-    async def stop_stream(self, channel_id: str) -> bool:
+        # Wait a bit for FFmpeg to generate initial segments; stop waiting early
+        # once the playlist exists. The watcher keeps timing the first segment
+        # in the background if it takes longer.
+        watcher = asyncio.create_task(
+            self._watch_first_segment(output_dir / "stream.m3u8", process, trace, spawned_at)
+        )
+        try:
+            await asyncio.wait_for(asyncio.shield(watcher), timeout=FIRST_SEGMENT_WAIT)
+        except asyncio.TimeoutError:
+            pass
+
+        trace.finish('started')
+        watcher.add_done_callback(lambda _: self._observe_start(channel_id, trace))
+        return True
+
+    def _spawn_local(
+        self,
+        channel_id: str,
+        input_file: str,
+        output_dir: Path,
+        seek: float,
+        stream_settings: StreamSettings,
+        start_number: int = 0
+    ) -> subprocess.Popen:
+        """Start FFmpeg in this process, for setups without transcode workers."""
+        placement = cpu_allocator.allocate(channel_id, stream_settings)
+        cmd = ffmpeg_builder.build_hls_command(
+            input_file,
+            output_dir,
+            seek,
+            stream_settings,
+            progress=True,
+            threads=placement.threads,
+            start_number=start_number
+        )
+        try:
+            process = subprocess.Popen(
+                placement.wrap_command(cmd),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                stdin=subprocess.DEVNULL,
+                **placement.popen_kwargs()
+            )
+        except Exception:
+            cpu_allocator.release(channel_id)
+            raise
+        placement.apply(process.pid)
+
+        # stdout carries -progress blocks and must be drained continuously
+        threading.Thread(
+            target=self._read_progress,
+            args=(channel_id, process, asyncio.get_running_loop()),
+            name=f"progress-{channel_id}",
+            daemon=True
+        ).start()
+        return process
+
+    async def _next_segment_number(self, channel: Channel, output_dir: Path) -> int:
+        """
+        First segment number of a new encode: the channel's timeline position.
+
+        A restart keeps the playlist of the previous encode, which the new
+        one appends to; numbering continues right after its last segment,
+        since media sequence numbers of a playlist have no gaps. Otherwise
+        the timeline position is used, but never a number below those
+        already handed out: short last segments at the end of a file make
+        an encode's count run ahead of the timeline.
+        """
+        playlist_end = await self._playlist_end(output_dir)
+        if playlist_end is not None:
+            return playlist_end
+        return max(playlist_scheduler.get_segment_number(channel), self.next_segment.get(channel.id, 0))
+
+    async def _playlist_end(self, output_dir: Path) -> Optional[int]:
+        """Segment number after the last one in a channel's playlist, or None if it has none."""
+        try:
+            text = await asyncio.to_thread((output_dir / "stream.m3u8").read_text, encoding='utf-8')
+        except OSError:
+            return None
+        media_sequence, entries = parse_media_playlist(text)
+        return media_sequence + len(entries) if entries else None
+
+    def _adopt_job(self, remote: RemoteJob) -> None:
+        """Take over an encode found running on a worker, e.g. after a server restart."""
+        channel_id = remote.job.channel_id
+        if channel_id in self.active_streams:
+            # The channel was started again meanwhile; the old encode is redundant
+            asyncio.create_task(self._stop_orphan(remote))
+            return
+
+        self.active_streams[channel_id] = remote
+        self.stream_metadata[channel_id] = {
+            'file_path': remote.job.input_file,
+            'title': remote.job.title,
+            'seek': remote.job.seek,
+            'start_time': remote.started_at
+        }
+        # Idle streams are stopped as usual if nobody is watching
+        self.track_request(channel_id)
+        if remote.job.stream_settings.dvr_window > 0:
+            asyncio.create_task(dvr_recorder.track(channel_id))
+        print(f"Adopted stream for channel {channel_id} from worker {remote.client.address}")
+
+    async def _stop_orphan(self, remote: RemoteJob) -> None:
+        try:
+            await transcode_pool.stop_job(remote)
+        except Exception as e:
+            print(f"Error stopping job {remote.job.job_id} on worker {remote.client.address}: {e}")
+
+    async def _watch_first_segment(
+        self,
+        playlist_path: Path,
+        process: Union[subprocess.Popen, RemoteJob],
+        trace: PhaseTrace,
+        spawned_at: float
+    ) -> None:
+        """Record when FFmpeg writes its first playlist, i.e. its first complete segment."""
+        deadline = spawned_at + FIRST_SEGMENT_TIMEOUT
+        while True:
+            if await path_exists(playlist_path):
+                trace.add_span('first_segment', spawned_at, time.perf_counter())
+                return
+            if process.poll() is not None or time.perf_counter() > deadline:
+                return
+            await asyncio.sleep(FIRST_SEGMENT_POLL)
+
+    def _read_progress(self, channel_id: str, process: subprocess.Popen, loop: asyncio.AbstractEventLoop) -> None:
+        """Forward FFmpeg's -progress blocks to the event loop; runs in a thread per stream."""
+        parser = ProgressParser()
+        for raw in iter(process.stdout.readline, b''):
+            block = parser.feed(raw.decode('utf-8', errors='replace'))
+            if block is None:
+                continue
+            try:
+                loop.call_soon_threadsafe(self._on_progress, channel_id, process, block)
+            except RuntimeError:
+                # Event loop closed during shutdown
+                return
+
+        process.wait()
+        try:
+            loop.call_soon_threadsafe(self._on_exit, channel_id, process, process.returncode)
+        except RuntimeError:
+            pass
+
+    def _on_progress(self, channel_id: str, process: Union[subprocess.Popen, RemoteJob], block: Dict[str, str]) -> None:
+        # Ignore late output of a process that was already replaced
+        if self.active_streams.get(channel_id) is not process or channel_id in self._requality:
+            return
+        level = encoder_governor.observe(channel_id, block)
+        if level is not None:
+            self._requality.add(channel_id)
+            asyncio.create_task(self._change_quality(channel_id, level))
+
+    def _on_exit(self, channel_id: str, process: Union[subprocess.Popen, RemoteJob], returncode: int) -> None:
+        """
+        Continue a channel with the next programme when a file ends.
+
+        Channels being watched or recorded are restarted right away; players
+        only re-fetch stream.m3u8, which doesn't start a stream, and recording
+        channels may have nobody watching.
+        """
+        if self.active_streams.get(channel_id) is not process or channel_id in self._requality:
+            return
+        if returncode == 0 and (channel_id in self.last_request_time or dvr_recorder.is_recording(channel_id)):
+            self._requality.add(channel_id)
+            asyncio.create_task(self._continue_stream(channel_id))
+
+    async def _continue_stream(self, channel_id: str) -> None:
+        try:
+            await self.stop_stream(channel_id, restarting=True)
+            await self.start_stream(channel_id)
+        except Exception as e:
+            print(f"Error continuing stream for channel {channel_id}: {e}")
+        finally:
+            self._requality.discard(channel_id)
+
+    async def _change_quality(self, channel_id: str, level: int) -> None:
+        """Restart a channel's encode at another level of its quality ladder."""
+        try:
+            status = encoder_governor.status(channel_id)
+            print(
+                f"Encoder governor: channel {channel_id} -> level {level} "
+                f"({status.transcode_preset}, {status.resolution}, {status.video_bitrate}k)"
+            )
+            await self.stop_stream(channel_id, restarting=True)
+            await self.start_stream(channel_id)
+        except Exception as e:
+            print(f"Error changing quality of channel {channel_id}: {e}")
+        finally:
+            self._requality.discard(channel_id)
+
+    async def stop_stream(self, channel_id: str, restarting: bool = False) -> bool:
         """
         Stop FFmpeg stream for a channel.
 
+        Args:
+            channel_id: ID of the channel
+            restarting: Keep the HLS output and governor state for an immediate restart
+
         Returns:
             True if stream was stopped, False if not running
         """
         if channel_id not in self.active_streams:
             return False
 
-        process = self.active_streams[channel_id]
+        # Removed first, so its exit isn't taken for the end of a programme
+        process = self.active_streams.pop(channel_id)
 
         # Terminate process
         try:
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                process.wait()
+            if isinstance(process, RemoteJob):
+                await transcode_pool.stop_job(process)
+            else:
+                await self._terminate(process)
+                cpu_allocator.release(channel_id)
         except Exception as e:
             print(f"Error stopping stream {channel_id}: {e}")
 
         # Cleanup
-        del self.active_streams[channel_id]
         if channel_id in self.stream_metadata:
             del self.stream_metadata[channel_id]
         if channel_id in self.last_request_time:
             del self.last_request_time[channel_id]
 
-        # Delete stream directory
+        # Archive the last segments before the output is replaced or deleted
+        await dvr_recorder.untrack(channel_id)
+
+        if restarting:
+            print(f"Restarting stream for channel {channel_id}")
+            return True
+        encoder_governor.forget(channel_id)
+
+        # Delete stream directory, remembering how far its numbering got
         output_dir = self.streams_dir / channel_id
-        if output_dir.exists():
+        playlist_end = await self._playlist_end(output_dir)
+        if playlist_end is not None:
+            self.next_segment[channel_id] = max(playlist_end, self.next_segment.get(channel_id, 0))
+        if await path_exists(output_dir):
             try:
-                shutil.rmtree(output_dir)
+                await asyncio.to_thread(shutil.rmtree, output_dir)
             except Exception as e:
                 print(f"Error deleting stream directory {channel_id}: {e}")
 
         print(f"Stopped stream for channel {channel_id}")
         return True
 
+    async def _terminate(self, process: subprocess.Popen) -> None:
+        process.terminate()
+        try:
+            await asyncio.to_thread(process.wait, timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            await asyncio.to_thread(process.wait)
+
     def track_request(self, channel_id: str):
         """Track that a request was made for this channel."""
         self.last_request_time[channel_id] = datetime.now(timezone.utc)
 
     def get_stream_status(self, channel_id: str) -> StreamStatus:
-        """Get status of a stream."""
+        """Get status of a stream, with the timings of its last start and of all starts."""
         is_active = channel_id in self.active_streams
 
+        last_start = self.last_start.get(channel_id)
+        histograms = self.start_histograms.get(channel_id)
+        timings = {
+            'last_start': last_start.to_model() if last_start else None,
+            'start_phases': histograms.to_model() if histograms else {},
+            'ts_clients': ts_broadcaster.client_count(channel_id)
+        }
+
         if is_active:
+            process = self.active_streams[channel_id]
             metadata = self.stream_metadata.get(channel_id, {})
             return StreamStatus(
                 channel_id=channel_id,
@@ -162,12 +473,17 @@ class StreamManager:
                 current_file=metadata.get('file_path'),
                 current_title=metadata.get('title'),
                 seek_position=metadata.get('seek'),
-                last_request=self.last_request_time.get(channel_id)
+                last_request=self.last_request_time.get(channel_id),
+                encoder=encoder_governor.status(channel_id),
+                worker=process.client.address if isinstance(process, RemoteJob) else None,
+                cpu_cores=cpu_allocator.cores_of(channel_id) if not isinstance(process, RemoteJob) else None,
+                **timings
             )
         else:
             return StreamStatus(
                 channel_id=channel_id,
-                is_active=False
+                is_active=False,
+                **timings
             )
 
     async def cleanup_idle_streams(self):
@@ -178,6 +494,9 @@ class StreamManager:
         channels_to_stop = []
 
         for channel_id, last_request in self.last_request_time.items():
+            # Channels with a DVR window record whether or not anyone watches
+            if dvr_recorder.is_recording(channel_id):
+                continue
             idle_time = (now - last_request).total_seconds()
             if idle_time > timeout:
                 channels_to_stop.append(channel_id)
@@ -186,9 +505,36 @@ class StreamManager:
             print(f"Stopping idle stream: {channel_id}")
             await self.stop_stream(channel_id)
 
+    async def ensure_recordings(self):
+        """Start the encodes of enabled channels with a DVR window that aren't running."""
+        channels = await channel_manager.list_channels()
+        recording = {channel.id for channel in channels if channel.enabled and channel.stream_settings.dvr_window > 0}
+
+        # Channels whose DVR window was turned off go back to stopping when idle
+        for channel_id in list(dvr_recorder.recording - recording):
+            await dvr_recorder.untrack(channel_id)
+
+        for channel in channels:
+            if channel.id not in recording:
+                continue
+            process = self.active_streams.get(channel.id)
+            if process is not None and process.poll() is None:
+                continue
+            if channel.id in self._requality:
+                continue
+            await self.start_stream(channel.id)
+
     async def stop_all_streams(self):
-        """Stop all active streams."""
-        channel_ids = list(self.active_streams.keys())
+        """
+        Stop all local streams on shutdown.
+
+        Encodes on transcode workers keep running so a restarted server can
+        adopt them; workers stop them if no server reconnects.
+        """
+        channel_ids = [
+            channel_id for channel_id, process in self.active_streams.items()
+            if not isinstance(process, RemoteJob)
+        ]
         for channel_id in channel_ids:
             await self.stop_stream(channel_id)
 
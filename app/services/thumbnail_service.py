@@ -0,0 +1,202 @@
+"""Background extraction of poster frames and preview sprite sheets."""
+import asyncio
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Optional, Set
+from app.services.probe_cache import probe_cache
+from app.utils.ffmpeg import ffmpeg_builder, low_priority_command, low_priority_kwargs
+from app.config import settings
+
+POSTER_WIDTH = 320
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 5
+SPRITE_ROWS = 5
+# Seconds a single extraction may take before it is killed
+EXTRACT_TIMEOUT = 120
+
+# Names under which images are served: <identity>.jpg and <identity>_sprite.jpg
+IMAGE_NAME = re.compile(r'^[0-9a-f]{40}(_sprite)?\.jpg$')
+
+
+def file_identity(resolved_path: str, size: int, mtime_ns: int) -> str:
+    """Content address of one version of a media file."""
+    raw = f"{resolved_path}\0{size}\0{mtime_ns}".encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+
+class ThumbnailService:
+    """
+    Generates a poster frame and a sprite sheet per media file.
+
+    Images are stored under settings.thumbnails_dir, named by the identity
+    of the file version they were taken from (path, size and mtime), so a
+    changed file gets new images and existing ones never change. Work is
+    queued and done by settings.thumbnail_concurrency workers running
+    ffmpeg at the lowest CPU priority. The names of stored images are read
+    once at start and kept in memory, so listings can show thumbnails
+    without a stat per file.
+    """
+
+    def __init__(self):
+        self.thumbnails_dir = settings.thumbnails_dir
+        self.enabled = settings.thumbnails_enabled
+        self._queue: "asyncio.Queue[Path]" = asyncio.Queue()
+        # Paths queued or being generated
+        self._queued: Set[str] = set()
+        # Identities ffmpeg could not extract from
+        self._failed: Set[str] = set()
+        # Names of the stored images; workers wait until they are read from disk
+        self._ready: Set[str] = set()
+        self._ready_loaded = asyncio.Event()
+        self._tasks = []
+
+    def start(self) -> None:
+        """Read the stored image names and start the background workers."""
+        if not self.enabled or self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._load_ready()))
+        for _ in range(max(settings.thumbnail_concurrency, 1)):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        """Cancel the background workers."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def image_path(self, name: str) -> Path:
+        """Location of a stored image; images are spread over 256 subdirectories."""
+        return self.thumbnails_dir / name[:2] / name
+
+    def identify(self, file_path: Path) -> Optional[str]:
+        """Identity of the current version of a file, or None if it is missing."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return file_identity(str(Path(file_path).resolve()), stat.st_size, stat.st_mtime_ns)
+
+    def ready_name(self, identity: str, kind: str = "poster") -> Optional[str]:
+        """Image name if it has been generated, else None."""
+        name = f"{identity}_sprite.jpg" if kind == "sprite" else f"{identity}.jpg"
+        return name if name in self._ready else None
+
+    async def _load_ready(self) -> None:
+        self._ready.update(await asyncio.to_thread(self._scan_images))
+        self._ready_loaded.set()
+
+    def _scan_images(self) -> Set[str]:
+        """Names of the images stored in the thumbnail subdirectories."""
+        names: Set[str] = set()
+        try:
+            subdirectories = [entry.path for entry in os.scandir(self.thumbnails_dir) if entry.is_dir()]
+        except OSError:
+            return names
+        for subdirectory in subdirectories:
+            try:
+                names.update(name for name in os.listdir(subdirectory) if IMAGE_NAME.match(name))
+            except OSError:
+                pass
+        return names
+
+    def is_failed(self, identity: str) -> bool:
+        return identity in self._failed
+
+    def enqueue(self, file_path: Path) -> None:
+        """
+        Queue a file for generation unless it is already queued.
+
+        Cheap enough to call from the event loop; files whose images exist
+        are skipped by the worker.
+        """
+        key = str(file_path)
+        if not self.enabled or key in self._queued:
+            return
+        self._queued.add(key)
+        self._queue.put_nowait(file_path)
+
+    async def _worker(self) -> None:
+        await self._ready_loaded.wait()
+        while True:
+            file_path = await self._queue.get()
+            try:
+                await self.generate(file_path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error generating thumbnails for {file_path}: {e}")
+            finally:
+                self._queued.discard(str(file_path))
+
+    async def generate(self, file_path: Path) -> bool:
+        """
+        Extract the poster frame and sprite sheet of a file.
+
+        The sprite is written last, so its presence marks a complete set.
+
+        Returns:
+            True if both images exist afterwards
+        """
+        identity = await asyncio.to_thread(self.identify, file_path)
+        if not identity or identity in self._failed:
+            return False
+        if self.ready_name(identity, "sprite"):
+            return True
+
+        probe = await probe_cache.probe(file_path)
+        if not probe or not probe.duration or not probe.video_codec:
+            self._failed.add(identity)
+            return False
+
+        poster = self.image_path(f"{identity}.jpg")
+        sprite = self.image_path(f"{identity}_sprite.jpg")
+        await asyncio.to_thread(poster.parent.mkdir, parents=True, exist_ok=True)
+
+        # Poster from 10% in, past most intros and fades from black
+        poster_cmd = ffmpeg_builder.build_poster_command(
+            str(file_path), poster.with_suffix('.tmp'), probe.duration * 0.1, POSTER_WIDTH
+        )
+        tiles = SPRITE_COLUMNS * SPRITE_ROWS
+        sprite_cmd = ffmpeg_builder.build_sprite_command(
+            str(file_path), sprite.with_suffix('.tmp'), max(probe.duration / tiles, 1.0),
+            SPRITE_COLUMNS, SPRITE_ROWS, SPRITE_TILE_WIDTH
+        )
+
+        for cmd, target in ((poster_cmd, poster), (sprite_cmd, sprite)):
+            if not await self._run(cmd):
+                self._failed.add(identity)
+                return False
+            # Publish atomically so readers never see a partial image
+            await asyncio.to_thread(os.replace, target.with_suffix('.tmp'), target)
+            self._ready.add(target.name)
+        return True
+
+    async def _run(self, cmd: list) -> bool:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *low_priority_command(cmd),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                **low_priority_kwargs()
+            )
+        except (FileNotFoundError, OSError) as e:
+            print(f"Error running ffmpeg for thumbnails: {e}")
+            return False
+
+        try:
+            await asyncio.wait_for(process.wait(), timeout=EXTRACT_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return False
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        return process.returncode == 0
+
+
+# Global instance
+thumbnail_service = ThumbnailService()
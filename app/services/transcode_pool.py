@@ -0,0 +1,286 @@
+"""Dispatches live encodes to transcode worker daemons; see transcode_worker for the protocol."""
+import asyncio
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from app.models.transcode import TranscodeJob, TranscodeJobStatus, WorkerStatus
+from app.services.transcode_worker import MAX_MESSAGE_SIZE, encode_message, read_message
+from app.utils.ffmpeg import video_encoder_for
+from app.config import settings
+
+# Seconds a worker has to answer a request
+REQUEST_TIMEOUT = 10
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Split "host:port"; a bare port means localhost."""
+    host, _, port = address.strip().rpartition(':')
+    return host.strip('[]') or '127.0.0.1', int(port)
+
+
+class RemoteJob:
+    """
+    Handle of an encode running on a transcode worker.
+
+    Stands in for the subprocess.Popen of a local encode in StreamManager:
+    poll() returns None while FFmpeg runs and its exit code afterwards.
+    """
+
+    def __init__(self, client: 'WorkerClient', status: TranscodeJobStatus):
+        self.client = client
+        self.job = status.job
+        self.pid = status.pid
+        self.started_at = status.started_at
+        self.returncode = status.returncode
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+
+class WorkerClient:
+    """Connection to one worker daemon, re-established whenever it drops."""
+
+    def __init__(self, address: str, pool: 'TranscodePool'):
+        self.address = address
+        self.pool = pool
+        self.status: Optional[WorkerStatus] = None
+        self.connected = False
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+
+    def free_slots(self) -> int:
+        if not self.connected or self.status is None:
+            return 0
+        running = sum(1 for job in self.status.jobs if job.returncode is None)
+        return self.status.capacity - running
+
+    def supports(self, preset: str) -> bool:
+        """Whether the worker's FFmpeg has the encoder of a transcode preset."""
+        if self.status is None or not self.status.encoders:
+            # Detection still pending on the worker; let FFmpeg decide
+            return True
+        return video_encoder_for(preset) in self.status.encoders
+
+    async def run(self) -> None:
+        """Keep connected to the worker until cancelled."""
+        reported = False
+        while True:
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ValueError, asyncio.TimeoutError) as e:
+                # Report an unreachable worker once, not on every retry
+                if self.connected or not reported:
+                    print(f"Transcode worker {self.address} unavailable: {e}")
+                    reported = True
+            finally:
+                self._disconnected()
+            await asyncio.sleep(settings.worker_reconnect_interval)
+
+    async def _session(self) -> None:
+        host, port = parse_address(self.address)
+        reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, limit=MAX_MESSAGE_SIZE),
+            timeout=REQUEST_TIMEOUT
+        )
+        self._writer.write(encode_message({'id': 0, 'op': 'hello', 'token': settings.worker_token}))
+        await self._writer.drain()
+        reply = await asyncio.wait_for(read_message(reader), timeout=REQUEST_TIMEOUT)
+        if not reply or not reply.get('ok'):
+            raise ConnectionError(reply.get('error') if reply else "connection closed by worker")
+
+        self.connected = True
+        self._update(reply['worker'])
+        print(
+            f"Connected to transcode worker {self.status.worker_id} at {self.address} "
+            f"(capacity: {self.status.capacity} jobs, running: {len(self.status.jobs)})"
+        )
+        self.pool._reconcile(self)
+
+        while True:
+            message = await read_message(reader)
+            if message is None:
+                raise ConnectionError("connection closed by worker")
+            if 'event' in message:
+                self.pool._on_event(self, message)
+                continue
+            future = self._pending.pop(message.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+
+    def _update(self, worker: dict) -> None:
+        self.status = WorkerStatus.model_validate(worker)
+        self.status.address = self.address
+
+    def _disconnected(self) -> None:
+        self.connected = False
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Lost connection to transcode worker {self.address}"))
+        self._pending.clear()
+
+    async def request(self, op: str, **fields) -> dict:
+        """
+        Send a request and wait for its response.
+
+        Raises:
+            ConnectionError: If the worker is not connected
+            RuntimeError: If the worker refused the request
+            asyncio.TimeoutError: If the worker didn't answer in time
+        """
+        if not self.connected or self._writer is None:
+            raise ConnectionError(f"Transcode worker {self.address} is not connected")
+
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(encode_message({'id': request_id, 'op': op, **fields}))
+            await self._writer.drain()
+            reply = await asyncio.wait_for(future, timeout=REQUEST_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+        if 'worker' in reply:
+            self._update(reply['worker'])
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error') or f"{op} failed")
+        return reply
+
+
+class TranscodePool:
+    """
+    Transcode workers configured in settings.transcode_workers.
+
+    New encodes go to the connected worker with the most free job slots
+    whose FFmpeg has the encoder the channel's preset needs; ties go to
+    the worker with the lowest load per CPU. Workers write HLS output to
+    their own STREAMS_DIR, so remote workers need it (and the media
+    library) mounted at the same paths as the server.
+    """
+
+    def __init__(self):
+        self.clients = [
+            WorkerClient(address.strip(), self)
+            for address in settings.transcode_workers.split(',')
+            if address.strip()
+        ]
+        self.jobs: Dict[str, RemoteJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        # Set by StreamManager: progress blocks of a job, running jobs found on a worker, and job exits
+        self.on_progress: Optional[Callable[[str, RemoteJob, Dict[str, str]], None]] = None
+        self.on_adopt: Optional[Callable[[RemoteJob], None]] = None
+        self.on_exit: Optional[Callable[[str, RemoteJob, int], None]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.clients)
+
+    def start(self) -> None:
+        """Connect to the workers in the background."""
+        self._tasks = [asyncio.create_task(client.run()) for client in self.clients]
+
+    async def stop(self) -> None:
+        """Disconnect from the workers; their jobs keep running for the next server."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def status(self) -> List[WorkerStatus]:
+        statuses = []
+        for client in self.clients:
+            if client.status is not None:
+                statuses.append(client.status.model_copy(update={'connected': client.connected}))
+            else:
+                statuses.append(WorkerStatus(
+                    worker_id=client.address,
+                    address=client.address,
+                    connected=False,
+                    capacity=0,
+                    cpu_count=0
+                ))
+        return statuses
+
+    def _candidates(self, preset: str, exclude: Set[str]) -> List[WorkerClient]:
+        def load_per_cpu(client: WorkerClient) -> float:
+            load = client.status.load_average
+            return load / max(client.status.cpu_count, 1) if load is not None else 0.0
+
+        candidates = [
+            client for client in self.clients
+            if client.address not in exclude and client.free_slots() > 0 and client.supports(preset)
+        ]
+        return sorted(candidates, key=lambda client: (-client.free_slots(), load_per_cpu(client)))
+
+    async def start_job(self, job: TranscodeJob) -> RemoteJob:
+        """
+        Start a job on the best available worker, trying the next one if it fails.
+
+        Raises:
+            RuntimeError: If no worker could start the job
+        """
+        tried: Set[str] = set()
+        errors = []
+        while True:
+            candidates = self._candidates(job.stream_settings.transcode_preset, tried)
+            if not candidates:
+                detail = "; ".join(errors) or "all workers are disconnected, busy or lack the encoder"
+                raise RuntimeError(f"No transcode worker could start channel {job.channel_id}: {detail}")
+
+            client = candidates[0]
+            tried.add(client.address)
+            try:
+                reply = await client.request('start', job=job.model_dump(mode='json'))
+            except (ConnectionError, RuntimeError, asyncio.TimeoutError) as e:
+                errors.append(f"{client.address}: {e}")
+                continue
+
+            remote = RemoteJob(client, TranscodeJobStatus.model_validate(reply['job']))
+            self.jobs[job.job_id] = remote
+            return remote
+
+    async def stop_job(self, remote: RemoteJob) -> None:
+        """Stop a job; a worker that is unreachable stops it when its orphan timeout runs out."""
+        self.jobs.pop(remote.job.job_id, None)
+        await remote.client.request('stop', job_id=remote.job.job_id)
+
+    def _on_event(self, client: WorkerClient, message: dict) -> None:
+        remote = self.jobs.get(message.get('job_id'))
+        if remote is None or remote.client is not client:
+            return
+        if message['event'] == 'progress' and self.on_progress is not None:
+            self.on_progress(remote.job.channel_id, remote, message.get('progress', {}))
+        elif message['event'] == 'exit':
+            del self.jobs[remote.job.job_id]
+            remote.returncode = message.get('returncode', -1)
+            if client.status is not None:
+                client.status.jobs = [job for job in client.status.jobs if job.job.job_id != remote.job.job_id]
+            if self.on_exit is not None:
+                self.on_exit(remote.job.channel_id, remote, remote.returncode)
+
+    def _reconcile(self, client: WorkerClient) -> None:
+        """Match the jobs a worker reported on connecting with the jobs known here."""
+        reported = {job.job.job_id: job for job in client.status.jobs if job.returncode is None}
+
+        # Jobs that ended while the worker was unreachable
+        for job_id, remote in list(self.jobs.items()):
+            if remote.client is client and job_id not in reported:
+                del self.jobs[job_id]
+                remote.returncode = -1
+
+        # Jobs started by an earlier server process, or before a lost connection
+        for job_id, status in reported.items():
+            if job_id in self.jobs:
+                continue
+            remote = self.jobs[job_id] = RemoteJob(client, status)
+            if self.on_adopt is not None:
+                self.on_adopt(remote)
+
+
+# Global instance
+transcode_pool = TranscodePool()
@@ -0,0 +1,336 @@
+"""
+Transcode worker daemon: runs live HLS encodes on behalf of TroutTV servers.
+
+Servers connect over TCP and exchange newline-delimited JSON messages.
+Requests carry an "id" that the response echoes; events carry none:
+
+    -> {"id": 1, "op": "hello", "token": "..."}
+    <- {"id": 1, "ok": true, "worker": {WorkerStatus}}
+    -> {"id": 2, "op": "start", "job": {TranscodeJob}}
+    <- {"id": 2, "ok": true, "job": {TranscodeJobStatus}, "worker": {...}}
+    -> {"id": 3, "op": "stop", "job_id": "..."}
+    <- {"id": 3, "ok": true, "worker": {...}}
+    <- {"event": "progress", "job_id": "...", "progress": {...}}
+    <- {"event": "exit", "job_id": "...", "returncode": 0}
+
+Failed requests answer {"ok": false, "error": "..."}. Encodes outlive the
+connection that started them, so restarting a server doesn't interrupt
+its streams: the next server adopts the jobs listed in the hello
+response. Once no server has been connected for
+settings.worker_orphan_timeout seconds, the worker stops its jobs.
+"""
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Set
+from app.models.transcode import TranscodeJob, TranscodeJobStatus, WorkerStatus
+from app.services.cpu_allocator import cpu_allocator
+from app.utils.ffmpeg import ProgressParser, ffmpeg_builder
+from app.config import settings
+
+# Longest protocol message; progress blocks and job specs are far smaller
+MAX_MESSAGE_SIZE = 1024 * 1024
+# Seconds FFmpeg gets to exit after SIGTERM before it is killed
+STOP_TIMEOUT = 5
+ORPHAN_CHECK_INTERVAL = 5
+
+
+def encode_message(message: dict) -> bytes:
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[dict]:
+    """
+    Read one message.
+
+    Returns:
+        The message, or None once the connection closed
+
+    Raises:
+        ValueError: If the line is not a JSON object or is too long
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError("Message must be a JSON object")
+    return message
+
+
+class WorkerJob:
+    """A running encode and the job it was started for."""
+
+    def __init__(self, job: TranscodeJob, process: subprocess.Popen):
+        self.job = job
+        self.process = process
+        self.started_at = datetime.now(timezone.utc)
+
+    def to_model(self) -> TranscodeJobStatus:
+        return TranscodeJobStatus(
+            job=self.job,
+            pid=self.process.pid,
+            started_at=self.started_at,
+            returncode=self.process.poll()
+        )
+
+
+def is_loopback(host: str) -> bool:
+    """Whether a listen address only accepts connections from this machine."""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # Host names other than localhost may resolve to any interface
+        return False
+
+
+class TranscodeWorker:
+    """Accepts encode jobs from servers and runs them as local FFmpeg processes."""
+
+    def __init__(self):
+        self.worker_id = socket.gethostname()
+        self.capacity = settings.worker_capacity or max(1, (os.cpu_count() or 2) // 2)
+        self.jobs: Dict[str, WorkerJob] = {}
+        self._clients: Set[asyncio.StreamWriter] = set()
+        # When the last server disconnected; None while one is connected
+        self._orphaned_since: Optional[float] = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def status(self) -> WorkerStatus:
+        try:
+            load_average = round(os.getloadavg()[0], 2)
+        except (AttributeError, OSError):
+            # Not available on Windows
+            load_average = None
+        capabilities = ffmpeg_builder.capabilities or {}
+        return WorkerStatus(
+            worker_id=self.worker_id,
+            capacity=self.capacity,
+            cpu_count=os.cpu_count() or 1,
+            load_average=load_average,
+            encoders=capabilities.get('encoders', []),
+            jobs=[job.to_model() for job in self.jobs.values()]
+        )
+
+    async def serve(self, host: str, port: int) -> None:
+        """
+        Accept server connections until cancelled, then stop all jobs.
+
+        Raises:
+            RuntimeError: If settings.worker_token is empty and host isn't a
+                loopback address, which would let anyone on the network run
+                FFmpeg on this machine
+        """
+        if not settings.worker_token and not is_loopback(host):
+            raise RuntimeError(f"WORKER_TOKEN must be set for a worker listening on {host}")
+        self._loop = asyncio.get_running_loop()
+        settings.streams_dir.mkdir(parents=True, exist_ok=True)
+        capabilities = await ffmpeg_builder.detect_capabilities()
+        if not capabilities['available']:
+            print(f"WARNING: FFmpeg not found at {settings.ffmpeg_path}")
+
+        server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_MESSAGE_SIZE)
+        print(f"Transcode worker {self.worker_id} listening on {host}:{port} (capacity: {self.capacity} jobs)")
+        try:
+            async with server:
+                await self._stop_orphaned_jobs()
+        finally:
+            await self.stop_all()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info('peername')
+        authenticated = False
+        try:
+            while True:
+                try:
+                    message = await read_message(reader)
+                except ValueError as e:
+                    await self._send(writer, {'ok': False, 'error': f"Invalid message: {e}"})
+                    break
+                if message is None:
+                    break
+
+                op = message.get('op')
+                if not authenticated:
+                    token = str(message.get('token', '')).encode('utf-8')
+                    if op != 'hello' or not hmac.compare_digest(token, settings.worker_token.encode('utf-8')):
+                        await self._send(writer, {'id': message.get('id'), 'ok': False, 'error': "Authentication failed"})
+                        break
+                    authenticated = True
+                    self._clients.add(writer)
+                    self._orphaned_since = None
+                    print(f"Server connected from {peer}")
+
+                try:
+                    response = await self._handle_request(op, message)
+                except (ValueError, RuntimeError, OSError) as e:
+                    response = {'ok': False, 'error': str(e)}
+                response['id'] = message.get('id')
+                await self._send(writer, response)
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            if authenticated:
+                print(f"Server disconnected from {peer}")
+                if not self._clients:
+                    self._orphaned_since = time.monotonic()
+            writer.close()
+
+    async def _handle_request(self, op: Optional[str], message: dict) -> dict:
+        if op == 'start':
+            job = await self.start_job(TranscodeJob.model_validate(message.get('job')))
+            return {'ok': True, 'job': job.to_model().model_dump(mode='json'), 'worker': self._status_json()}
+        if op == 'stop':
+            await self.stop_job(str(message.get('job_id')))
+            return {'ok': True, 'worker': self._status_json()}
+        if op in ('hello', 'status'):
+            return {'ok': True, 'worker': self._status_json()}
+        raise ValueError(f"Unknown op: {op}")
+
+    def _status_json(self) -> dict:
+        return self.status().model_dump(mode='json')
+
+    async def _send(self, writer: asyncio.StreamWriter, message: dict) -> None:
+        writer.write(encode_message(message))
+        await writer.drain()
+
+    def _broadcast(self, message: dict) -> None:
+        data = encode_message(message)
+        for writer in list(self._clients):
+            if not writer.is_closing():
+                writer.write(data)
+
+    async def start_job(self, job: TranscodeJob) -> WorkerJob:
+        """
+        Start FFmpeg for a job; starting a job that already runs is a no-op.
+
+        Raises:
+            ValueError: If the channel ID is not a plain directory name
+            RuntimeError: If the worker is at capacity
+        """
+        if job.channel_id in ('', '.', '..') or Path(job.channel_id).name != job.channel_id:
+            raise ValueError(f"Invalid channel ID: {job.channel_id}")
+        if job.job_id in self.jobs:
+            return self.jobs[job.job_id]
+
+        # One encode per channel: a server that lost track of an old one replaces it
+        for stale in [j for j in self.jobs.values() if j.job.channel_id == job.channel_id]:
+            await self.stop_job(stale.job.job_id)
+        if len(self.jobs) >= self.capacity:
+            raise RuntimeError(f"Worker {self.worker_id} is at capacity ({self.capacity} jobs)")
+
+        placement = cpu_allocator.allocate(job.channel_id, job.stream_settings)
+        cmd = ffmpeg_builder.build_hls_command(
+            job.input_file,
+            settings.streams_dir / job.channel_id,
+            job.seek,
+            job.stream_settings,
+            progress=True,
+            threads=placement.threads,
+            start_number=job.start_number
+        )
+        try:
+            # stderr is inherited so FFmpeg warnings end up in the worker's log
+            process = subprocess.Popen(
+                placement.wrap_command(cmd),
+                stdout=subprocess.PIPE,
+                stdin=subprocess.DEVNULL,
+                **placement.popen_kwargs()
+            )
+        except Exception:
+            cpu_allocator.release(job.channel_id)
+            raise
+        placement.apply(process.pid)
+        worker_job = self.jobs[job.job_id] = WorkerJob(job, process)
+        threading.Thread(
+            target=self._read_progress,
+            args=(job.job_id, process),
+            name=f"progress-{job.channel_id}",
+            daemon=True
+        ).start()
+
+        print(f"Started job {job.job_id} for channel {job.channel_id}: {job.title or job.input_file} (seek: {job.seek:.1f}s)")
+        return worker_job
+
+    def _read_progress(self, job_id: str, process: subprocess.Popen) -> None:
+        """Forward FFmpeg's -progress blocks to connected servers; runs in a thread per job."""
+        parser = ProgressParser()
+        for raw in iter(process.stdout.readline, b''):
+            block = parser.feed(raw.decode('utf-8', errors='replace'))
+            if block is not None:
+                self._call_soon(self._broadcast, {'event': 'progress', 'job_id': job_id, 'progress': block})
+        process.wait()
+        self._call_soon(self._on_exit, job_id, process)
+
+    def _call_soon(self, callback, *args) -> None:
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Event loop closed during shutdown
+            pass
+
+    def _on_exit(self, job_id: str, process: subprocess.Popen) -> None:
+        worker_job = self.jobs.get(job_id)
+        # Jobs stopped on request were already removed
+        if worker_job is None or worker_job.process is not process:
+            return
+        del self.jobs[job_id]
+        cpu_allocator.release(worker_job.job.channel_id)
+        print(f"Job {job_id} for channel {worker_job.job.channel_id} exited with code {process.returncode}")
+        self._broadcast({'event': 'exit', 'job_id': job_id, 'returncode': process.returncode})
+
+    async def stop_job(self, job_id: str) -> bool:
+        """
+        Stop a job's FFmpeg process.
+
+        Returns:
+            True if the job was stopped, False if it wasn't running
+        """
+        worker_job = self.jobs.pop(job_id, None)
+        if worker_job is None:
+            return False
+
+        process = worker_job.process
+        try:
+            process.terminate()
+            try:
+                await asyncio.to_thread(process.wait, timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                await asyncio.to_thread(process.wait)
+        except Exception as e:
+            print(f"Error stopping job {job_id}: {e}")
+        cpu_allocator.release(worker_job.job.channel_id)
+
+        print(f"Stopped job {job_id} for channel {worker_job.job.channel_id}")
+        return True
+
+    async def stop_all(self) -> None:
+        for job_id in list(self.jobs):
+            await self.stop_job(job_id)
+
+    async def _stop_orphaned_jobs(self) -> None:
+        """Stop all jobs once no server has been connected for the orphan timeout."""
+        while True:
+            await asyncio.sleep(ORPHAN_CHECK_INTERVAL)
+            orphaned_since = self._orphaned_since
+            if orphaned_since is None or not self.jobs:
+                continue
+            if time.monotonic() - orphaned_since >= settings.worker_orphan_timeout:
+                print(f"No server connected for {settings.worker_orphan_timeout}s, stopping {len(self.jobs)} jobs")
+                await self.stop_all()
+
+
+# Global instance
+transcode_worker = TranscodeWorker()
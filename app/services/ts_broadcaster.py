@@ -0,0 +1,295 @@
+"""
+Continuous MPEG-TS output: one FFmpeg per channel, fanned out to any number of HTTP clients.
+
+Tuner-style clients (Plex and Jellyfin Live TV, VLC, set-top boxes) read
+/stream/{channel_id}.ts as one endless response instead of polling HLS
+playlists. No segment files are written.
+"""
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+from app.models.channel import Channel
+from app.services.channel_manager import channel_manager
+from app.services.cpu_allocator import cpu_allocator
+from app.services.playlist_scheduler import playlist_scheduler
+from app.utils.ffmpeg import ffmpeg_builder
+from app.utils.files import path_exists
+from app.utils.mpegts import (
+    PACKET_SIZE, PAT_PID, TsAligner, is_random_access, packet_pid, parse_pat, parse_pmt_video_pids
+)
+from app.config import settings
+
+# Bytes read from FFmpeg's stdout at a time
+READ_SIZE = 64 * 1024
+# Seconds FFmpeg gets to exit after SIGTERM before it is killed
+STOP_TIMEOUT = 5
+
+
+class TsClient:
+    """One HTTP client; chunks reach it through a bounded queue, None ends the response."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ts_client_queue)
+        # New clients wait for the next keyframe to start on
+        self.joined = False
+
+    def offer(self, chunk: bytes) -> bool:
+        """Queue a chunk; returns False if the client is too far behind."""
+        try:
+            self.queue.put_nowait(chunk)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self) -> None:
+        """End the response, dropping whatever is still queued."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ChannelBroadcast:
+    """The encode of one channel and the clients reading it."""
+
+    def __init__(self, channel_id: str):
+        self.channel_id = channel_id
+        self.clients: Set[TsClient] = set()
+        self.idle_since = time.monotonic()
+        self.title: Optional[str] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._aligner = TsAligner()
+        # Latest PAT and PMT packets, sent ahead of the first keyframe of a new client
+        self._pat: Optional[bytes] = None
+        self._pmt: Optional[bytes] = None
+        self._pmt_pid: Optional[int] = None
+        self._video_pids: Set[int] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def allocation_key(self) -> str:
+        # Distinct from the channel's HLS encode, which may run at the same time
+        return f"{self.channel_id}.ts"
+
+    async def start(self) -> bool:
+        """Start the encode unless it runs; returns False if the channel can't play."""
+        async with self._lock:
+            if self.running:
+                return True
+            if not await self._spawn():
+                return False
+            self._task = asyncio.create_task(self._pump())
+            return True
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _current_media(self) -> Optional[Tuple[Channel, Path, float, str]]:
+        channel = await channel_manager.get_channel(self.channel_id)
+        if not channel or not channel.enabled:
+            print(f"Channel {self.channel_id} not found or disabled")
+            return None
+        if not channel.playlist_id and not channel.playlist:
+            print(f"Channel {self.channel_id} has no playlist assigned")
+            return None
+
+        media_info = await playlist_scheduler.get_current_media(channel)
+        if not media_info:
+            print(f"No media to play for channel {self.channel_id} (playlist may be empty)")
+            return None
+
+        file_path, seek, title = media_info
+        path_obj = Path(file_path)
+        if not path_obj.is_absolute():
+            path_obj = settings.media_dir / file_path
+        if not await path_exists(path_obj):
+            print(f"Media file not found: {path_obj}")
+            return None
+        return channel, path_obj, seek, title
+
+    async def _spawn(self) -> bool:
+        """Start FFmpeg on what the channel airs now."""
+        media = await self._current_media()
+        if media is None:
+            return False
+        channel, path_obj, seek, title = media
+
+        placement = cpu_allocator.allocate(self.allocation_key, channel.stream_settings)
+        cmd = ffmpeg_builder.build_ts_command(
+            str(path_obj),
+            seek,
+            channel.stream_settings,
+            settings.ts_keyframe_interval,
+            threads=placement.threads
+        )
+        try:
+            # stderr is inherited so FFmpeg warnings reach the server log
+            self._process = await asyncio.create_subprocess_exec(
+                *placement.wrap_command(cmd),
+                stdout=asyncio.subprocess.PIPE,
+                stdin=asyncio.subprocess.DEVNULL,
+                **placement.popen_kwargs()
+            )
+        except Exception as e:
+            cpu_allocator.release(self.allocation_key)
+            print(f"Error starting TS stream for channel {self.channel_id}: {e}")
+            return False
+        placement.apply(self._process.pid)
+
+        # A new encode starts with fresh tables and timestamps
+        self._aligner.reset()
+        self._pat = self._pmt = self._pmt_pid = None
+        self._video_pids = set()
+        self.title = title
+        print(f"Started TS stream for channel {self.channel_id}: {title} (seek: {seek:.1f}s)")
+        return True
+
+    async def _pump(self) -> None:
+        """Copy FFmpeg's output to the clients, moving on to the next programme when a file ends."""
+        try:
+            while True:
+                chunk = await self._process.stdout.read(READ_SIZE)
+                if chunk:
+                    self._publish(self._aligner.feed(chunk))
+                    continue
+
+                await self._process.wait()
+                cpu_allocator.release(self.allocation_key)
+                # Exit code 0 means the file ended; continue with whatever airs next
+                if self._process.returncode != 0 or not self.clients or not await self._spawn():
+                    break
+        finally:
+            await self._stop_process()
+            for client in self.clients:
+                client.close()
+            self.clients.clear()
+            print(f"Stopped TS stream for channel {self.channel_id}")
+
+    async def _stop_process(self) -> None:
+        process = self._process
+        if process is None:
+            return
+        if process.returncode is None:
+            try:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=STOP_TIMEOUT)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+            except ProcessLookupError:
+                pass
+        cpu_allocator.release(self.allocation_key)
+
+    def _publish(self, data: bytes) -> None:
+        """Track the tables, then hand the packets to every client that can keep up."""
+        if not data:
+            return
+        join_at = None
+        waiting = any(not client.joined for client in self.clients)
+        for offset in range(0, len(data), PACKET_SIZE):
+            packet = data[offset:offset + PACKET_SIZE]
+            pid = packet_pid(packet)
+            if pid == PAT_PID:
+                pmt_pid = parse_pat(packet)
+                if pmt_pid is not None:
+                    self._pat, self._pmt_pid = packet, pmt_pid
+            elif pid == self._pmt_pid:
+                video_pids = parse_pmt_video_pids(packet)
+                if video_pids is not None:
+                    self._pmt, self._video_pids = packet, video_pids
+            elif (
+                waiting and join_at is None and self._pmt is not None
+                # Audio packets are all flagged; join on video keyframes when there is video
+                and (pid in self._video_pids or not self._video_pids)
+                and is_random_access(packet)
+            ):
+                join_at = offset
+
+        for client in list(self.clients):
+            if client.joined:
+                chunk = data
+            elif join_at is not None:
+                chunk = self._pat + self._pmt + data[join_at:]
+                client.joined = True
+            else:
+                continue
+            if not client.offer(chunk):
+                print(f"Dropping slow TS client of channel {self.channel_id}")
+                self.remove_client(client)
+                client.close()
+
+    def add_client(self, client: TsClient) -> None:
+        self.clients.add(client)
+
+    def remove_client(self, client: TsClient) -> None:
+        self.clients.discard(client)
+        if not self.clients:
+            self.idle_since = time.monotonic()
+
+
+class TsBroadcaster:
+    """Channel broadcasts by channel ID."""
+
+    def __init__(self):
+        self.broadcasts: Dict[str, ChannelBroadcast] = {}
+
+    async def subscribe(self, channel_id: str) -> Optional[TsClient]:
+        """
+        Add a client to a channel's broadcast, starting its encode if needed.
+
+        Returns:
+            The client, or None if the channel can't play
+        """
+        broadcast = self.broadcasts.get(channel_id)
+        if broadcast is None:
+            broadcast = self.broadcasts[channel_id] = ChannelBroadcast(channel_id)
+
+        client = TsClient()
+        # Join before starting, so the first keyframe of a new encode is not missed
+        broadcast.add_client(client)
+        if not await broadcast.start():
+            broadcast.remove_client(client)
+            return None
+        return client
+
+    def unsubscribe(self, channel_id: str, client: TsClient) -> None:
+        broadcast = self.broadcasts.get(channel_id)
+        if broadcast is not None:
+            broadcast.remove_client(client)
+
+    def client_count(self, channel_id: str) -> int:
+        broadcast = self.broadcasts.get(channel_id)
+        return len(broadcast.clients) if broadcast is not None else 0
+
+    async def cleanup_idle(self) -> None:
+        """Stop encodes that have had no clients for settings.stream_timeout seconds."""
+        now = time.monotonic()
+        for channel_id, broadcast in list(self.broadcasts.items()):
+            if broadcast.clients:
+                continue
+            if not broadcast.running:
+                del self.broadcasts[channel_id]
+            elif now - broadcast.idle_since > settings.stream_timeout:
+                print(f"Stopping idle TS stream: {channel_id}")
+                await broadcast.stop()
+                del self.broadcasts[channel_id]
+
+    async def stop_all(self) -> None:
+        for broadcast in list(self.broadcasts.values()):
+            await broadcast.stop()
+        self.broadcasts.clear()
+
+
+# Global instance
+ts_broadcaster = TsBroadcaster()
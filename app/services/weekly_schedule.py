@@ -0,0 +1,226 @@
+"""Dayparting: compile a channel's scheduled playlists into weekly time slots."""
+from array import array
+from bisect import bisect_right
+from datetime import datetime, tzinfo
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.models.channel import ScheduledPlaylist
+
+DAY_SECONDS = 86400
+WEEK_SECONDS = 7 * DAY_SECONDS
+# The Unix epoch fell on a Thursday; shift so week positions start on Monday
+WEEK_ALIGNMENT = 3 * DAY_SECONDS
+
+
+def parse_clock(value: Optional[str], default: int) -> int:
+    """Convert an HH:MM string to seconds after midnight."""
+    if value is None:
+        return default
+    hours, minutes = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60
+
+
+def rule_intervals(rule: ScheduledPlaylist) -> List[Tuple[int, int]]:
+    """
+    Expand a rule into [start, end) intervals in seconds from Monday 00:00.
+
+    An end time at or before the start time runs past midnight into the next
+    day; a slot that runs past Sunday midnight wraps to Monday.
+    """
+    start = parse_clock(rule.start_time, 0)
+    end = parse_clock(rule.end_time, DAY_SECONDS)
+    if end <= start:
+        end += DAY_SECONDS
+
+    days = rule.day_of_week if rule.day_of_week is not None else range(7)
+    intervals = []
+    for day in days:
+        slot_start = day * DAY_SECONDS + start
+        slot_end = day * DAY_SECONDS + end
+        if slot_end > WEEK_SECONDS:
+            intervals.append((slot_start, WEEK_SECONDS))
+            intervals.append((0, slot_end - WEEK_SECONDS))
+        else:
+            intervals.append((slot_start, slot_end))
+    return intervals
+
+
+def check_overlaps(rules: List[ScheduledPlaylist]) -> None:
+    """
+    Reject rules of equal priority whose time slots overlap.
+
+    Rules with different priorities may overlap; the higher one wins.
+
+    Raises:
+        ValueError: If two rules with the same priority overlap
+    """
+    expanded = [rule_intervals(rule) for rule in rules]
+    for i in range(len(rules)):
+        for j in range(i + 1, len(rules)):
+            if rules[i].priority != rules[j].priority:
+                continue
+            for a_start, a_end in expanded[i]:
+                if any(a_start < b_end and b_start < a_end for b_start, b_end in expanded[j]):
+                    raise ValueError(
+                        f"Scheduled playlists {i + 1} ({rules[i].playlist_id}) and "
+                        f"{j + 1} ({rules[j].playlist_id}) overlap with the same priority"
+                    )
+
+
+class WeeklySchedule:
+    """
+    A channel's scheduled playlists compiled into non-overlapping weekly slots.
+
+    starts[k] is the offset from Monday 00:00 at which slot k begins and
+    owners[k] is the playlist that airs in it, or None where no rule applies
+    and the channel's own playlist plays. Slot lookup is a bisection.
+
+    Each playlist only advances while it is on air. Per-owner prefix sums of
+    airtime over the week let the playlist position at any instant be
+    computed arithmetically rather than by replaying past weeks.
+
+    Times are evaluated as local wall-clock time in the given timezone.
+    """
+
+    def __init__(self, rules: List[ScheduledPlaylist], tz: tzinfo):
+        self.rules = rules
+        self.tz = tz
+
+        # Elementary slots between every rule boundary in the week
+        points = {0, WEEK_SECONDS}
+        expanded = []
+        for order, rule in enumerate(rules):
+            for start, end in rule_intervals(rule):
+                points.update((start, end))
+                expanded.append((rule.priority, -order, start, end, rule.playlist_id))
+        points = sorted(points)
+
+        starts: List[int] = []
+        owners: List[Optional[str]] = []
+        for start, end in zip(points, points[1:]):
+            best = None
+            for candidate in expanded:
+                if candidate[2] <= start and end <= candidate[3]:
+                    if best is None or candidate[:2] > best[:2]:
+                        best = candidate
+            owner = best[4] if best else None
+            # Merge with the previous slot when the owner is unchanged
+            if owners and owners[-1] == owner:
+                continue
+            starts.append(start)
+            owners.append(owner)
+
+        self.starts = array('q', starts)
+        self.owners = owners
+
+        # owner -> airtime accumulated before each slot start (plus week total)
+        self._airtime: Dict[Optional[str], array] = {}
+        bounds = starts + [WEEK_SECONDS]
+        for owner in set(owners):
+            prefix = array('q', [0])
+            for k, slot_owner in enumerate(owners):
+                length = bounds[k + 1] - bounds[k] if slot_owner == owner else 0
+                prefix.append(prefix[-1] + length)
+            self._airtime[owner] = prefix
+
+    def _to_week_time(self, timestamp: float) -> float:
+        """Map a UTC timestamp to local seconds since the Monday epoch week."""
+        offset = datetime.fromtimestamp(timestamp, self.tz).utcoffset()
+        return timestamp + offset.total_seconds() + WEEK_ALIGNMENT
+
+    def _to_timestamp(self, week_time: float) -> float:
+        """Map local seconds since the Monday epoch week back to a UTC timestamp."""
+        local = week_time - WEEK_ALIGNMENT
+        guess = local - datetime.fromtimestamp(local, self.tz).utcoffset().total_seconds()
+        return local - datetime.fromtimestamp(guess, self.tz).utcoffset().total_seconds()
+
+    def _slot_at(self, position: float) -> int:
+        return bisect_right(self.starts, position) - 1
+
+    def _slot_end(self, slot: int) -> int:
+        return self.starts[slot + 1] if slot + 1 < len(self.starts) else WEEK_SECONDS
+
+    def _airtime_at(self, owner: Optional[str], week_time: float) -> float:
+        """Total airtime of an owner from the epoch week up to week_time."""
+        weeks, position = divmod(week_time, WEEK_SECONDS)
+        prefix = self._airtime[owner]
+        slot = self._slot_at(position)
+        airtime = weeks * prefix[-1] + prefix[slot]
+        if self.owners[slot] == owner:
+            airtime += position - self.starts[slot]
+        return airtime
+
+    def _airtime_since(self, owner: Optional[str], week_time: float, origin: float) -> float:
+        elapsed = self._airtime_at(owner, week_time) - self._airtime_at(owner, origin)
+        return max(elapsed, 0.0)
+
+    def resolve(self, timestamp: float, origin: float) -> Tuple[Optional[str], float]:
+        """
+        Find which playlist airs at a time and how far into it the channel is.
+
+        Args:
+            timestamp: UTC timestamp to resolve
+            origin: UTC timestamp at which the channel's schedule started
+
+        Returns:
+            Tuple of (owner, airtime); owner is None for the channel's own
+            playlist and airtime is the seconds that playlist has been on air
+            since origin
+        """
+        week_time = self._to_week_time(timestamp)
+        owner = self.owners[self._slot_at(week_time % WEEK_SECONDS)]
+        return owner, self._airtime_since(owner, week_time, self._to_week_time(origin))
+
+    def iter_slots(
+        self,
+        start: float,
+        end: float,
+        origin: float
+    ) -> Iterator[Tuple[float, float, Optional[str], float]]:
+        """
+        Yield the slots overlapping [start, end).
+
+        Slots keep their real boundaries: the first may start before the
+        window and the last may end after it.
+
+        Yields:
+            Tuples of (slot_start, slot_end, owner, airtime_at_slot_start)
+            with UTC timestamps
+        """
+        origin_week_time = self._to_week_time(origin)
+        week_time = self._to_week_time(start)
+        end_week_time = self._to_week_time(end)
+
+        pending = None
+        while week_time < end_week_time:
+            week_base = week_time - week_time % WEEK_SECONDS
+            slot = self._slot_at(week_time - week_base)
+            slot_start = week_base + self.starts[slot]
+            slot_end = week_base + self._slot_end(slot)
+            owner = self.owners[slot]
+            if pending is None and slot == 0 and len(self.owners) > 1 and self.owners[-1] == owner:
+                # The first slot really began late on the previous Sunday
+                slot_start = week_base - WEEK_SECONDS + self.starts[-1]
+
+            if pending and pending[2] == owner:
+                # Same playlist continues across the Sunday/Monday boundary
+                pending[1] = slot_end
+            else:
+                if pending:
+                    yield self._slot_tuple(pending, origin_week_time)
+                pending = [slot_start, slot_end, owner]
+            week_time = slot_end
+
+        if pending:
+            if len(self.owners) > 1 and pending[1] % WEEK_SECONDS == 0 and self.owners[0] == pending[2]:
+                # The last slot continues into the following Monday
+                pending[1] += self._slot_end(0)
+            yield self._slot_tuple(pending, origin_week_time)
+
+    def _slot_tuple(self, slot: list, origin_week_time: float) -> Tuple[float, float, Optional[str], float]:
+        slot_start, slot_end, owner = slot
+        return (
+            self._to_timestamp(slot_start),
+            self._to_timestamp(slot_end),
+            owner,
+            self._airtime_since(owner, slot_start, origin_week_time)
+        )
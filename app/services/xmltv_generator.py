@@ -1,15 +1,78 @@
-from typing import List
-from lxml import etree
-from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Tuple
+from datetime import datetime, timezone
 from app.models.channel import Channel
-from app.services.playlist_scheduler import playlist_scheduler
+from app.services.epg_engine import ChannelGuide, epg_engine, format_xmltv_times
+from app.services.logo_store import logo_store
 from app.config import settings
 
+if TYPE_CHECKING:
+    from lxml import etree
+
+XML_DECLARATION = b"<?xml version='1.0' encoding='UTF-8'?>\n"
+TV_OPEN = b'<tv generator-info-name="TroutTV" generator-info-url="https://github.com/yourusername/trouttv">\n'
+TV_CLOSE = b"</tv>\n"
+CHUNK_SIZE = 64 * 1024
+
+
+class GuideFragment:
+    """Pre-rendered XMLTV markup for one channel and what it was built from."""
+
+    def __init__(
+        self,
+        channel: Channel,
+        dependencies: Tuple,
+        window_start: float,
+        channel_xml: bytes,
+        programmes_xml: bytes
+    ):
+        self.channel = channel
+        self.dependencies = dependencies
+        self.window_start = window_start
+        self.channel_xml = channel_xml
+        self.programmes_xml = programmes_xml
+
+    def is_current(self, channel: Channel, dependencies: Tuple, window_start: float) -> bool:
+        """
+        Check whether the fragment still matches the channel.
+
+        Channel and playlist managers hand out the same cached instances until
+        the underlying files change, so identity comparisons detect edits.
+        """
+        return (
+            self.channel is channel
+            and self.window_start == window_start
+            and len(self.dependencies) == len(dependencies)
+            and all(a is b for a, b in zip(self.dependencies, dependencies))
+        )
+
 
 class XMLTVGenerator:
-    def generate_xmltv(self, channels: List[Channel]) -> str:
+    def __init__(self):
+        # channel_id -> rendered fragment
+        self._fragments: Dict[str, GuideFragment] = {}
+
+    async def generate_xmltv(self, channels: List[Channel]) -> bytes:
+        """
+        Generate the complete XMLTV document in memory.
+
+        Prefer iter_xmltv for responses; this is for callers that need the
+        whole document at once.
+
+        Returns:
+            UTF-8 encoded XMLTV document
+        """
+        return b"".join([chunk async for chunk in self.iter_xmltv(channels)])
+
+    async def iter_xmltv(self, channels: List[Channel]) -> AsyncIterator[bytes]:
         """
-        Generate XMLTV EPG data.
+        Generate XMLTV EPG data incrementally.
+
+        The document is produced as a stream of byte chunks, so the first
+        bytes go out immediately and no full tree or document is held in
+        memory. Per-channel fragments are cached (unless
+        settings.epg_cache_fragments is off) and only re-rendered when the
+        channel or one of its playlists changes, or when the guide window
+        rolls forward by settings.epg_window_step seconds.
 
         Format:
         <?xml version="1.0" encoding="UTF-8"?>
@@ -22,64 +85,169 @@ class XMLTVGenerator:
             <desc>Program description</desc>
           </programme>
         </tv>
+
+        Yields:
+            UTF-8 encoded chunks of the XMLTV document
         """
-        # Create root element
-        tv = etree.Element("tv")
-        tv.set("generator-info-name", "TroutTV")
-        tv.set("generator-info-url", "https://github.com/yourusername/trouttv")
-
-        # Add channels
-        for channel in channels:
-            if not channel.enabled:
+        enabled_channels = [channel for channel in channels if channel.enabled]
+        caching = settings.epg_cache_fragments
+        window_start, window_end = self._window()
+
+        # Fragments reused by this document; kept here because concurrent
+        # requests may replace or drop self._fragments entries meanwhile
+        current: Dict[str, GuideFragment] = {}
+        stale = []
+        dependencies = {}
+        for channel in enabled_channels:
+            dependencies[channel.id] = await self._dependencies(channel)
+            fragment = self._fragments.get(channel.id)
+            if fragment and fragment.is_current(channel, dependencies[channel.id], window_start):
+                current[channel.id] = fragment
+            else:
+                stale.append(channel)
+
+        # Compute the stale channels' programmes in one batch
+        guides: Dict[str, ChannelGuide] = {}
+        if stale:
+            for guide in await epg_engine.build(stale, window_start, window_end):
+                guides[guide.channel.id] = guide
+
+        yield XML_DECLARATION + TV_OPEN
+
+        # Channel elements
+        channel_xml = {}
+        for channel in enabled_channels:
+            if channel.id in guides:
+                channel_xml[channel.id] = self._render_channel(channel)
+            else:
+                channel_xml[channel.id] = current[channel.id].channel_xml
+        yield b"".join(channel_xml.values())
+
+        # Programme elements, one channel at a time
+        for channel in enabled_channels:
+            guide = guides.pop(channel.id, None)
+            if guide is None:
+                yield current[channel.id].programmes_xml
                 continue
 
-            # Channel element
-            channel_elem = etree.SubElement(tv, "channel")
-            channel_elem.set("id", channel.id)
-
-            display_name = etree.SubElement(channel_elem, "display-name")
-            display_name.text = channel.name
-
-            if channel.logo_url:
-                icon = etree.SubElement(channel_elem, "icon")
-                icon.set("src", channel.logo_url)
-
-        # Add programs
-        hours_ahead = settings.epg_days_ahead * 24
+            parts = []
+            for chunk in self._render_programmes(guide):
+                if caching:
+                    parts.append(chunk)
+                yield chunk
+
+            if caching:
+                self._fragments[channel.id] = GuideFragment(
+                    channel,
+                    dependencies[channel.id],
+                    window_start,
+                    channel_xml[channel.id],
+                    b"".join(parts)
+                )
+
+        yield TV_CLOSE
+
+        # Forget channels that were deleted or disabled
+        if not caching:
+            self._fragments.clear()
+        for channel_id in set(self._fragments) - set(dependencies):
+            del self._fragments[channel_id]
+
+    def clear_fragments(self) -> None:
+        """Drop every cached fragment, so the next guide is rendered from scratch."""
+        self._fragments.clear()
+
+    async def document_version(self, channels: List[Channel]) -> Tuple:
+        """
+        What the document for `channels` is generated from: the guide window
+        and each enabled channel with its playlists' items.
 
-        for channel in channels:
-            if not channel.enabled:
+        Managers hand out the same instances until files change, so equal
+        versions (compared by identity first) mean an identical document.
+        """
+        window_start, _ = self._window()
+        return (window_start, tuple([
+            (channel, await self._dependencies(channel)) for channel in channels if channel.enabled
+        ]))
+
+    def _window(self) -> Tuple[float, float]:
+        """Current guide window; it starts on a step boundary so fragments stay valid until it rolls."""
+        step = max(settings.epg_window_step, 1)
+        now = datetime.now(timezone.utc).timestamp()
+        window_start = now - now % step
+        return window_start, window_start + step + settings.epg_days_ahead * 24 * 3600
+
+    async def _dependencies(self, channel: Channel) -> Tuple:
+        """Item lists of every playlist the channel can air, for change detection."""
+        from app.services.playlist_manager import playlist_manager
+
+        playlist_ids = [channel.playlist_id] + [s.playlist_id for s in channel.scheduled_playlists]
+        items = []
+        for playlist_id in playlist_ids:
+            if not playlist_id:
                 continue
-
-            programs = playlist_scheduler.get_upcoming_programs(channel, hours_ahead)
-
-            for start_time, end_time, title, description in programs:
-                programme = etree.SubElement(tv, "programme")
-                programme.set("start", self._format_xmltv_time(start_time))
-                programme.set("stop", self._format_xmltv_time(end_time))
-                programme.set("channel", channel.id)
-
-                title_elem = etree.SubElement(programme, "title")
-                title_elem.set("lang", "en")
-                title_elem.text = title
-
-                if description:
-                    desc_elem = etree.SubElement(programme, "desc")
-                    desc_elem.set("lang", "en")
-                    desc_elem.text = description
-
-        # Convert to string
-        xml_string = etree.tostring(
-            tv,
-            encoding='UTF-8',
-            xml_declaration=True,
-            pretty_print=True
-        )
-        return xml_string.decode('utf-8')
-
-    def _format_xmltv_time(self, dt: datetime) -> str:
-        """Format datetime as XMLTV time: YYYYMMDDHHmmss +0000"""
-        return dt.strftime("%Y%m%d%H%M%S +0000")
+            playlist = await playlist_manager.get_playlist(playlist_id)
+            items.append(playlist.items if playlist else None)
+        return tuple(items)
+
+    def _render_channel(self, channel: Channel) -> bytes:
+        # lxml is only needed once a guide is requested; keep it out of startup
+        from lxml import etree
+
+        channel_elem = etree.Element("channel")
+        channel_elem.set("id", channel.id)
+
+        display_name = etree.SubElement(channel_elem, "display-name")
+        display_name.text = channel.name
+
+        if channel.logo_url:
+            icon = etree.SubElement(channel_elem, "icon")
+            icon.set("src", logo_store.client_url(channel.logo_url))
+
+        return self._serialize(channel_elem)
+
+    def _render_programmes(self, guide: ChannelGuide) -> Iterator[bytes]:
+        """Render a channel's programmes as chunks of about CHUNK_SIZE bytes."""
+        from lxml import etree
+
+        channel_id = guide.channel.id
+        start_times = format_xmltv_times(guide.starts)
+        stop_times = format_xmltv_times(guide.ends)
+
+        parts = []
+        size = 0
+        for k, (_, _, item) in enumerate(guide.programs()):
+            programme = etree.Element("programme")
+            programme.set("start", start_times[k])
+            programme.set("stop", stop_times[k])
+            programme.set("channel", channel_id)
+
+            title_elem = etree.SubElement(programme, "title")
+            title_elem.set("lang", "en")
+            title_elem.text = item.title
+
+            if item.description:
+                desc_elem = etree.SubElement(programme, "desc")
+                desc_elem.set("lang", "en")
+                desc_elem.text = item.description
+
+            serialized = self._serialize(programme)
+            parts.append(serialized)
+            size += len(serialized)
+            if size >= CHUNK_SIZE:
+                yield b"".join(parts)
+                parts = []
+                size = 0
+
+        if parts:
+            yield b"".join(parts)
+
+    def _serialize(self, element: "etree._Element") -> bytes:
+        """Serialize a top-level element indented as a child of <tv>."""
+        from lxml import etree
+
+        etree.indent(element, space="  ", level=1)
+        return b"  " + etree.tostring(element, encoding='UTF-8') + b"\n"
 
 
 # Global instance
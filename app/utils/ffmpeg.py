@@ -1,13 +1,57 @@
+import asyncio
+import json
+import os
+import shutil
 import subprocess
+import sys
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.models.channel import StreamSettings
 from app.config import settings
 
+# Seconds a capability check may take before ffmpeg is killed
+CAPABILITY_TIMEOUT = 5
+
+
+def hw_accel_from_encoders(output: str) -> str:
+    """Pick the hardware acceleration to use from `ffmpeg -encoders` output."""
+    # Check for QSV (Intel Quick Sync)
+    if 'h264_qsv' in output:
+        return 'qsv'
+
+    # Check for NVENC (NVIDIA)
+    if 'h264_nvenc' in output:
+        return 'nvenc'
+
+    return 'software'
+
+
+def parse_encoders(output: str) -> List[str]:
+    """Names of the video encoders listed by `ffmpeg -encoders`."""
+    encoders = []
+    listing = False
+    for line in output.splitlines():
+        parts = line.split()
+        if not listing:
+            # The list starts after a " ------" separator line
+            listing = bool(parts) and parts[0].startswith('---')
+            continue
+        if len(parts) >= 2 and parts[0].startswith('V'):
+            encoders.append(parts[1])
+    return encoders
+
+
+def video_encoder_for(preset: str) -> str:
+    """The ffmpeg video encoder build_hls_command uses for a transcode preset."""
+    return {'qsv': 'h264_qsv', 'nvenc': 'h264_nvenc'}.get(preset.lower(), 'libx264')
+
 
 class FFmpegBuilder:
     def __init__(self):
         self.ffmpeg_path = settings.ffmpeg_path
+        self.capabilities_path = settings.ffmpeg_capabilities_path
+        # Set by detect_capabilities()
+        self.capabilities: Optional[Dict] = None
 
     def detect_hw_accel(self) -> str:
         """
@@ -16,31 +60,118 @@ class FFmpegBuilder:
         Returns:
             'qsv', 'nvenc', or 'software'
         """
-        # Test for Intel QSV
         try:
             cmd = [self.ffmpeg_path, '-hide_banner', '-encoders']
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-            output = result.stdout + result.stderr
-
-            # Check for QSV (Intel Quick Sync)
-            if 'h264_qsv' in output:
-                return 'qsv'
-
-            # Check for NVENC (NVIDIA)
-            if 'h264_nvenc' in output:
-                return 'nvenc'
-
+            return hw_accel_from_encoders(result.stdout + result.stderr)
         except Exception as e:
             print(f"Error detecting hardware acceleration: {e}")
 
         return 'software'
 
+    async def detect_capabilities(self) -> Dict:
+        """
+        Check that ffmpeg runs and detect its encoders without blocking the event loop.
+
+        Results are cached in settings.ffmpeg_capabilities_path, keyed by
+        the resolved path, size and mtime of the binary, so ffmpeg is only
+        run again after it was replaced or upgraded.
+
+        Returns:
+            Dictionary with available, version, hw_accel and encoders
+        """
+        binary = await asyncio.to_thread(self._binary_identity)
+        if binary is None:
+            self.capabilities = {
+                'binary': None, 'available': False, 'version': None,
+                'hw_accel': 'software', 'encoders': []
+            }
+            return self.capabilities
+
+        cached = await asyncio.to_thread(self._load_capabilities)
+        if cached and cached.get('binary') == binary:
+            self.capabilities = cached
+            return cached
+
+        version_output, encoders_output = await asyncio.gather(
+            self._run_for_output('-version'),
+            self._run_for_output('-hide_banner', '-encoders')
+        )
+        capabilities = {
+            'binary': binary,
+            'available': version_output is not None,
+            'version': version_output.splitlines()[0] if version_output else None,
+            'hw_accel': hw_accel_from_encoders(encoders_output or ''),
+            'encoders': parse_encoders(encoders_output or '')
+        }
+        # A binary that failed to run may work next time; only cache successes
+        if capabilities['available']:
+            try:
+                await asyncio.to_thread(self._save_capabilities, capabilities)
+            except OSError as e:
+                print(f"Error writing FFmpeg capabilities cache: {e}")
+
+        self.capabilities = capabilities
+        return capabilities
+
+    def _binary_identity(self) -> Optional[Dict]:
+        """Resolved path, size and mtime of the ffmpeg binary, or None if it is not found."""
+        found = shutil.which(self.ffmpeg_path)
+        if not found:
+            return None
+        resolved = os.path.realpath(found)
+        try:
+            stat = os.stat(resolved)
+        except OSError:
+            return None
+        return {'path': resolved, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _load_capabilities(self) -> Optional[Dict]:
+        try:
+            return json.loads(self.capabilities_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _save_capabilities(self, capabilities: Dict) -> None:
+        self.capabilities_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.capabilities_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps(capabilities, indent=2), encoding='utf-8')
+        os.replace(temp_path, self.capabilities_path)
+
+    async def _run_for_output(self, *args: str) -> Optional[str]:
+        """Run ffmpeg and return its output, or None if it failed or timed out."""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.ffmpeg_path, *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+        except (FileNotFoundError, OSError):
+            return None
+
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=CAPABILITY_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return None
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+
+        if process.returncode != 0:
+            return None
+        return stdout.decode('utf-8', errors='replace')
+
     def build_hls_command(
         self,
         input_file: str,
         output_dir: Path,
         seek: float,
-        stream_settings: StreamSettings
+        stream_settings: StreamSettings,
+        progress: bool = False,
+        threads: Optional[int] = None,
+        start_number: int = 0
     ) -> List[str]:
         """
         Build FFmpeg command for HLS streaming.
@@ -50,6 +181,10 @@ class FFmpegBuilder:
             output_dir: Directory for HLS output files
             seek: Seek position in seconds
             stream_settings: Stream configuration
+            progress: Write -progress blocks to stdout for the encoder governor
+            threads: Cap on libx264 threads, e.g. the cores the encode is pinned to
+            start_number: Number of the first segment and media sequence of the playlist,
+                so a restarted encode continues the channel's numbering
 
         Returns:
             List of command arguments
@@ -60,6 +195,9 @@ class FFmpegBuilder:
 
         # Input options
         cmd.extend(['-hide_banner', '-loglevel', 'warning'])
+        if progress:
+            # Machine-readable progress blocks on stdout; see ProgressParser
+            cmd.extend(['-nostats', '-progress', 'pipe:1'])
         cmd.extend(['-re'])  # Real-time streaming
 
         # Seek to position
@@ -68,7 +206,70 @@ class FFmpegBuilder:
 
         cmd.extend(['-i', input_file])
 
-        # Video encoding based on preset
+        # Video and audio encoding based on preset
+        cmd.extend(self._encode_args(stream_settings, threads))
+
+        # HLS output options
+        cmd.extend(['-f', 'hls'])
+        cmd.extend(['-hls_time', str(stream_settings.segment_duration)])
+        cmd.extend(['-hls_list_size', str(stream_settings.playlist_size)])
+        cmd.extend(['-start_number', str(start_number)])
+        # A restarted encode appends to the playlist of the one before, behind a discontinuity,
+        # so players keep going; wall-clock times let them line the two up
+        cmd.extend(['-hls_flags', 'delete_segments+omit_endlist+program_date_time+append_list'])
+        cmd.extend(['-hls_segment_type', 'mpegts'])
+
+        # Output paths; segment numbers run into the hundreds of millions, so they aren't padded
+        segment_pattern = str(output_dir / 'segment_%d.ts')
+        playlist_path = str(output_dir / 'stream.m3u8')
+
+        cmd.extend(['-hls_segment_filename', segment_pattern])
+        cmd.append(playlist_path)
+
+        return cmd
+
+    def build_ts_command(
+        self,
+        input_file: str,
+        seek: float,
+        stream_settings: StreamSettings,
+        keyframe_interval: int,
+        threads: Optional[int] = None
+    ) -> List[str]:
+        """
+        Build FFmpeg command for continuous MPEG-TS on stdout.
+
+        Args:
+            input_file: Path to input media file
+            seek: Seek position in seconds
+            stream_settings: Stream configuration
+            keyframe_interval: Seconds between forced keyframes, where new clients can join
+            threads: Cap on libx264 threads
+
+        Returns:
+            List of command arguments
+        """
+        cmd = [self.ffmpeg_path]
+        cmd.extend(['-hide_banner', '-loglevel', 'warning', '-nostats'])
+        cmd.extend(['-re'])
+
+        if seek > 0:
+            cmd.extend(['-ss', str(seek)])
+
+        cmd.extend(['-i', input_file])
+        cmd.extend(self._encode_args(stream_settings, threads))
+        cmd.extend(['-force_key_frames', f'expr:gte(t,n_forced*{keyframe_interval})'])
+
+        # Each encode starts a new timeline; flag it so players don't wait for continuity
+        cmd.extend(['-f', 'mpegts'])
+        cmd.extend(['-mpegts_flags', '+initial_discontinuity'])
+        cmd.append('pipe:1')
+
+        return cmd
+
+    def _encode_args(self, stream_settings: StreamSettings, threads: Optional[int]) -> List[str]:
+        """Video and audio encoding options shared by the HLS and MPEG-TS outputs."""
+        cmd = []
         preset = stream_settings.transcode_preset.lower()
 
         if preset == 'qsv':
@@ -81,6 +282,15 @@ class FFmpegBuilder:
             cmd.extend(['-c:v', 'h264_nvenc'])
             cmd.extend(['-preset', 'fast'])
             cmd.extend(['-cq', '23'])
+        elif preset == 'software_fastest':
+            # Software encoding - cheapest preset, used when the governor steps a channel down
+            cmd.extend(['-c:v', 'libx264'])
+            cmd.extend(['-preset', 'ultrafast'])
+            cmd.extend(['-crf', '23'])
+        elif preset == 'software_faster':
+            cmd.extend(['-c:v', 'libx264'])
+            cmd.extend(['-preset', 'superfast'])
+            cmd.extend(['-crf', '23'])
         elif preset == 'software_medium':
             # Software encoding - medium preset
             cmd.extend(['-c:v', 'libx264'])
@@ -92,6 +302,9 @@ class FFmpegBuilder:
             cmd.extend(['-preset', 'veryfast'])
             cmd.extend(['-crf', '23'])
 
+        if threads and video_encoder_for(preset) == 'libx264':
+            cmd.extend(['-threads', str(threads)])
+
         # Video bitrate and buffer
         cmd.extend(['-maxrate', f'{stream_settings.video_bitrate}k'])
         cmd.extend(['-bufsize', f'{stream_settings.video_bitrate * 2}k'])
@@ -105,21 +318,72 @@ class FFmpegBuilder:
         cmd.extend(['-b:a', f'{stream_settings.audio_bitrate}k'])
         cmd.extend(['-ar', '48000'])
 
-        # HLS output options
-        cmd.extend(['-f', 'hls'])
-        cmd.extend(['-hls_time', str(stream_settings.segment_duration)])
-        cmd.extend(['-hls_list_size', str(stream_settings.playlist_size)])
-        cmd.extend(['-hls_flags', 'delete_segments+omit_endlist'])
-        cmd.extend(['-hls_segment_type', 'mpegts'])
+        return cmd
 
-        # Output paths
-        segment_pattern = str(output_dir / 'segment_%03d.ts')
-        playlist_path = str(output_dir / 'stream.m3u8')
+    def build_poster_command(self, input_file: str, output_file: Path, seek: float, width: int) -> List[str]:
+        """
+        Build FFmpeg command that extracts one JPEG poster frame.
 
-        cmd.extend(['-hls_segment_filename', segment_pattern])
-        cmd.append(playlist_path)
+        Args:
+            input_file: Path to input media file
+            output_file: JPEG file to write
+            seek: Position of the frame in seconds
+            width: Output width; height keeps the aspect ratio
 
-        return cmd
+        Returns:
+            List of command arguments
+        """
+        return [
+            self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+            '-threads', '1',
+            '-ss', f'{seek:.3f}',
+            '-i', input_file,
+            '-frames:v', '1',
+            '-vf', f'scale={width}:-2',
+            '-q:v', '4',
+            '-f', 'image2',
+            str(output_file)
+        ]
+
+    def build_sprite_command(
+        self,
+        input_file: str,
+        output_file: Path,
+        interval: float,
+        columns: int,
+        rows: int,
+        width: int
+    ) -> List[str]:
+        """
+        Build FFmpeg command that tiles evenly spaced frames into one JPEG sprite sheet.
+
+        Only keyframes are decoded, which makes a pass over a whole file
+        far cheaper than a full decode.
+
+        Args:
+            input_file: Path to input media file
+            output_file: JPEG file to write
+            interval: Seconds between tiles
+            columns: Tiles per row
+            rows: Rows of tiles
+            width: Width of each tile; height keeps the aspect ratio
+
+        Returns:
+            List of command arguments
+        """
+        return [
+            self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+            '-threads', '1',
+            '-skip_frame', 'nokey',
+            '-i', input_file,
+            '-an', '-sn',
+            '-vf', f'fps=1/{interval:.3f},scale={width}:-2,tile={columns}x{rows}',
+            '-frames:v', '1',
+            '-fps_mode', 'vfr',
+            '-q:v', '5',
+            '-f', 'image2',
+            str(output_file)
+        ]
 
     def test_ffmpeg(self) -> bool:
         """Test if FFmpeg is available."""
@@ -134,5 +398,49 @@ class FFmpegBuilder:
             return False
 
 
+class ProgressParser:
+    """
+    Incremental parser for `-progress` output.
+
+    ffmpeg writes blocks of key=value lines, each ending with a
+    progress=continue (or progress=end) line.
+    """
+
+    def __init__(self):
+        self._block: Dict[str, str] = {}
+
+    def feed(self, line: str) -> Optional[Dict[str, str]]:
+        """Add one output line; returns the block it completed, if any."""
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+        self._block[key] = value.strip()
+        if key != 'progress':
+            return None
+        block, self._block = self._block, {}
+        return block
+
+
+def low_priority_command(cmd: List[str]) -> List[str]:
+    """
+    Prefix a command with nice so a background job runs at the lowest CPU priority.
+
+    Used for work such as thumbnail extraction that must never compete
+    with live encodes. nice execs the command, which avoids a preexec_fn in
+    this threaded process.
+    """
+    if sys.platform == 'win32':
+        return cmd
+    nice = shutil.which('nice')
+    return [nice, '-n', '19'] + cmd if nice else cmd
+
+
+def low_priority_kwargs() -> dict:
+    """Subprocess arguments for the lowest priority on Windows, where there is no nice."""
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.IDLE_PRIORITY_CLASS}
+    return {}
+
+
 # Global instance
 ffmpeg_builder = FFmpegBuilder()
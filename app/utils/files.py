@@ -0,0 +1,103 @@
+"""Non-blocking file helpers for the JSON-backed stores."""
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, Generic, List, Optional, Tuple, Type, TypeVar
+import aiofiles
+import aiofiles.os
+from pydantic import BaseModel
+
+ModelT = TypeVar('ModelT', bound=BaseModel)
+
+
+async def read_json(path: Path) -> Any:
+    """
+    Read and parse a JSON file without blocking the event loop.
+
+    Args:
+        path: File to read
+
+    Returns:
+        Parsed JSON data
+    """
+    async with aiofiles.open(path, 'r', encoding='utf-8') as f:
+        contents = await f.read()
+    return json.loads(contents)
+
+
+async def write_json(path: Path, data: Any) -> None:
+    """
+    Serialize data to a JSON file without blocking the event loop.
+
+    Args:
+        path: File to write
+        data: JSON-serializable data
+    """
+    contents = json.dumps(data, indent=2, default=str)
+    async with aiofiles.open(path, 'w', encoding='utf-8') as f:
+        await f.write(contents)
+
+
+async def list_json_files(directory: Path) -> List[Path]:
+    """List the JSON files in a directory from a worker thread."""
+    return await asyncio.to_thread(lambda: list(directory.glob("*.json")))
+
+
+async def path_exists(path: Path) -> bool:
+    """Check whether a path exists without blocking the event loop."""
+    return await aiofiles.os.path.exists(path)
+
+
+async def unlink(path: Path) -> None:
+    """Delete a file without blocking the event loop."""
+    await aiofiles.os.remove(path)
+
+
+class JsonModelCache(Generic[ModelT]):
+    """
+    Cache of parsed models for JSON files.
+
+    Entries are keyed by path and stamped with the file's (mtime_ns, size),
+    so an unchanged file is parsed once and edits made outside the app are
+    still picked up on the next load.
+    """
+
+    def __init__(self, model: Type[ModelT]):
+        self.model = model
+        self._entries: Dict[Path, Tuple[Tuple[int, int], ModelT]] = {}
+
+    async def load(self, path: Path) -> Optional[ModelT]:
+        """
+        Load a model, reusing the cached instance if the file is unchanged.
+
+        Returns:
+            The parsed model, or None if the file does not exist
+
+        Raises:
+            Exception: If the file cannot be read or validated
+        """
+        try:
+            stat = await aiofiles.os.stat(path)
+        except FileNotFoundError:
+            self._entries.pop(path, None)
+            return None
+
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self._entries.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        data = await read_json(path)
+        instance = self.model(**data)
+        self._entries[path] = (stamp, instance)
+        return instance
+
+    async def store(self, path: Path, instance: ModelT) -> None:
+        """Write a model to disk and cache it under the new file stamp."""
+        await write_json(path, instance.model_dump(mode='json'))
+        stat = await aiofiles.os.stat(path)
+        self._entries[path] = ((stat.st_mtime_ns, stat.st_size), instance)
+
+    def invalidate(self, path: Path) -> None:
+        """Drop the cached entry for a path."""
+        self._entries.pop(path, None)
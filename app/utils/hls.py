@@ -0,0 +1,72 @@
+"""Reading and writing HLS media playlists."""
+import re
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Tuple
+
+# UTC offset without a colon, as FFmpeg writes it (+0000)
+COMPACT_OFFSET = re.compile(r'([+-]\d{2})(\d{2})$')
+
+
+class PlaylistEntry(NamedTuple):
+    name: str
+    duration: float
+    program_date_time: Optional[float]  # UTC timestamp from EXT-X-PROGRAM-DATE-TIME
+    discontinuity: bool
+
+
+def parse_program_date_time(value: str) -> Optional[float]:
+    # datetime.fromisoformat only accepts +HH:MM before Python 3.11
+    value = COMPACT_OFFSET.sub(r'\1:\2', value.strip().replace('Z', '+00:00'))
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_program_date_time(timestamp: float) -> str:
+    """ISO 8601 UTC with milliseconds, as EXT-X-PROGRAM-DATE-TIME expects."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def parse_media_playlist(text: str) -> Tuple[int, List[PlaylistEntry]]:
+    """
+    Parse the segments of a media playlist.
+
+    Returns:
+        (media sequence number of the first segment, segments in order)
+    """
+    media_sequence = 0
+    entries = []
+    duration: Optional[float] = None
+    program_date_time: Optional[float] = None
+    discontinuity = False
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            try:
+                media_sequence = int(line.split(':', 1)[1])
+            except ValueError:
+                pass
+        elif line.startswith('#EXTINF:'):
+            try:
+                duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+            except ValueError:
+                duration = None
+        elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+            program_date_time = parse_program_date_time(line.split(':', 1)[1])
+        elif line == '#EXT-X-DISCONTINUITY':
+            discontinuity = True
+        elif not line.startswith('#'):
+            if duration is not None:
+                entries.append(PlaylistEntry(line, duration, program_date_time, discontinuity))
+            duration = None
+            program_date_time = None
+            discontinuity = False
+
+    return media_sequence, entries
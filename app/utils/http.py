@@ -0,0 +1,150 @@
+"""Conditional requests and content negotiation for generated artifacts."""
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterator, List, Optional
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from app.services.artifact_store import Artifact
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q-value}."""
+    codings = {}
+    if not header:
+        return codings
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def negotiate_encoding(header: Optional[str], available: List[str]) -> Optional[str]:
+    """
+    Pick the preferred available content encoding the client accepts.
+
+    Args:
+        header: Accept-Encoding request header
+        available: Encodings on offer, most preferred first
+
+    Returns:
+        The chosen encoding, or None for an uncompressed response
+    """
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best = None
+    best_q = 0.0
+    for encoding in available:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def representation_etag(artifact: Artifact, encoding: Optional[str]) -> str:
+    """Entity tag of one encoding of an artifact; each encoding gets its own."""
+    if not encoding:
+        return artifact.etag
+    return f'{artifact.etag[:-1]}-{encoding}"'
+
+
+def is_not_modified(request: Request, artifact: Artifact) -> bool:
+    """
+    Evaluate If-None-Match and If-Modified-Since against an artifact.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted when
+    the client sent no entity tags. A tag of any encoding of the current
+    content counts as a match.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Weak comparison: W/"x" matches "x"
+        tags = {tag[2:] if tag.startswith('W/') else tag for tag in tags}
+        if '*' in tags:
+            return True
+        current = [artifact.etag] + [representation_etag(artifact, e) for e in artifact.encodings]
+        return not tags.isdisjoint(current)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(artifact.last_modified) <= since
+
+    return False
+
+
+def artifact_headers(artifact: Artifact, encoding: Optional[str], vary: bool = True) -> Dict[str, str]:
+    """Validator and caching headers shared by full and 304 responses."""
+    headers = {
+        'ETag': representation_etag(artifact, encoding),
+        'Last-Modified': formatdate(artifact.last_modified, usegmt=True),
+        # Clients may keep a copy but must revalidate before using it
+        'Cache-Control': 'no-cache',
+    }
+    if vary:
+        headers['Vary'] = 'Accept-Encoding'
+    return headers
+
+
+def _gunzip_chunks(body: bytes) -> Iterator[bytes]:
+    """Decompress a gzip body incrementally."""
+    decompressor = zlib.decompressobj(31)
+    for offset in range(0, len(body), CHUNK_SIZE):
+        chunk = decompressor.decompress(body[offset:offset + CHUNK_SIZE])
+        if chunk:
+            yield chunk
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def artifact_response(request: Request, artifact: Artifact, media_type: str) -> Response:
+    """
+    Serve an artifact, honoring conditional headers and Accept-Encoding.
+
+    Artifacts without an in-memory uncompressed body are streamed to clients
+    that accept no compression by inflating the stored gzip copy, so the
+    body always matches the ETag.
+    """
+    encoding = negotiate_encoding(
+        request.headers.get('accept-encoding'), list(artifact.encodings)
+    )
+    headers = artifact_headers(artifact, encoding)
+    if is_not_modified(request, artifact):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        return Response(content=artifact.encodings[encoding], media_type=media_type, headers=headers)
+
+    if artifact.identity is not None:
+        return Response(content=artifact.identity, media_type=media_type, headers=headers)
+
+    headers['Content-Length'] = str(artifact.size)
+    return StreamingResponse(
+        _gunzip_chunks(artifact.encodings['gzip']), media_type=media_type, headers=headers
+    )
+
+
+def compressed_file_response(request: Request, artifact: Artifact, encoding: str, media_type: str) -> Response:
+    """Serve a compressed copy as a file of its own (e.g. xmltv.xml.gz)."""
+    headers = artifact_headers(artifact, encoding, vary=False)
+    if is_not_modified(request, artifact):
+        return Response(status_code=304, headers=headers)
+    return Response(content=artifact.encodings[encoding], media_type=media_type, headers=headers)
@@ -0,0 +1,100 @@
+"""Cursor pagination and field projection for list endpoints."""
+import base64
+import json
+from bisect import bisect_right
+from typing import Callable, List, Optional, Sequence, Set, Tuple, TypeVar
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+T = TypeVar('T')
+
+
+def encode_cursor(key: tuple) -> str:
+    """Encode a sort key as an opaque cursor token."""
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor token back into a sort key.
+
+    Raises:
+        HTTPException: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(key, list):
+            raise ValueError("cursor must encode a list")
+        return tuple(key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    records: Sequence[T],
+    sort_key: Callable[[T], tuple],
+    limit: Optional[int],
+    cursor: Optional[str]
+) -> Tuple[List[T], Optional[str]]:
+    """
+    Return one page of records that are already sorted by sort_key.
+
+    Args:
+        records: Records in ascending sort_key order
+        sort_key: Function returning the unique sort key of a record
+        limit: Maximum page size, or None for everything after the cursor
+        cursor: Token from a previous page, or None to start at the beginning
+
+    Returns:
+        Tuple of (page, next_cursor); next_cursor is None on the last page
+    """
+    start = 0
+    if cursor:
+        keys = [sort_key(record) for record in records]
+        try:
+            start = bisect_right(keys, decode_cursor(cursor))
+        except TypeError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if limit is None:
+        return list(records[start:]), None
+
+    page = list(records[start:start + limit])
+    next_cursor = None
+    if page and start + limit < len(records):
+        next_cursor = encode_cursor(sort_key(page[-1]))
+    return page, next_cursor
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """Parse a comma-separated field projection, e.g. "id,name"."""
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+def json_list_response(
+    models: Sequence[BaseModel],
+    include: Optional[Set[str]] = None,
+    next_cursor: Optional[str] = None
+) -> Response:
+    """
+    Serialize a page of models straight to JSON.
+
+    Models are dumped by pydantic-core without the response_model
+    re-validation pass. The cursor for the next page, if any, is returned in
+    the X-Next-Cursor header so the body stays a plain list.
+    """
+    if include is not None:
+        body = to_json([model.model_dump(mode='json', include=include) for model in models])
+    else:
+        body = to_json(list(models))
+
+    headers = {}
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
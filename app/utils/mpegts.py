@@ -0,0 +1,89 @@
+"""Minimal MPEG-TS packet inspection: PIDs, PAT/PMT tables and random access points."""
+from typing import Optional, Set
+
+PACKET_SIZE = 188
+SYNC_BYTE = 0x47
+PAT_PID = 0x0000
+# PMT stream types of video codecs: MPEG-1/2, MPEG-4 Part 2, H.264, HEVC
+VIDEO_STREAM_TYPES = {0x01, 0x02, 0x10, 0x1B, 0x24}
+
+
+def packet_pid(packet: bytes) -> int:
+    return ((packet[1] & 0x1F) << 8) | packet[2]
+
+
+def is_random_access(packet: bytes) -> bool:
+    """Whether the packet's adaptation field flags a random access point, i.e. a keyframe."""
+    has_adaptation = packet[3] & 0x20
+    return bool(has_adaptation and packet[4] > 0 and packet[5] & 0x40)
+
+
+def _section(packet: bytes) -> Optional[bytes]:
+    """The PSI section starting in a packet, or None if none starts here."""
+    # Tables start in packets with payload_unit_start_indicator set
+    if not packet[1] & 0x40:
+        return None
+    offset = 4
+    if packet[3] & 0x20:
+        offset += 1 + packet[4]
+    if offset >= PACKET_SIZE:
+        return None
+    # Skip the pointer field
+    offset += 1 + packet[offset]
+    if offset + 3 > PACKET_SIZE:
+        return None
+    section_length = ((packet[offset + 1] & 0x0F) << 8) | packet[offset + 2]
+    # Tables that continue into further packets are cut off; single-program tables fit in one
+    return packet[offset:offset + 3 + section_length]
+
+
+def parse_pat(packet: bytes) -> Optional[int]:
+    """PID of the first program's PMT from a PAT packet."""
+    section = _section(packet)
+    if not section or section[0] != 0x00:
+        return None
+    # Program loop after the 8-byte header, without the trailing CRC
+    for offset in range(8, len(section) - 4 - 3, 4):
+        program_number = (section[offset] << 8) | section[offset + 1]
+        if program_number != 0:
+            return ((section[offset + 2] & 0x1F) << 8) | section[offset + 3]
+    return None
+
+
+def parse_pmt_video_pids(packet: bytes) -> Optional[Set[int]]:
+    """PIDs of the video streams listed in a PMT packet; None if it isn't a PMT."""
+    section = _section(packet)
+    if not section or section[0] != 0x02 or len(section) < 12:
+        return None
+    program_info_length = ((section[10] & 0x0F) << 8) | section[11]
+    offset = 12 + program_info_length
+    video_pids = set()
+    # Stream loop up to the trailing CRC
+    while offset + 5 <= len(section) - 4:
+        stream_type = section[offset]
+        pid = ((section[offset + 1] & 0x1F) << 8) | section[offset + 2]
+        es_info_length = ((section[offset + 3] & 0x0F) << 8) | section[offset + 4]
+        if stream_type in VIDEO_STREAM_TYPES:
+            video_pids.add(pid)
+        offset += 5 + es_info_length
+    return video_pids
+
+
+class TsAligner:
+    """Cuts a byte stream into whole 188-byte packets, resynchronising on the sync byte."""
+
+    def __init__(self):
+        self._remainder = b''
+
+    def reset(self) -> None:
+        self._remainder = b''
+
+    def feed(self, data: bytes) -> bytes:
+        """Add bytes; returns the whole packets completed so far."""
+        data = self._remainder + data
+        if data and data[0] != SYNC_BYTE:
+            start = data.find(bytes([SYNC_BYTE]))
+            data = data[start:] if start >= 0 else b''
+        usable = len(data) - len(data) % PACKET_SIZE
+        self._remainder = data[usable:]
+        return data[:usable]
@@ -0,0 +1,119 @@
+"""Lightweight phase timing for request pipelines such as stream starts."""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.models.stream import PhaseHistogram, PhaseSpan, StreamStartTrace
+
+# Upper bounds of the histogram buckets in milliseconds; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PhaseTrace:
+    """
+    Spans of the phases of one operation, timed with the monotonic clock.
+
+    Spans are recorded relative to the creation of the trace, so they can be
+    rendered as a waterfall and as a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.outcome: Optional[str] = None
+        self._origin = time.perf_counter()
+        self._end: Optional[float] = None
+        # (name, start, end) in perf_counter seconds
+        self.spans: List[Tuple[str, float, float]] = []
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start, time.perf_counter()))
+
+    def add_span(self, name: str, start: float, end: float) -> None:
+        """Record a phase timed elsewhere, e.g. one that finished in the background."""
+        self.spans.append((name, start, end))
+
+    def finish(self, outcome: str) -> None:
+        self.outcome = outcome
+        self._end = time.perf_counter()
+
+    def total_ms(self) -> float:
+        end = self._end if self._end is not None else time.perf_counter()
+        return (end - self._origin) * 1000
+
+    def durations(self) -> Dict[str, float]:
+        """Milliseconds per phase name."""
+        return {name: (end - start) * 1000 for name, start, end in self.spans}
+
+    def server_timing(self) -> str:
+        """Render the spans and total as a Server-Timing header value."""
+        metrics = [f"{name};dur={(end - start) * 1000:.1f}" for name, start, end in self.spans]
+        total = f"total;dur={self.total_ms():.1f}"
+        if self.outcome:
+            total += f';desc="{self.outcome}"'
+        metrics.append(total)
+        return ", ".join(metrics)
+
+    def to_model(self) -> StreamStartTrace:
+        return StreamStartTrace(
+            started_at=self.started_at,
+            outcome=self.outcome,
+            total_ms=round(self.total_ms(), 3),
+            phases=[
+                PhaseSpan(
+                    name=name,
+                    offset_ms=round((start - self._origin) * 1000, 3),
+                    duration_ms=round((end - start) * 1000, 3)
+                )
+                for name, start, end in self.spans
+            ]
+        )
+
+
+class Histogram:
+    """Counts of durations per fixed bucket, cheap enough to update on every request."""
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, duration_ms: float) -> None:
+        self.counts[bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+
+    def to_model(self) -> PhaseHistogram:
+        return PhaseHistogram(
+            buckets_ms=list(HISTOGRAM_BUCKETS_MS),
+            counts=list(self.counts),
+            count=self.count,
+            sum_ms=round(self.sum_ms, 3)
+        )
+
+
+class PhaseHistograms:
+    """One histogram per phase name, plus the total."""
+
+    def __init__(self):
+        self.phases: Dict[str, Histogram] = {}
+
+    def observe(self, name: str, duration_ms: float) -> None:
+        histogram = self.phases.get(name)
+        if histogram is None:
+            histogram = self.phases[name] = Histogram()
+        histogram.observe(duration_ms)
+
+    def observe_trace(self, trace: PhaseTrace) -> None:
+        for name, duration_ms in trace.durations().items():
+            self.observe(name, duration_ms)
+        self.observe("total", trace.total_ms())
+
+    def to_model(self) -> Dict[str, PhaseHistogram]:
+        return {name: histogram.to_model() for name, histogram in self.phases.items()}
@@ -0,0 +1,286 @@
+"""
+Benchmark the scheduler and guide generators against synthetic catalogs.
+
+Each scenario (channel count x playlist length x EPG days) runs in a fresh
+interpreter with its own temporary data directories, so caches and memory
+start cold. Every operation is timed over several calls and then run once
+more under tracemalloc for its peak memory.
+
+Usage:
+    python scripts/benchmark.py --preset quick
+    python scripts/benchmark.py --channels 10 1000 --items 100 --days 1 7 -o results.json
+    python scripts/benchmark.py --preset quick --compare results.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+PRESETS = {
+    "quick": {"channels": [10, 100], "items": [10, 1000], "days": [1]},
+    "standard": {"channels": [10, 1000], "items": [100, 10000], "days": [1, 7]},
+    "full": {"channels": [10, 1000, 10000], "items": [10, 1000, 100000], "days": [1, 14]},
+}
+
+# Distinct playlists shared by the channels of a scenario
+MAX_PLAYLISTS = 20
+# Share of channels with a dayparting rule
+SCHEDULED_SHARE = 0.1
+# Channels sampled for the per-channel operations
+SAMPLE_CHANNELS = 100
+
+
+def generate_catalog(data_dir: Path, channels: int, items: int, seed: int = 1) -> None:
+    """Write a synthetic catalog of channels and playlists as JSON files."""
+    rng = random.Random(seed)
+    channels_dir = data_dir / "channels"
+    playlists_dir = data_dir / "playlists"
+    channels_dir.mkdir(parents=True, exist_ok=True)
+    playlists_dir.mkdir(parents=True, exist_ok=True)
+
+    playlist_count = min(channels, MAX_PLAYLISTS)
+    now = datetime.now(timezone.utc).isoformat()
+    for p in range(playlist_count):
+        playlist = {
+            "id": f"bench-playlist-{p}",
+            "name": f"Playlist {p}",
+            "items": [
+                {
+                    "file_path": f"/media/show{p}/episode{i}.mp4",
+                    "duration": rng.randint(60, 3600),
+                    "title": f"Show {p} Episode {i}",
+                    "description": f"Synthetic episode {i} of show {p}",
+                }
+                for i in range(items)
+            ],
+            "created_at": now,
+            "updated_at": now,
+        }
+        (playlists_dir / f"{playlist['id']}.json").write_text(json.dumps(playlist))
+
+    for c in range(channels):
+        channel = {
+            "id": f"bench-channel-{c}",
+            "name": f"Channel {c}",
+            "number": c + 1,
+            "category": rng.choice(["Movies", "Series", "Sports", "News"]),
+            "playlist_id": f"bench-playlist-{c % playlist_count}",
+            "start_time": datetime.fromtimestamp(
+                rng.randint(1_600_000_000, 1_700_000_000), tz=timezone.utc
+            ).isoformat(),
+        }
+        if playlist_count > 1 and rng.random() < SCHEDULED_SHARE:
+            channel["scheduled_playlists"] = [{
+                "playlist_id": f"bench-playlist-{(c + 1) % playlist_count}",
+                "start_time": "19:00",
+                "end_time": "23:00",
+            }]
+        (channels_dir / f"{channel['id']}.json").write_text(json.dumps(channel))
+
+
+async def measure(name: str, operation, repeat: int) -> dict:
+    """Time an async operation and record its peak traced memory."""
+    start = time.perf_counter()
+    await operation()
+    cold = time.perf_counter() - start
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await operation()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    await operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "operation": name,
+        "cold_s": round(cold, 6),
+        "median_s": round(statistics.median(timings), 6),
+        "min_s": round(min(timings), 6),
+        "peak_bytes": peak,
+    }
+
+
+async def run_scenario(repeat: int) -> list:
+    """Run every operation against the catalog in the configured data directories."""
+    from app.config import settings
+    from app.services.channel_manager import channel_manager
+    from app.services.m3u_generator import m3u_generator
+    from app.services.playlist_scheduler import playlist_scheduler
+    from app.services.xmltv_generator import xmltv_generator
+
+    channels = await channel_manager.list_channels()
+    sample = channels[:SAMPLE_CHANNELS]
+    hours = settings.epg_days_ahead * 24
+
+    async def current_media():
+        for channel in sample:
+            await playlist_scheduler.get_current_media(channel)
+
+    async def upcoming_programs():
+        for channel in sample:
+            await playlist_scheduler.get_upcoming_programs(channel, hours)
+
+    async def m3u():
+        m3u_generator.generate_m3u(channels, settings.base_url)
+
+    async def xmltv():
+        # Render every channel, as after an edit or when the window rolls
+        xmltv_generator.clear_fragments()
+        await xmltv_generator.generate_xmltv(channels)
+
+    async def xmltv_cached():
+        # Reassemble the guide from fragments cached by the previous call
+        await xmltv_generator.generate_xmltv(channels)
+
+    results = [
+        await measure("list_channels", channel_manager.list_channels, repeat),
+        await measure("get_current_media", current_media, repeat),
+        await measure("get_upcoming_programs", upcoming_programs, repeat),
+        await measure("generate_m3u", m3u, repeat),
+        await measure("generate_xmltv", xmltv, repeat),
+        await measure("generate_xmltv_cached", xmltv_cached, repeat),
+    ]
+    for result in results:
+        if result["operation"] in ("get_current_media", "get_upcoming_programs"):
+            result["calls"] = len(sample)
+    return results
+
+
+def run_worker(args) -> None:
+    """Entry point of the per-scenario child process; prints JSON results."""
+    from app.config import VERSION
+
+    results = asyncio.run(run_scenario(args.repeat))
+    print(json.dumps({"version": VERSION, "results": results}))
+
+
+def spawn_scenario(channels: int, items: int, days: int, repeat: int) -> dict:
+    """Generate a catalog and benchmark it in a fresh interpreter."""
+    with tempfile.TemporaryDirectory(prefix="trouttv-bench-") as tmp:
+        data_dir = Path(tmp)
+        generate_catalog(data_dir, channels, items)
+
+        env = dict(os.environ)
+        env.update({
+            "CHANNELS_DIR": str(data_dir / "channels"),
+            "PLAYLISTS_DIR": str(data_dir / "playlists"),
+            "MEDIA_DIR": str(data_dir / "media"),
+            "LOGOS_DIR": str(data_dir / "logos"),
+            "STREAMS_DIR": str(data_dir / "streams"),
+            "EPG_DAYS_AHEAD": str(days),
+        })
+        process = subprocess.run(
+            [sys.executable, __file__, "--worker", "--repeat", str(repeat)],
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        if process.returncode != 0:
+            raise RuntimeError(process.stderr.strip())
+
+        # The app may print diagnostics; the results are the last line
+        output = json.loads(process.stdout.strip().splitlines()[-1])
+
+    for result in output["results"]:
+        result.update({"channels": channels, "items": items, "days": days})
+    return output
+
+
+def result_key(result: dict) -> tuple:
+    return (result["operation"], result["channels"], result["items"], result["days"])
+
+
+def print_table(results: list, baseline: dict) -> None:
+    header = f"{'operation':<24}{'channels':>9}{'items':>8}{'days':>5}{'cold ms':>11}{'median ms':>11}{'peak MiB':>10}"
+    if baseline:
+        header += f"{'vs base':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        line = (
+            f"{result['operation']:<24}{result['channels']:>9}{result['items']:>8}{result['days']:>5}"
+            f"{result['cold_s'] * 1000:>11.1f}{result['median_s'] * 1000:>11.1f}"
+            f"{result['peak_bytes'] / 2**20:>10.1f}"
+        )
+        previous = baseline.get(result_key(result))
+        if previous and previous["median_s"] > 0:
+            line += f"{result['median_s'] / previous['median_s']:>8.2f}x"
+        print(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the TroutTV scheduler and guide generators")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--channels", type=int, nargs="+", help="Channel counts (overrides the preset)")
+    parser.add_argument("--items", type=int, nargs="+", help="Items per playlist (overrides the preset)")
+    parser.add_argument("--days", type=int, nargs="+", help="Days of EPG (overrides the preset)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls per operation")
+    parser.add_argument("-o", "--output", type=Path, help="Write JSON results to this file")
+    parser.add_argument("--compare", type=Path, help="Earlier JSON results to compare against")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    preset = PRESETS[args.preset]
+    matrix = itertools.product(
+        args.channels or preset["channels"],
+        args.items or preset["items"],
+        args.days or preset["days"],
+    )
+
+    baseline = {}
+    if args.compare:
+        previous = json.loads(args.compare.read_text())
+        baseline = {result_key(result): result for result in previous["results"]}
+
+    version = None
+    results = []
+    for channels, items, days in matrix:
+        print(f"Running {channels} channels x {items} items x {days} days...", file=sys.stderr)
+        try:
+            output = spawn_scenario(channels, items, days, args.repeat)
+            version = output["version"]
+            results.extend(output["results"])
+        except RuntimeError as e:
+            print(f"  failed: {e}", file=sys.stderr)
+
+    report = {
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    print_table(results, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
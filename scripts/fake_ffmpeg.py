@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Stand-in for ffmpeg that produces synthetic HLS output without decoding anything.
+
+Point the server at it to load-test the serving path without media files
+or transcoding:
+
+    FFMPEG_PATH=scripts/fake_ffmpeg.py python run.py
+
+For the HLS commands built by FFmpegBuilder it writes one MPEG-TS segment
+of null packets every -hls_time seconds of wall-clock time, sized from
+-maxrate and -b:a. The playlist is rewritten atomically after each
+segment and keeps -hls_list_size entries, and older segments are deleted,
+the way ffmpeg's delete_segments flag does. Segments are numbered from
+-start_number, program_date_time adds wall-clock times, and append_list
+continues an existing playlist after a discontinuity. With -progress pipe:1 it prints progress blocks at the simulated speed.
+
+For MPEG-TS commands writing to pipe:1 it streams a PAT and PMT every
+second and video packets with a random access point at each forced
+keyframe, padded to the bitrate with null packets. It also answers
+-version and -encoders, and writes placeholder images for thumbnail
+commands.
+
+Environment:
+    FAKE_FFMPEG_STARTUP - Seconds before encoding "starts" (default: 0.3)
+    FAKE_FFMPEG_SPEED - Output speed relative to realtime (default: 1.0); below
+        1.0 simulates an encode that can't keep up
+    FAKE_FFMPEG_DURATION - Seconds of media after which HLS output ends with
+        exit code 0, like the end of the input file (default: endless)
+"""
+
+import os
+import signal
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+TS_PACKET_SIZE = 188
+# A null packet (PID 0x1FFF): valid MPEG-TS that players skip
+NULL_PACKET = bytes([0x47, 0x1F, 0xFF, 0x10]) + b"\xff" * (TS_PACKET_SIZE - 4)
+# Seconds between -progress blocks
+PROGRESS_PERIOD = 0.5
+
+
+# PIDs of the synthetic MPEG-TS program
+PMT_PID = 0x1000
+VIDEO_PID = 0x0100
+# Seconds of output per MPEG-TS write
+TS_TICK = 0.1
+
+
+def option(args: list, name: str, default=None):
+    """Value following `name` in the argument list."""
+    try:
+        return args[args.index(name) + 1]
+    except (ValueError, IndexError):
+        return default
+
+
+def kbps(value) -> int:
+    return int(str(value).rstrip("kK")) if value else 0
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    temp_path = path.with_name(path.name + ".tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def write_progress(elapsed: float, speed: float) -> None:
+    """Print a -progress block as ffmpeg does on pipe:1."""
+    fps = 25
+    media_seconds = elapsed * speed
+    print(
+        f"frame={int(media_seconds * fps)}\nfps={fps * speed:.2f}\nbitrate=N/A\n"
+        f"out_time_us={int(media_seconds * 1e6)}\ndup_frames=0\ndrop_frames=0\n"
+        f"speed={speed:.3g}x\nprogress=continue",
+        flush=True
+    )
+
+
+def crc32_mpeg(data: bytes) -> int:
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def psi_packet(pid: int, section: bytes) -> bytes:
+    """A packet carrying one table section, with CRC and stuffing."""
+    section += crc32_mpeg(section).to_bytes(4, "big")
+    payload = b"\x00" + section
+    header = bytes([0x47, 0x40 | (pid >> 8), pid & 0xFF, 0x10])
+    return header + payload + b"\xff" * (TS_PACKET_SIZE - 4 - len(payload))
+
+
+def program_tables() -> bytes:
+    # PAT: program 1 -> PMT_PID
+    pat = bytes([0x00, 0xB0, 13, 0x00, 0x01, 0xC1, 0x00, 0x00, 0x00, 0x01, 0xE0 | (PMT_PID >> 8), PMT_PID & 0xFF])
+    # PMT: PCR on the video PID, one H.264 stream
+    pmt = bytes([
+        0x02, 0xB0, 18, 0x00, 0x01, 0xC1, 0x00, 0x00,
+        0xE0 | (VIDEO_PID >> 8), VIDEO_PID & 0xFF, 0xF0, 0x00,
+        0x1B, 0xE0 | (VIDEO_PID >> 8), VIDEO_PID & 0xFF, 0xF0, 0x00,
+    ])
+    return psi_packet(0, pat) + psi_packet(PMT_PID, pmt)
+
+
+def video_packet(keyframe: bool) -> bytes:
+    if keyframe:
+        # Adaptation field with random_access_indicator, then stuffing instead of payload
+        return (bytes([0x47, 0x40 | (VIDEO_PID >> 8), VIDEO_PID & 0xFF, 0x30, 1, 0x40])
+                + b"\xff" * (TS_PACKET_SIZE - 6))
+    return bytes([0x47, VIDEO_PID >> 8, VIDEO_PID & 0xFF, 0x10]) + b"\x00" * (TS_PACKET_SIZE - 4)
+
+
+def run_ts(args: list) -> int:
+    bitrate_kbps = kbps(option(args, "-maxrate", "3000k")) + kbps(option(args, "-b:a", "128k"))
+    speed = float(os.environ.get("FAKE_FFMPEG_SPEED", "1.0"))
+    keyframes = option(args, "-force_key_frames", "expr:gte(t,n_forced*2)")
+    keyframe_interval = float(keyframes.rsplit("*", 1)[-1].rstrip(")"))
+    packets_per_tick = max(3, int(bitrate_kbps * 1000 / 8 * TS_TICK) // TS_PACKET_SIZE)
+    out = sys.stdout.buffer
+
+    time.sleep(float(os.environ.get("FAKE_FFMPEG_STARTUP", "0.3")))
+    started = time.monotonic()
+    tick = 0
+    try:
+        while True:
+            media_time = tick * TS_TICK
+            chunk = b""
+            if tick % int(1 / TS_TICK) == 0:
+                chunk += program_tables()
+            keyframe = tick % max(1, round(keyframe_interval / TS_TICK)) == 0
+            chunk += video_packet(keyframe) + video_packet(False)
+            chunk += NULL_PACKET * (packets_per_tick - len(chunk) // TS_PACKET_SIZE)
+            out.write(chunk)
+            out.flush()
+            tick += 1
+            delay = started + media_time / speed + TS_TICK / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    except BrokenPipeError:
+        return 0
+
+
+def render_playlist(segments: list, target_duration: int, first_sequence: int) -> bytes:
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        f"#EXT-X-MEDIA-SEQUENCE:{first_sequence}",
+    ]
+    for name, duration, tags in segments:
+        lines.extend(tags)
+        lines.append(f"#EXTINF:{duration:.6f},")
+        lines.append(name)
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def read_playlist(playlist_path: Path) -> tuple:
+    """(media sequence, segments) of an existing playlist, for the append_list flag."""
+    try:
+        text = playlist_path.read_text()
+    except OSError:
+        return 0, []
+    media_sequence, segments, tags, duration = 0, [], [], 0.0
+    for line in text.splitlines():
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            media_sequence = int(line.split(":", 1)[1])
+        elif line.startswith(("#EXT-X-PROGRAM-DATE-TIME:", "#EXT-X-DISCONTINUITY")):
+            tags.append(line)
+        elif line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line and not line.startswith("#"):
+            segments.append((line, duration, tags))
+            tags = []
+    return media_sequence, segments
+
+
+def run_hls(args: list) -> int:
+    playlist_path = Path(args[-1])
+    segment_pattern = option(args, "-hls_segment_filename", str(playlist_path.parent / "segment_%d.ts"))
+    segment_duration = float(option(args, "-hls_time", 6))
+    list_size = int(option(args, "-hls_list_size", 5))
+    start_number = int(option(args, "-start_number", 0))
+    flags = set(option(args, "-hls_flags", "").split("+"))
+    bitrate_kbps = kbps(option(args, "-maxrate", "3000k")) + kbps(option(args, "-b:a", "128k"))
+    speed = float(os.environ.get("FAKE_FFMPEG_SPEED", "1.0"))
+
+    packets = max(1, int(bitrate_kbps * 1000 / 8 * segment_duration) // TS_PACKET_SIZE)
+    segment_bytes = NULL_PACKET * packets
+
+    playlist_path.parent.mkdir(parents=True, exist_ok=True)
+    time.sleep(float(os.environ.get("FAKE_FFMPEG_STARTUP", "0.3")))
+
+    progress = option(args, "-progress") == "pipe:1"
+    media_duration = float(os.environ.get("FAKE_FFMPEG_DURATION", "inf"))
+    started = time.monotonic()
+    first_sequence, segments = start_number, []
+    if "append_list" in flags:
+        first_sequence, segments = read_playlist(playlist_path)
+        if not segments:
+            first_sequence = start_number
+    # Like ffmpeg, the first new segment after appended ones is a discontinuity
+    discontinuity = bool(segments)
+    sequence = 0
+    while sequence * segment_duration < media_duration:
+        # Like -re: a segment is complete once its duration of wall-clock time has passed
+        due = started + (sequence + 1) * segment_duration / speed
+        while True:
+            delay = due - time.monotonic()
+            if progress:
+                write_progress(time.monotonic() - started, speed)
+            if delay <= 0:
+                break
+            time.sleep(min(delay, PROGRESS_PERIOD))
+
+        segment_path = Path(segment_pattern % (start_number + sequence))
+        write_atomic(segment_path, segment_bytes)
+        tags = ["#EXT-X-DISCONTINUITY"] if discontinuity else []
+        discontinuity = False
+        if "program_date_time" in flags:
+            pdt = datetime.fromtimestamp(time.time() - segment_duration, timezone.utc)
+            tags.append(f"#EXT-X-PROGRAM-DATE-TIME:{pdt.isoformat(timespec='milliseconds').replace('+00:00', 'Z')}")
+        segments.append((segment_path.name, segment_duration, tags))
+
+        while len(segments) > list_size:
+            expired, _, _ = segments.pop(0)
+            first_sequence += 1
+            try:
+                (segment_path.parent / expired).unlink()
+            except OSError:
+                pass
+
+        write_atomic(playlist_path, render_playlist(segments, int(segment_duration + 0.999), first_sequence))
+        sequence += 1
+    return 0
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    # Exit quietly when the server stops the stream
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    if "-version" in args:
+        print("ffmpeg version 0.0-fake Copyright (c) TroutTV load testing")
+        return 0
+
+    if "-encoders" in args:
+        print("Encoders:")
+        print(" V..... = Video")
+        print(" ------")
+        print(" V....D libx264              fake H.264")
+        print(" A....D aac                  fake AAC")
+        return 0
+
+    if option(args, "-f") == "hls":
+        try:
+            return run_hls(args)
+        except KeyboardInterrupt:
+            return 0
+
+    if option(args, "-f") == "mpegts":
+        try:
+            return run_ts(args)
+        except KeyboardInterrupt:
+            return 0
+
+    if option(args, "-f") == "image2":
+        # Thumbnail commands: a placeholder file is enough for the pipeline
+        Path(args[-1]).write_bytes(b"\xff\xd8\xff\xd9")
+        return 0
+
+    print(f"fake_ffmpeg: unsupported command: {' '.join(args)}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
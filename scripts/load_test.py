@@ -0,0 +1,340 @@
+"""
+Load-test HLS serving with simulated viewers.
+
+N viewers are spread over M channels. Each behaves like an HLS player:
+fetch master.m3u8, reload stream.m3u8 every target duration (half of it
+when nothing changed) and download every new segment, starting three
+segments from the live edge. The report covers time to first segment,
+playlist staleness, request latency percentiles and error rates.
+
+Against a running server:
+    python scripts/load_test.py --url http://localhost:8000 --viewers 50 --channels 5
+
+Self-contained, e.g. on CI: start a server on a synthetic catalog with
+scripts/fake_ffmpeg.py standing in for ffmpeg:
+    python scripts/load_test.py --self-hosted --viewers 200 --channels 20 --duration 60
+
+Requires httpx (pip install httpx).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urljoin, urlsplit
+
+ROOT = Path(__file__).parent.parent
+FAKE_FFMPEG = Path(__file__).parent / "fake_ffmpeg.py"
+
+# Segments behind the live edge a player starts at
+LIVE_EDGE_SEGMENTS = 3
+# Seconds a viewer waits for its first playlist before counting a failed tune
+TUNE_TIMEOUT = 30
+
+
+class Stats:
+    """Samples and counters shared by all viewers."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bytes = 0
+
+    def request(self, kind: str, seconds: float, ok: bool) -> None:
+        self.requests[kind] += 1
+        if ok:
+            self.samples[f"{kind}_latency_s"].append(seconds)
+        else:
+            self.errors[kind] += 1
+
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "p50": round(pick(0.50), 4),
+        "p90": round(pick(0.90), 4),
+        "p99": round(pick(0.99), 4),
+        "max": round(ordered[-1], 4),
+        "mean": round(statistics.fmean(ordered), 4),
+    }
+
+
+def parse_playlist(text: str) -> tuple:
+    """Return (target duration, media sequence, segment URIs) of a media playlist."""
+    target = 6.0
+    sequence = 0
+    segments = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            target = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line and not line.startswith("#"):
+            segments.append(line)
+    return target, sequence, segments
+
+
+async def timed_get(client, stats: Stats, kind: str, url: str, allow_missing: bool = False):
+    """
+    GET a URL and record its latency; returns the response or None on a transport error.
+
+    With allow_missing, a 404 is counted as "<kind>_not_ready" instead of an error.
+    """
+    start = time.perf_counter()
+    try:
+        response = await client.get(url)
+    except Exception:
+        stats.request(kind, time.perf_counter() - start, False)
+        return None
+    if allow_missing and response.status_code == 404:
+        stats.requests[f"{kind}_not_ready"] += 1
+        return response
+    stats.bytes += len(response.content)
+    stats.request(kind, time.perf_counter() - start, response.status_code == 200)
+    return response
+
+
+async def viewer(client, base_url: str, channel_id: str, deadline: float, stats: Stats) -> None:
+    """Simulate one player watching a channel until the deadline."""
+    tune_start = time.perf_counter()
+    master = await timed_get(client, stats, "master", f"{base_url}/stream/{channel_id}/master.m3u8")
+    if master is None or master.status_code != 200:
+        stats.errors["tune"] += 1
+        return
+
+    # The variant URL is absolute with the server's BASE_URL; keep its path on our host
+    variant = next(line for line in master.text.splitlines() if line and not line.startswith("#"))
+    playlist_url = urljoin(f"{base_url}/", urlsplit(variant).path)
+
+    fetched = set()
+    first_segment = False
+    last_change = None
+    last_newest = None
+
+    while time.perf_counter() < deadline:
+        # The playlist appears once FFmpeg finished its first segment
+        response = await timed_get(client, stats, "playlist", playlist_url, allow_missing=not fetched)
+        if response is None or response.status_code != 200:
+            if not fetched and time.perf_counter() - tune_start > TUNE_TIMEOUT:
+                stats.errors["tune"] += 1
+                return
+            await asyncio.sleep(0.5)
+            continue
+
+        target, sequence, segments = parse_playlist(response.text)
+        now = time.perf_counter()
+        numbered = list(enumerate(segments, start=sequence))
+        if not numbered:
+            await asyncio.sleep(target / 2)
+            continue
+
+        newest = numbered[-1][0]
+        if newest != last_newest:
+            last_newest, last_change = newest, now
+        else:
+            # How long the newest segment has been the newest, seen from this player
+            stats.samples["playlist_staleness_s"].append(now - last_change)
+
+        if not fetched:
+            numbered = numbered[-LIVE_EDGE_SEGMENTS:]
+        for number, uri in numbered:
+            if number in fetched:
+                continue
+            fetched.add(number)
+            segment = await timed_get(client, stats, "segment", urljoin(playlist_url, uri))
+            if segment is not None and segment.status_code == 200 and not first_segment:
+                first_segment = True
+                stats.samples["time_to_first_segment_s"].append(time.perf_counter() - tune_start)
+
+        # Players reload after a target duration, or half of it when nothing changed
+        changed = last_change == now
+        await asyncio.sleep(target if changed else target / 2)
+
+
+async def list_channels(client, base_url: str, count: int) -> List[str]:
+    response = await client.get(f"{base_url}/api/channels")
+    response.raise_for_status()
+    channels = [c for c in response.json() if c.get("enabled", True)]
+    channels.sort(key=lambda c: (c.get("number", 0), c["id"]))
+    return [c["id"] for c in channels[:count]]
+
+
+async def run_load(args, base_url: str) -> dict:
+    import httpx
+
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.viewers + 10, max_keepalive_connections=args.viewers + 10)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        channels = args.channel_ids or await list_channels(client, base_url, args.channels)
+        if not channels:
+            raise SystemExit("No enabled channels to test")
+
+        deadline = time.perf_counter() + args.ramp + args.duration
+        rng = random.Random(1)
+
+        async def delayed_viewer(index: int):
+            await asyncio.sleep(rng.uniform(0, args.ramp) if args.ramp else 0)
+            await viewer(client, base_url, channels[index % len(channels)], deadline, stats)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(delayed_viewer(i) for i in range(args.viewers)))
+        elapsed = time.perf_counter() - started
+
+    total_requests = sum(stats.requests.values())
+    total_errors = sum(stats.errors.get(kind, 0) for kind in stats.requests)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "url": base_url,
+        "viewers": args.viewers,
+        "channels": len(channels),
+        "duration_s": round(elapsed, 3),
+        "requests": dict(stats.requests),
+        "errors": dict(stats.errors),
+        "error_rate": round(total_errors / total_requests, 6) if total_requests else 0.0,
+        "throughput_mbps": round(stats.bytes * 8 / elapsed / 1e6, 3),
+        "metrics": {name: percentiles(values) for name, values in sorted(stats.samples.items())},
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['viewers']} viewers on {report['channels']} channels for {report['duration_s']:.0f}s")
+    print(f"requests: {report['requests']}  errors: {report['errors']}  error rate: {report['error_rate']:.2%}")
+    print(f"throughput: {report['throughput_mbps']:.1f} Mbit/s\n")
+    print(f"{'metric':<28}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for name, p in report["metrics"].items():
+        if p:
+            print(f"{name:<28}{p['count']:>7}{p['p50']:>9.3f}{p['p90']:>9.3f}{p['p99']:>9.3f}{p['max']:>9.3f}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_catalog(data_dir: Path, channels: int) -> None:
+    """A catalog of channels sharing one playlist of empty placeholder files."""
+    media_dir = data_dir / "media"
+    for name in ("channels", "playlists", "media"):
+        (data_dir / name).mkdir(parents=True, exist_ok=True)
+
+    items = []
+    for i in range(10):
+        (media_dir / f"clip{i}.mp4").touch()
+        items.append({"file_path": f"clip{i}.mp4", "duration": 1800, "title": f"Clip {i}"})
+    now = datetime.now(timezone.utc).isoformat()
+    playlist = {"id": "load-playlist", "name": "Load test", "items": items, "created_at": now, "updated_at": now}
+    (data_dir / "playlists" / "load-playlist.json").write_text(json.dumps(playlist))
+
+    for c in range(channels):
+        channel = {
+            "id": f"load-{c}",
+            "name": f"Load {c}",
+            "number": c + 1,
+            "playlist_id": "load-playlist",
+            "start_time": "2024-01-01T00:00:00+00:00",
+            "stream_settings": {"segment_duration": 2, "playlist_size": 5},
+        }
+        (data_dir / "channels" / f"{channel['id']}.json").write_text(json.dumps(channel))
+
+
+def start_server(data_dir: Path, port: int) -> subprocess.Popen:
+    """Run the app with uvicorn and the fake ffmpeg; returns once it is healthy."""
+    import httpx
+
+    env = dict(os.environ)
+    env.update({
+        "CHANNELS_DIR": str(data_dir / "channels"),
+        "PLAYLISTS_DIR": str(data_dir / "playlists"),
+        "MEDIA_DIR": str(data_dir / "media"),
+        "LOGOS_DIR": str(data_dir / "logos"),
+        "STREAMS_DIR": str(data_dir / "streams"),
+        "THUMBNAILS_DIR": str(data_dir / "thumbnails"),
+        "PROBE_CACHE_PATH": str(data_dir / "probe_cache.sqlite"),
+        "FFMPEG_CAPABILITIES_PATH": str(data_dir / "ffmpeg_capabilities.json"),
+        "FFMPEG_PATH": str(FAKE_FFMPEG),
+        "BASE_URL": f"http://127.0.0.1:{port}",
+        "MEDIA_INDEX_ENABLED": "false",
+        "THUMBNAILS_ENABLED": "false",
+    })
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        if server.poll() is not None:
+            break
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("Server did not become healthy")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test TroutTV HLS serving with simulated viewers")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server to test")
+    parser.add_argument("--viewers", type=int, default=20, help="Concurrent viewers")
+    parser.add_argument("--channels", type=int, default=4, help="Channels to spread the viewers over")
+    parser.add_argument("--channel-ids", nargs="+", help="Explicit channel IDs (overrides --channels)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of watching after the ramp")
+    parser.add_argument("--ramp", type=float, default=5, help="Seconds over which viewers join")
+    parser.add_argument("--timeout", type=float, default=10, help="Request timeout in seconds")
+    parser.add_argument("--self-hosted", action="store_true",
+                        help="Start a server with a synthetic catalog and scripts/fake_ffmpeg.py")
+    parser.add_argument("-o", "--output", type=Path, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        print("The load test requires httpx: pip install httpx", file=sys.stderr)
+        return 1
+
+    if not args.self_hosted:
+        report = asyncio.run(run_load(args, args.url.rstrip("/")))
+    else:
+        with tempfile.TemporaryDirectory(prefix="trouttv-load-") as tmp:
+            write_catalog(Path(tmp), args.channels)
+            port = free_port()
+            server = start_server(Path(tmp), port)
+            try:
+                report = asyncio.run(run_load(args, f"http://127.0.0.1:{port}"))
+            finally:
+                server.terminate()
+                server.wait(timeout=15)
+
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.output}")
+    return 0 if report["error_rate"] < 0.01 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Profile server startup: module import costs and lifespan time.
+
+Startup is measured in a fresh interpreter with temporary data
+directories, run with -X importtime. The report lists the slowest imports
+(cumulative, including everything they import) and the time from process
+start until the app is imported and until its lifespan startup finished.
+
+Usage:
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --top 40 --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def run_worker() -> None:
+    """Entry point of the child process; prints JSON timings."""
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    async def lifespan():
+        async with app.router.lifespan_context(app):
+            return time.perf_counter()
+
+    ready = asyncio.run(lifespan())
+    print(json.dumps({
+        "import_s": round(imported - started, 6),
+        "lifespan_s": round(ready - imported, 6),
+    }))
+
+
+def parse_importtime(stderr: str) -> list:
+    """Parse -X importtime output into (cumulative us, self us, module) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+    return rows
+
+
+def spawn(data_dir: Path) -> tuple:
+    """Start the app once in a fresh interpreter; returns (timings, import rows)."""
+    env = dict(os.environ)
+    env.update({
+        "CHANNELS_DIR": str(data_dir / "channels"),
+        "PLAYLISTS_DIR": str(data_dir / "playlists"),
+        "MEDIA_DIR": str(data_dir / "media"),
+        "LOGOS_DIR": str(data_dir / "logos"),
+        "STREAMS_DIR": str(data_dir / "streams"),
+        "THUMBNAILS_DIR": str(data_dir / "thumbnails"),
+        "PROBE_CACHE_PATH": str(data_dir / "probe_cache.sqlite"),
+        "FFMPEG_CAPABILITIES_PATH": str(data_dir / "ffmpeg_capabilities.json"),
+        # Background crawling is not part of startup
+        "MEDIA_INDEX_ENABLED": "false",
+    })
+    process_start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", __file__, "--worker"],
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    total = time.perf_counter() - process_start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip())
+
+    # The app prints startup messages; the timings are the last line
+    timings = json.loads(process.stdout.strip().splitlines()[-1])
+    timings["process_s"] = round(total, 6)
+    return timings, parse_importtime(process.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Profile TroutTV server startup")
+    parser.add_argument("--runs", type=int, default=3, help="Startups to measure")
+    parser.add_argument("--top", type=int, default=25, help="Slowest imports to list")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker()
+        return 0
+
+    runs = []
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="trouttv-startup-") as tmp:
+        for _ in range(args.runs):
+            timings, rows = spawn(Path(tmp))
+            runs.append(timings)
+
+    # Imports of the last run; earlier runs warmed the bytecode cache
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative_us, self_us, module in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {module}")
+
+    print()
+    for key, label in (("import_s", "import app.main"), ("lifespan_s", "lifespan startup"), ("process_s", "whole process")):
+        values = [run[key] for run in runs]
+        print(f"{label:<18} median {statistics.median(values) * 1000:>8.1f} ms   min {min(values) * 1000:>8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,8 @@ let currentChannelId = null;
 let playlistItemCounter = 0;
 let currentMediaPath = '';
 let currentPlaylistInput = null;
+// Aborts the media listing still streaming in when another folder is opened
+let mediaListingController = null;
 let currentChannelLogo = null;
 let pendingLogoFile = null;
 
@@ -72,8 +74,8 @@ async function loadChannels() {
     try {
         // Load both channels and playlists
         const [channelsResponse, playlistsResponse] = await Promise.all([
-            fetch(`${API_BASE}/api/channels`),
-            fetch(`${API_BASE}/api/playlists`)
+            fetch(`${API_BASE}/api/channels?view=summary`),
+            fetch(`${API_BASE}/api/playlists?view=summary`)
         ]);
 
         channels = await channelsResponse.json();
@@ -102,10 +104,10 @@ function renderChannels() {
         let playlistInfo = 'No playlist';
         if (channel.playlist_id && playlistMap[channel.playlist_id]) {
             const playlist = playlistMap[channel.playlist_id];
-            playlistInfo = `${escapeHtml(playlist.name)} (${playlist.items.length} items)`;
-        } else if (channel.playlist && channel.playlist.length > 0) {
+            playlistInfo = `${escapeHtml(playlist.name)} (${playlist.item_count} items)`;
+        } else if (channel.embedded_item_count > 0) {
             // Fallback for old embedded playlists
-            playlistInfo = `${channel.playlist.length} items`;
+            playlistInfo = `${channel.embedded_item_count} items`;
         }
 
         return `
@@ -118,7 +120,7 @@ function renderChannels() {
                         ${channel.enabled ? 'Enabled' : 'Disabled'}
                     </div>
                 </div>
-                ${channel.logo_url ? `<img src="${escapeHtml(channel.logo_url)}" alt="Logo" class="channel-logo">` : ''}
+                ${channel.logo_url ? `<img src="${escapeHtml(logoVariant(channel.logo_url, 128, 'webp'))}" alt="Logo" class="channel-logo">` : ''}
             </div>
             <div class="channel-details">
                 <div><strong>Category:</strong> ${escapeHtml(channel.category)}</div>
@@ -137,7 +139,7 @@ function renderChannels() {
 
 async function loadPlaylistsForSelect() {
     try {
-        const response = await fetch(`${API_BASE}/api/playlists`);
+        const response = await fetch(`${API_BASE}/api/playlists?view=summary&fields=id,name,item_count`);
         const playlists = await response.json();
 
         const select = document.getElementById('channelPlaylist');
@@ -146,7 +148,7 @@ async function loadPlaylistsForSelect() {
         playlists.forEach(playlist => {
             const option = document.createElement('option');
             option.value = playlist.id;
-            option.textContent = `${playlist.name} (${playlist.items.length} items)`;
+            option.textContent = `${playlist.name} (${playlist.item_count} items)`;
             select.appendChild(option);
         });
     } catch (error) {
@@ -206,6 +208,7 @@ async function openModal(channelId = null) {
         document.getElementById('audioBitrate').value = channel.stream_settings.audio_bitrate;
         document.getElementById('resolution').value = channel.stream_settings.resolution;
         document.getElementById('transcodePreset').value = channel.stream_settings.transcode_preset;
+        document.getElementById('dvrWindow').value = channel.stream_settings.dvr_window || 0;
 
         // Set selected playlist
         if (channel.playlist_id) {
@@ -235,6 +238,7 @@ async function openModal(channelId = null) {
         document.getElementById('audioBitrate').value = 128;
         document.getElementById('resolution').value = '1280x720';
         document.getElementById('transcodePreset').value = 'software_fast';
+        document.getElementById('dvrWindow').value = 0;
     }
 
     channelModal.style.display = 'block';
@@ -331,51 +335,100 @@ async function openMediaBrowser(inputElement) {
 
 async function loadMediaFiles(path) {
     currentMediaPath = path;
+    // Stop the previous folder's listing, so its callbacks can't overwrite this one
+    if (mediaListingController) mediaListingController.abort();
+    const controller = mediaListingController = new AbortController();
     const fileList = document.getElementById('mediaFileList');
     const breadcrumb = document.getElementById('mediaBreadcrumb');
 
     try {
         fileList.innerHTML = '<p class="loading">Loading files...</p>';
 
-        const url = `${API_BASE}/api/media/browse${path ? '?path=' + encodeURIComponent(path) : ''}`;
-        const response = await fetch(url);
-        const data = await response.json();
+        const files = new Map();
+        await streamMediaListing(path, data => {
+            breadcrumb.innerHTML = generateBreadcrumb(data.current_path, data.parent_path);
+            fileList.innerHTML = data.total === 0 ? '<p class="loading">No files found</p>' : '';
+        }, items => {
+            items.filter(item => item.type === 'file').forEach(item => files.set(item.path, item));
+            fileList.insertAdjacentHTML('beforeend', items.map(renderMediaItem).join(''));
+        }, event => {
+            const item = files.get(event.path);
+            if (!item) return;
+            item.duration = event.duration;
+            showMediaDuration(item);
+        }, controller.signal);
+    } catch (error) {
+        if (error.name === 'AbortError') return;
+        console.error('Error loading media files:', error);
+        fileList.innerHTML = '<p class="loading">Error loading files</p>';
+    }
+}
 
-        breadcrumb.innerHTML = generateBreadcrumb(data.current_path, data.parent_path);
+function renderMediaItem(item) {
+    if (item.type === 'directory') {
+        return `
+            <div class="media-item media-folder" onclick="navigateToFolder('${escapeHtml(item.path)}')">
+                <span class="media-icon">📁</span>
+                <span class="media-name">${escapeHtml(item.name)}</span>
+            </div>
+        `;
+    }
 
-        if (data.items.length === 0) {
-            fileList.innerHTML = '<p class="loading">No files found</p>';
-            return;
-        }
+    const sizeStr = formatFileSize(item.size);
+    const durationStr = item.duration ? formatDuration(item.duration) : '';
+    const icon = item.thumbnail
+        ? `<img class="media-thumbnail" src="${escapeHtml(item.thumbnail)}" alt="" loading="lazy">`
+        : '🎬';
+    return `
+        <div class="media-item media-file" data-path="${escapeHtml(item.path)}" data-duration="${item.duration || 0}" onclick="selectMediaFile('${escapeHtml(item.path)}', Number(this.dataset.duration))">
+            <span class="media-icon">${icon}</span>
+            <div class="media-info">
+                <span class="media-name">${escapeHtml(item.name)}</span>
+                <span class="media-meta">${sizeStr}${durationStr ? ' • ' + durationStr : ''}</span>
+            </div>
+        </div>
+    `;
+}
 
-        fileList.innerHTML = data.items.map(item => {
-            if (item.type === 'directory') {
-                return `
-                    <div class="media-item media-folder" onclick="navigateToFolder('${escapeHtml(item.path)}')">
-                        <span class="media-icon">📁</span>
-                        <span class="media-name">${escapeHtml(item.name)}</span>
-                    </div>
-                `;
-            } else {
-                const sizeStr = formatFileSize(item.size);
-                const durationStr = item.duration ? formatDuration(item.duration) : '';
-                return `
-                    <div class="media-item media-file" onclick="selectMediaFile('${escapeHtml(item.path)}', ${item.duration || 0})">
-                        <span class="media-icon">🎬</span>
-                        <div class="media-info">
-                            <span class="media-name">${escapeHtml(item.name)}</span>
-                            <span class="media-meta">${sizeStr}${durationStr ? ' • ' + durationStr : ''}</span>
-                        </div>
-                    </div>
-                `;
+async function streamMediaListing(path, onListing, onItems, onDuration, signal) {
+    // NDJSON: the listing header and items arrive first, then durations as files are probed.
+    // Once signal is aborted, the pending fetch or read rejects and no callback runs again.
+    const params = new URLSearchParams({ stream: 'true' });
+    if (path) params.set('path', path);
+    const response = await fetch(`${API_BASE}/api/media/browse?${params}`, { signal });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line) continue;
+            const event = JSON.parse(line);
+            if (event.type === 'listing') {
+                onListing(event);
+                onItems(event.items);
+            } else if (event.type === 'items') {
+                onItems(event.items);
+            } else if (event.type === 'duration' && event.duration) {
+                onDuration(event);
             }
-        }).join('');
-    } catch (error) {
-        console.error('Error loading media files:', error);
-        fileList.innerHTML = '<p class="loading">Error loading files</p>';
+        }
     }
 }
 
+function showMediaDuration(item) {
+    const element = document.querySelector(`.media-file[data-path="${CSS.escape(item.path)}"]`);
+    if (!element) return;
+    element.dataset.duration = item.duration;
+    element.querySelector('.media-meta').textContent = `${formatFileSize(item.size)} • ${formatDuration(item.duration)}`;
+}
+
 function generateBreadcrumb(currentPath, parentPath) {
     if (!currentPath) {
         return '<span class="breadcrumb-item">Media</span>';
@@ -415,6 +468,8 @@ function selectMediaFile(path, duration) {
 
 function closeMediaBrowser() {
     document.getElementById('mediaBrowserModal').style.display = 'none';
+    if (mediaListingController) mediaListingController.abort();
+    mediaListingController = null;
     currentPlaylistInput = null;
 }
 
@@ -473,7 +528,8 @@ async function handleSubmit(e) {
             segment_duration: 6,
             playlist_size: 10,
             transcode_preset: document.getElementById('transcodePreset').value,
-            resolution: document.getElementById('resolution').value
+            resolution: document.getElementById('resolution').value,
+            dvr_window: parseInt(document.getElementById('dvrWindow').value) || 0
         },
         enabled: document.getElementById('channelEnabled').checked
     };
@@ -553,6 +609,12 @@ async function deleteChannel(channelId) {
     }
 }
 
+function logoVariant(url, size, format) {
+    // Uploaded logos are stored as /logos/<channel>_<hash>_<size>.<png|webp>
+    const match = /^(\/logos\/.+_[0-9a-f]{16})_\d+\.(png|webp)$/.exec(url);
+    return match ? `${match[1]}_${size}.${format}` : url;
+}
+
 function escapeHtml(text) {
     if (!text) return '';
     const div = document.createElement('div');
@@ -7,6 +7,8 @@ let currentPlaylistId = null;
 let playlistItemCounter = 0;
 let currentMediaPath = '';
 let currentPlaylistInput = null;
+// Aborts the media listing still streaming in when another folder is opened
+let mediaListingController = null;
 let selectedMediaFiles = [];
 let allMediaFiles = [];
 
@@ -81,7 +83,7 @@ async function loadVersion() {
 
 async function loadPlaylists() {
     try {
-        const response = await fetch(`${API_BASE}/api/playlists`);
+        const response = await fetch(`${API_BASE}/api/playlists?view=summary`);
         playlists = await response.json();
         renderPlaylists();
     } catch (error) {
@@ -101,7 +103,7 @@ function renderPlaylists() {
             <div class="channel-header">
                 <div class="channel-info">
                     <h3>${escapeHtml(playlist.name)}</h3>
-                    <span class="channel-number">${playlist.items.length} items</span>
+                    <span class="channel-number">${playlist.item_count} items</span>
                 </div>
             </div>
             <div class="channel-details">
@@ -116,7 +118,7 @@ function renderPlaylists() {
     `).join('');
 }
 
-function openModal(playlistId = null) {
+async function openModal(playlistId = null) {
     currentPlaylistId = playlistId;
     playlistItemsContainer.innerHTML = '';
     playlistItemCounter = 0;
@@ -124,7 +126,8 @@ function openModal(playlistId = null) {
     if (playlistId) {
         // Edit mode
         document.getElementById('modalTitle').textContent = 'Edit Playlist';
-        const playlist = playlists.find(p => p.id === playlistId);
+        // The list holds summaries only, so fetch the full playlist with items
+        const playlist = await fetchPlaylist(playlistId);
         if (playlist) {
             document.getElementById('playlistId').value = playlist.id;
             document.getElementById('playlistName').value = playlist.name;
@@ -210,8 +213,22 @@ async function handleSubmit(e) {
     }
 }
 
+async function fetchPlaylist(playlistId) {
+    try {
+        const response = await fetch(`${API_BASE}/api/playlists/${playlistId}`);
+        if (!response.ok) {
+            throw new Error('Failed to load playlist');
+        }
+        return await response.json();
+    } catch (error) {
+        console.error('Error loading playlist:', error);
+        alert(`Error loading playlist: ${error.message}`);
+        return null;
+    }
+}
+
 async function editPlaylist(playlistId) {
-    openModal(playlistId);
+    await openModal(playlistId);
 }
 
 async function deletePlaylist(playlistId) {
@@ -302,6 +319,8 @@ async function openMediaBrowser(inputElement) {
 
 function closeMediaBrowser() {
     document.getElementById('mediaBrowserModal').style.display = 'none';
+    if (mediaListingController) mediaListingController.abort();
+    mediaListingController = null;
     currentPlaylistInput = null;
     selectedMediaFiles = [];
     allMediaFiles = [];
@@ -310,6 +329,9 @@ function closeMediaBrowser() {
 
 async function loadMediaFiles(path) {
     currentMediaPath = path;
+    // Stop the previous folder's listing, so its callbacks can't overwrite this one
+    if (mediaListingController) mediaListingController.abort();
+    const controller = mediaListingController = new AbortController();
     const fileList = document.getElementById('mediaFileList');
     const breadcrumb = document.getElementById('mediaBreadcrumb');
     const addAllBtn = document.getElementById('addAllInFolder');
@@ -324,59 +346,104 @@ async function loadMediaFiles(path) {
     try {
         fileList.innerHTML = '<p class="loading">Loading files...</p>';
 
-        const url = `${API_BASE}/api/media/browse${path ? '?path=' + encodeURIComponent(path) : ''}`;
-        const response = await fetch(url);
-        const data = await response.json();
-
-        breadcrumb.innerHTML = generateBreadcrumb(data.current_path, data.parent_path);
-
-        if (data.items.length === 0) {
-            fileList.innerHTML = '<p class="loading">No files found</p>';
-            addAllBtn.style.display = 'none';
-            return;
-        }
-
-        // Store all files for bulk operations
-        allMediaFiles = data.items.filter(item => item.type === 'file');
-
-        // Show "Add All" button if there are files
-        if (allMediaFiles.length > 0) {
-            addAllBtn.style.display = 'inline-block';
-        } else {
+        const files = new Map();
+        await streamMediaListing(path, data => {
+            breadcrumb.innerHTML = generateBreadcrumb(data.current_path, data.parent_path);
+            fileList.innerHTML = data.total === 0 ? '<p class="loading">No files found</p>' : '';
             addAllBtn.style.display = 'none';
-        }
-
-        fileList.innerHTML = data.items.map((item, index) => {
-            if (item.type === 'directory') {
-                return `
-                    <div class="media-item media-folder" onclick="navigateToFolder('${escapeHtml(item.path)}')">
-                        <span class="media-icon">📁</span>
-                        <span class="media-name">${escapeHtml(item.name)}</span>
-                    </div>
-                `;
-            } else {
-                const sizeStr = formatFileSize(item.size);
-                const durationStr = item.duration ? formatDuration(item.duration) : '';
-                const fileIndex = allMediaFiles.findIndex(f => f.path === item.path);
-                return `
-                    <div class="media-item media-file">
-                        <input type="checkbox" class="media-checkbox" data-file-index="${fileIndex}" onchange="toggleFileSelection(${fileIndex})">
-                        <span class="media-icon" onclick="toggleFileCheckbox(${fileIndex})">🎬</span>
-                        <div class="media-info" onclick="toggleFileCheckbox(${fileIndex})">
-                            <span class="media-name">${escapeHtml(item.name)}</span>
-                            <span class="media-meta">${sizeStr}${durationStr ? ' • ' + durationStr : ''}</span>
-                        </div>
-                    </div>
-                `;
-            }
-        }).join('');
+        }, items => {
+            const html = items.map(item => {
+                if (item.type !== 'file') return renderMediaItem(item, -1);
+                // Store all files for bulk operations
+                allMediaFiles.push(item);
+                files.set(item.path, item);
+                return renderMediaItem(item, allMediaFiles.length - 1);
+            }).join('');
+            fileList.insertAdjacentHTML('beforeend', html);
+
+            // Show "Add All" button if there are files
+            addAllBtn.style.display = allMediaFiles.length > 0 ? 'inline-block' : 'none';
+        }, event => {
+            const file = files.get(event.path);
+            if (!file) return;
+            // Selected files share these objects, so bulk adds pick up the duration
+            file.duration = event.duration;
+            showMediaDuration(file);
+        }, controller.signal);
     } catch (error) {
+        if (error.name === 'AbortError') return;
         console.error('Error loading media files:', error);
         fileList.innerHTML = '<p class="loading">Error loading files</p>';
         addAllBtn.style.display = 'none';
     }
 }
 
+function renderMediaItem(item, fileIndex) {
+    if (item.type === 'directory') {
+        return `
+            <div class="media-item media-folder" onclick="navigateToFolder('${escapeHtml(item.path)}')">
+                <span class="media-icon">📁</span>
+                <span class="media-name">${escapeHtml(item.name)}</span>
+            </div>
+        `;
+    }
+
+    const sizeStr = formatFileSize(item.size);
+    const durationStr = item.duration ? formatDuration(item.duration) : '';
+    const icon = item.thumbnail
+        ? `<img class="media-thumbnail" src="${escapeHtml(item.thumbnail)}" alt="" loading="lazy">`
+        : '🎬';
+    return `
+        <div class="media-item media-file" data-path="${escapeHtml(item.path)}">
+            <input type="checkbox" class="media-checkbox" data-file-index="${fileIndex}" onchange="toggleFileSelection(${fileIndex})">
+            <span class="media-icon" onclick="toggleFileCheckbox(${fileIndex})">${icon}</span>
+            <div class="media-info" onclick="toggleFileCheckbox(${fileIndex})">
+                <span class="media-name">${escapeHtml(item.name)}</span>
+                <span class="media-meta">${sizeStr}${durationStr ? ' • ' + durationStr : ''}</span>
+            </div>
+        </div>
+    `;
+}
+
+async function streamMediaListing(path, onListing, onItems, onDuration, signal) {
+    // NDJSON: the listing header and items arrive first, then durations as files are probed.
+    // Once signal is aborted, the pending fetch or read rejects and no callback runs again.
+    const params = new URLSearchParams({ stream: 'true' });
+    if (path) params.set('path', path);
+    const response = await fetch(`${API_BASE}/api/media/browse?${params}`, { signal });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line) continue;
+            const event = JSON.parse(line);
+            if (event.type === 'listing') {
+                onListing(event);
+                onItems(event.items);
+            } else if (event.type === 'items') {
+                onItems(event.items);
+            } else if (event.type === 'duration' && event.duration) {
+                onDuration(event);
+            }
+        }
+    }
+}
+
+function showMediaDuration(item) {
+    const element = document.querySelector(`.media-file[data-path="${CSS.escape(item.path)}"]`);
+    if (!element) return;
+    element.dataset.duration = item.duration;
+    element.querySelector('.media-meta').textContent = `${formatFileSize(item.size)} • ${formatDuration(item.duration)}`;
+}
+
 function generateBreadcrumb(currentPath, parentPath) {
     if (!currentPath) {
         return '<span class="breadcrumb-item">Root</span>';
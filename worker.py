@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+TroutTV Transcode Worker - Startup Script
+
+Runs live encodes for TroutTV servers that list this worker in
+TRANSCODE_WORKERS. Configured through the same environment variables as
+the server (FFMPEG_PATH, STREAMS_DIR, WORKER_*).
+"""
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+    from app.config import settings
+    from app.services.transcode_worker import transcode_worker
+
+    print("=" * 60)
+    print("TroutTV Transcode Worker")
+    print("=" * 60)
+    print(f"Listening on {settings.worker_host}:{settings.worker_port}")
+    print(f"Writing HLS output to: {settings.streams_dir}")
+    print("=" * 60)
+
+    try:
+        asyncio.run(transcode_worker.serve(settings.worker_host, settings.worker_port))
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass